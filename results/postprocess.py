@@ -1,3 +1,5 @@
+import os
+
 import pandas as pd
 
 countries = ['australia', 'new_zealand', 'sweden']
@@ -6,53 +8,75 @@ draws = 100 #Not including expected values
 
 output_file = 'COVID19_postprocess.csv'
 
-sum_cols = [
-            'sum_population', 'sum_bau_population', 
-            'sum_prev_population', 'sum_bau_prev_population',
-            'sum_acmr', 'sum_bau_acmr',	
-            'sum_pr_death', 'sum_bau_pr_death',
-            'sum_deaths', 'sum_bau_deaths',
-            'sum_yld_rate', 'sum_bau_yld_rate',
-            'sum_person_years', 'sum_bau_person_years',
-            'sum_haly', 'sum_haly_disc',
-            'sum_bau_haly', 'sum_bau_haly_disc',
-            'sum_expenditure', 'sum_expenditure_disc',
-            'sum_bau_expenditure', 'sum_bau_expenditure_disc',
-            'sum_covid19_deaths'
-            ]
-cols = ['date'] + sum_cols + ['draw_', 'country','scenario']
+#The observer output columns that are summed over all cohorts at each date,
+#and the name of each sum. Columns that the observer did not record (see the
+#observer.record configuration block) are left empty.
+sum_cols = {
+            'population': 'sum_population',
+            'bau_population': 'sum_bau_population',
+            'prev_population': 'sum_prev_population',
+            'bau_prev_population': 'sum_bau_prev_population',
+            'acmr': 'sum_acmr', 'bau_acmr': 'sum_bau_acmr',
+            'pr_death': 'sum_pr_death', 'bau_pr_death': 'sum_bau_pr_death',
+            'deaths': 'sum_deaths', 'bau_deaths': 'sum_bau_deaths',
+            'yld_rate': 'sum_yld_rate', 'bau_yld_rate': 'sum_bau_yld_rate',
+            'person_years': 'sum_person_years',
+            'bau_person_years': 'sum_bau_person_years',
+            'HALY': 'sum_haly', 'HALY_disc': 'sum_haly_disc',
+            'bau_HALY': 'sum_bau_haly', 'bau_HALY_disc': 'sum_bau_haly_disc',
+            'expenditure': 'sum_expenditure',
+            'expenditure_disc': 'sum_expenditure_disc',
+            'bau_expenditure': 'sum_bau_expenditure',
+            'bau_expenditure_disc': 'sum_bau_expenditure_disc',
+            'COVID19_deaths': 'sum_covid19_deaths'
+            }
+cols = ['date'] + list(sum_cols.values()) + ['draw_', 'country','scenario']
 output_df = pd.DataFrame(columns = cols)
 
+
+def sum_cohorts(df, country, scenario, draw=None):
+    """
+    Sum the outputs of every cohort at each date. If ``draw`` is ``None``,
+    the table contains the outputs of every draw, as collected into a single
+    file with --collect, and its ``draw`` column identifies each draw.
+    """
+    keys = ['date'] if draw is not None else ['draw', 'date']
+    recorded = [col for col in sum_cols if col in df.columns]
+    df = df.groupby(keys)[recorded].sum().rename(columns=sum_cols)
+    df.reset_index(inplace=True)
+    if draw is not None:
+        df['draw_'] = ([draw]*df.shape[0])
+    else:
+        df = df.rename(columns={'draw': 'draw_'})
+    df['country'] = ([country]*df.shape[0])
+    df['scenario'] = ([scenario]*df.shape[0])
+    return df.reindex(columns=cols)
+
+
 for country in countries:
     for scenario in scenarios:
+        #All draws, collected into a single file
+        input_file = '{}/COVID19_{}_{}_mm_draws.csv'.format(country, country, scenario)
+        if os.path.exists(input_file):
+            print('Processing input:'+input_file)
+            df = pd.read_csv(input_file)
+            df = df[df['draw'] <= draws]
+            output_df = pd.concat([output_df, sum_cohorts(df, country, scenario)])
+            continue
+
         #Expected vals
         input_file = '{}/COVID19_{}_{}_mm.csv'.format(country, country, scenario)
         print('Processing input:'+input_file)
         df = pd.read_csv(input_file)
-        df = df.drop(columns='year_of_birth').set_index(['age','sex','date'])
-        df = df.sum(level = 2)
-        df.columns = sum_cols
-        df.reset_index(inplace=True)
-        df['draw_'] = ([0]*df.shape[0])
-        df['country'] = ([country]*df.shape[0])
-        df['scenario'] = ([scenario]*df.shape[0])
-        output_df = pd.concat([output_df, df])
+        output_df = pd.concat([output_df, sum_cohorts(df, country, scenario, 0)])
 
         #draws
         for draw in range(1, draws+1):
             input_file = '{}/COVID19_{}_{}_mm_{}.csv'.format(country, country, scenario, draw)
             print('Processing input:'+input_file)
             df = pd.read_csv(input_file)
-            df = df.drop(columns='year_of_birth').set_index(['age','sex','date'])
-            df = df.sum(level = 2)
-            df.columns = sum_cols
-            df.reset_index(inplace=True)
-            df['draw_'] = ([draw]*df.shape[0])
-            df['country'] = ([country]*df.shape[0])
-            df['scenario'] = ([scenario]*df.shape[0])
-            output_df = pd.concat([output_df, df])
+            output_df = pd.concat([output_df, sum_cohorts(df, country, scenario, draw)])
 
 print('Writing output...')
 output_df.to_csv(output_file, index=False)
-print('Done.')      
-
+print('Done.')
@@ -0,0 +1,103 @@
+"""
+Measure the peak memory and the time taken to build a population's artifact
+when the tables are calculated in chunks of draws of different sizes (see the
+--chunk-draws option of make_artifacts). Each artifact is built in a new
+process, so that the peak memory of each build does not include the memory
+used by earlier builds.
+
+From the vivarium_unimelb_COVID19 folder, run:
+
+    python scripts/benchmarks/artifact_memory.py australia --draws 2000 -c 0 -c 500 -c 200 -c 50
+
+where a chunk size of 0 calculates every draw at once. The input data files
+must contain the requested number of draws. Peak memory is measured with the
+resource module, which is not available on Windows.
+"""
+import csv
+import multiprocessing
+import resource
+import sys
+import tempfile
+from pathlib import Path
+from time import time
+
+import click
+
+from vivarium_unimelb_COVID19.external_data.artifact import (
+    LAYOUTS, UNCERTAINTY_DRAWS, assemble_artifact)
+
+
+DEFAULT_CHUNK_SIZES = (0, 500, 200, 50)
+
+CSV_COLUMNS = ['Population', 'Draws', 'Chunk draws', 'Layout',
+               'Total time (minutes)', 'Peak memory (MB)']
+
+
+def build_artifact(population, num_draws, chunk_draws, layout, results):
+    with tempfile.TemporaryDirectory() as output_dir:
+        start_time = time()
+        assemble_artifact(population, num_draws, Path(output_dir),
+                          rebuild=True, layout=layout,
+                          chunk_draws=chunk_draws or None)
+        total_time = time() - start_time
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # NOTE: the peak is reported in bytes on macOS and in kilobytes elsewhere.
+    peak_mb = peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10
+    results.put((total_time, peak_mb))
+
+
+def run_benchmark(population, num_draws, chunk_draws, layout):
+    """Build an artifact in a new process and return its time and peak memory."""
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    process = context.Process(target=build_artifact,
+                              args=(population, num_draws, chunk_draws,
+                                    layout, results))
+    process.start()
+    # NOTE: the result is small enough to be written to the queue before the
+    # process exits, so we can wait for the process first; this does not
+    # block if the build fails before sending its result.
+    process.join()
+    if process.exitcode != 0:
+        raise RuntimeError('The build with {} draws per chunk failed (exit '
+                           'code {})'.format(chunk_draws or 'all',
+                                             process.exitcode))
+    return results.get(timeout=60)
+
+
+@click.command()
+@click.argument('population')
+@click.option('-d', '--draws', default=UNCERTAINTY_DRAWS, metavar='NUM',
+              help='The number of draws of each table')
+@click.option('-c', '--chunk-draws', 'chunk_sizes', multiple=True, type=int,
+              metavar='NUM',
+              help='A chunk size to measure (0 for every draw at once); may '
+                   'be repeated')
+@click.option('--layout', type=click.Choice(LAYOUTS), default='compact',
+              help='The layout in which the tables are stored')
+@click.option('-o', '--output', default='artifact_memory.csv',
+              type=click.Path(dir_okay=False), metavar='FILE',
+              help='The CSV file in which the results are written')
+def main(population, draws, chunk_sizes, layout, output):
+    """Measure the peak memory of artifact builds with different chunk sizes."""
+    chunk_sizes = chunk_sizes or DEFAULT_CHUNK_SIZES
+
+    # The first build stores the columns of each input data file in the
+    # column cache, and is not recorded.
+    run_benchmark(population, draws, chunk_sizes[0], layout)
+
+    with open(output, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(CSV_COLUMNS)
+        for chunk_draws in chunk_sizes:
+            total_time, peak_mb = run_benchmark(population, draws,
+                                                chunk_draws, layout)
+            print('{} draws per chunk: {:.1f} minutes, {:.0f} MB'.format(
+                chunk_draws or 'all', total_time / 60, peak_mb))
+            writer.writerow([population, draws, chunk_draws, layout,
+                             total_time / 60, peak_mb])
+            f.flush()
+
+
+if __name__ == '__main__':
+    main()
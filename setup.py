@@ -31,6 +31,7 @@ if __name__ == "__main__":
         'scipy',
         'jinja2',
         'click',
+        'threadpoolctl',
     ]
 
     test_requirements = [
@@ -79,6 +80,12 @@ if __name__ == "__main__":
             make_artifacts=vivarium_unimelb_COVID19.cli:make_artifacts
             make_model_specifications=vivarium_unimelb_COVID19.cli:make_model_specifications
             run_uncertainty_analysis=vivarium_unimelb_COVID19.cli:run_uncertainty_analysis
+            rediscount_results=vivarium_unimelb_COVID19.cli:rediscount_results
+            invalidate_cache=vivarium_unimelb_COVID19.cli:invalidate_cache
+            coordinate_jobs=vivarium_unimelb_COVID19.cli:coordinate_jobs
+            summarise_telemetry=vivarium_unimelb_COVID19.cli:summarise_telemetry
+            run_all=vivarium_unimelb_COVID19.cli:run_all
+            compile_bundle=vivarium_unimelb_COVID19.cli:compile_bundle
         """,
 
 
@@ -0,0 +1,224 @@
+"""
+==============
+Artifact Cache
+==============
+
+This module contains a data artifact plugin that keeps every table it loads
+in memory, with all of its draws, so that repeated simulations in the same
+process (e.g., many draws of the same model specification) do not need to
+re-read the artifact.
+
+To use it, override the ``data`` plugin:
+
+.. code-block:: yaml
+
+   plugins:
+       required:
+           data:
+               controller: vivarium_unimelb_COVID19.artifact_cache.CachedArtifactManager
+               builder_interface: vivarium.framework.artifact.ArtifactInterface
+
+"""
+import os
+import time
+
+import pandas as pd
+
+from vivarium.framework.artifact import (Artifact, ArtifactManager,
+                                         filter_data,
+                                         parse_artifact_path_config)
+
+from vivarium_unimelb_COVID19 import compact_artifact
+
+
+PLUGIN_CONFIGURATION = {
+    'required': {
+        'data': {
+            'controller': 'vivarium_unimelb_COVID19.artifact_cache.CachedArtifactManager',
+            'builder_interface': 'vivarium.framework.artifact.ArtifactInterface',
+        },
+    },
+}
+"""The plugin configuration that selects the cached artifact manager."""
+
+TIMED_PLUGIN_CONFIGURATION = {
+    'required': {
+        'data': {
+            'controller': 'vivarium_unimelb_COVID19.artifact_cache.TimedArtifactManager',
+            'builder_interface': 'vivarium.framework.artifact.ArtifactInterface',
+        },
+    },
+}
+"""The plugin configuration that selects the timed artifact manager."""
+
+
+_ARTIFACTS = {}
+"""The artifacts that have been opened, keyed by path and modification time."""
+
+
+def load_table(artifact_path, entity_key):
+    """
+    Return a table (with all draws) from an artifact, reading it from the
+    artifact only if it is not already in memory. Tables are discarded when
+    the artifact file is modified.
+
+    Parameters
+    ----------
+    artifact_path
+        The path to the artifact file.
+    entity_key
+        The key associated with the table.
+
+    """
+    # NOTE: the artifact retains each table that it loads.
+    return compact_artifact.load_entity(get_artifact(artifact_path), entity_key)
+
+
+def get_artifact(artifact_path):
+    """
+    Return the cached artifact for the given path, opening it only if it has
+    not already been opened, or if the file has since been modified.
+
+    Parameters
+    ----------
+    artifact_path
+        The path to the artifact file.
+
+    """
+    artifact_path = str(artifact_path)
+    cache_key = (artifact_path, os.stat(artifact_path).st_mtime_ns)
+    if cache_key not in _ARTIFACTS:
+        # Discard tables from earlier versions of this artifact.
+        for stale_key in [k for k in _ARTIFACTS if k[0] == artifact_path]:
+            del _ARTIFACTS[stale_key]
+        _ARTIFACTS[cache_key] = Artifact(artifact_path)
+    return _ARTIFACTS[cache_key]
+
+
+def preload(artifact_path):
+    """
+    Load every table in an artifact into the cache, so that processes forked
+    from this process can share these tables (copy-on-write).
+
+    Parameters
+    ----------
+    artifact_path
+        The path to the artifact file.
+
+    """
+    artifact = get_artifact(artifact_path)
+    for entity_key in artifact.keys:
+        compact_artifact.load_entity(artifact, entity_key)
+
+
+def clear_cache():
+    """Discard all tables that have been loaded from artifacts."""
+    _ARTIFACTS.clear()
+
+
+def select_draw(data, draw):
+    """
+    Select a single draw from a table, in the same manner as the default
+    artifact manager: wide tables retain the ``draw_<draw>`` column, long
+    tables retain the rows where ``draw == <draw>``, and the remaining draw
+    column is renamed to ``value``.
+
+    Parameters
+    ----------
+    data
+        The table, as stored in the artifact (i.e., indexed by the age, sex
+        and year columns).
+    draw
+        The draw number, or ``None`` to retain every draw.
+
+    """
+    if draw is not None:
+        draw_col = 'draw_{}'.format(draw)
+        other_draws = [c for c in data.columns
+                       if str(c).startswith('draw_') and c != draw_col]
+        data = data.drop(columns=other_draws)
+    data = data.reset_index()
+    if draw is not None and 'draw' in data.columns:
+        data = data[data['draw'] == draw]
+    draw_col = [c for c in data if 'draw' in c]
+    if draw_col:
+        data = data.rename(columns={draw_col[0]: 'value'})
+    return data
+
+
+class TimedArtifactManager(ArtifactManager):
+    """
+    An artifact manager that records which keys are loaded
+    (``loaded_keys``) and the total time spent loading data, in seconds
+    (``load_seconds``). Subclasses should override :meth:`load_data` rather
+    than :meth:`load`.
+
+    This manager also reads tables that are stored in the compact layout
+    (see :mod:`~vivarium_unimelb_COVID19.compact_artifact`), reading only
+    the selected draw.
+    """
+
+    def setup(self, builder):
+        """Performs this component's simulation setup."""
+        self.draw = builder.configuration.input_data.input_draw_number
+        self.loaded_keys = set()
+        self.load_seconds = 0.0
+        super().setup(builder)
+
+    def load(self, entity_key, **column_filters):
+        """Loads data associated with the given entity key.
+
+        Parameters
+        ----------
+        entity_key
+            The key associated with the expected data.
+        column_filters
+            Filters that subset the data by a categorical column and then
+            remove the column from the raw data.
+
+        """
+        start = time.perf_counter()
+        data = self.load_data(entity_key, **column_filters)
+        self.load_seconds += time.perf_counter() - start
+        self.loaded_keys.add(entity_key)
+        return data
+
+    def load_data(self, entity_key, **column_filters):
+        """Loads data associated with the given entity key, as per
+        :meth:`load`."""
+        if (self.artifact is not None
+                and compact_artifact.is_compact(self.artifact.path, entity_key)):
+            data = compact_artifact.load_table(self.artifact.path, entity_key,
+                                               self.draw)
+            data = select_draw(data, self.draw)
+            return filter_data(data, self.config_filter_term, **column_filters)
+        return super().load(entity_key, **column_filters)
+
+    def __repr__(self):
+        return "TimedArtifactManager()"
+
+
+class CachedArtifactManager(TimedArtifactManager):
+    """
+    An artifact manager that serves each table from an in-process cache,
+    which holds every draw of each table that has been loaded. The artifact
+    is only read the first time that each table is loaded in a process.
+    """
+
+    def _load_artifact(self, configuration):
+        # NOTE: we do not open the artifact here, tables are read on demand.
+        if not configuration.input_data.artifact_path:
+            return None
+        self.artifact_path = parse_artifact_path_config(configuration)
+        return None
+
+    def load_data(self, entity_key, **column_filters):
+        """Loads data associated with the given entity key, from the cache."""
+        data = load_table(self.artifact_path, entity_key)
+        if isinstance(data, pd.DataFrame):
+            data = select_draw(data, self.draw)
+            return filter_data(data, self.config_filter_term, **column_filters)
+        return data
+
+    def __repr__(self):
+        return "CachedArtifactManager()"
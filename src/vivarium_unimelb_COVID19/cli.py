@@ -1,24 +1,111 @@
 import logging
+import time
 from pathlib import Path
 
 import click
 
 from vivarium_unimelb_COVID19.external_data import assemble_artifacts, create_model_specifications
-from vivarium_unimelb_COVID19.external_data import run_many
+from vivarium_unimelb_COVID19.external_data import run_many, get_draw_numbers
+from vivarium_unimelb_COVID19.external_data.scheduling import TIMINGS_FILE, TimingHistory, plan_batch, summarise_history
+from vivarium_unimelb_COVID19.external_data.artifact import LAYOUTS, VARIANTS, BASE_VARIANT, DEFAULT_CHUNK_DRAWS, UNCERTAINTY_DRAWS
+from vivarium_unimelb_COVID19.external_data.result_cache import ResultCache
+from vivarium_unimelb_COVID19.external_data.job_queue import JobQueue, run_worker
+from vivarium_unimelb_COVID19.external_data.parallel import run_in_parallel, get_worker_sizing
+from vivarium_unimelb_COVID19.external_data.resources import MIN_FREE_MB
+from vivarium_unimelb_COVID19.external_data.summary import SummaryAggregator
+from vivarium_unimelb_COVID19.external_data.workflow import run_workflow
+from vivarium_unimelb_COVID19.external_data.branching import run_branches
+from vivarium_unimelb_COVID19.external_data.bundle import compile_bundle as compile_run_bundle
+from vivarium_unimelb_COVID19.discounting import rediscount_files
+
+
+def default_layout(scenario):
+    """
+    Return the default artifact layout for a scenario: tables with many
+    draws are stored in the compact layout, so that each simulation only
+    reads the draw that it uses. Tables in this layout cannot be read by the
+    default vivarium artifact manager (see :mod:`.compact_artifact`).
+    """
+    return 'generic' if scenario == 'minimal' else 'compact'
+
+
+def default_artifact_draws(scenario):
+    """
+    Return the number of draws of each artifact table for a scenario; the
+    minimal artifacts contain the number of draws defined by each data
+    source module (``DRAW_NUM``).
+    """
+    return None if scenario == 'minimal' else UNCERTAINTY_DRAWS
+
+
+def default_chunk_draws(scenario):
+    """
+    Return the default number of draws of each artifact table that are
+    calculated at once for a scenario: tables with many draws are calculated
+    in chunks, so that the memory required does not depend on the number of
+    draws.
+    """
+    return None if scenario == 'minimal' else DEFAULT_CHUNK_DRAWS
+
+
+def parse_variants(ctx, param, value):
+    """
+    Return the variants of the epidemic input data selected by the --variant
+    option, in the order that they are defined; the default is the base
+    variant, and 'all' selects every variant.
+    """
+    if not value:
+        return (BASE_VARIANT,)
+    if 'all' in value:
+        return tuple(VARIANTS)
+    return tuple(variant for variant in VARIANTS if variant in value)
+
+
 @click.command()
 @click.argument('scenario', type=click.Choice(['minimal', 'uncertainty']))
-def make_artifacts(scenario):
+@click.option('-w', '--workers', default=1, metavar='NUM',
+              help='The number of processes that calculate the tables')
+@click.option('--rebuild', is_flag=True,
+              help='Rebuild every table of the selected variants, even if '
+                   'its inputs are unchanged')
+@click.option('--layout', type=click.Choice(LAYOUTS),
+              help='The layout in which the tables are stored (default: '
+                   'compact for the uncertainty scenario, otherwise generic); '
+                   'the default vivarium artifact manager can only read the '
+                   'generic layout')
+@click.option('--variant', 'variants', multiple=True,
+              type=click.Choice(list(VARIANTS) + ['all']),
+              callback=parse_variants,
+              help='A variant of the epidemic input data to build (default: '
+                   'base); may be repeated, or use "all"')
+@click.option('--chunk-draws', type=click.IntRange(min=1), metavar='NUM',
+              help='The number of draws of each table to calculate at once '
+                   '(default: {} for the uncertainty scenario, otherwise '
+                   'every draw)'.format(DEFAULT_CHUNK_DRAWS))
+def make_artifacts(scenario, workers, rebuild, layout, variants, chunk_draws):
     """Generate artifacts for the intervention simulations."""
     logging.basicConfig(level=logging.INFO)
 
     output_path = Path('.').resolve() / 'artifacts'
     output_path.mkdir(exist_ok=True)
-    draws = 0 if scenario == 'minimal' else 2000
+    draws = default_artifact_draws(scenario)
+    if layout is None:
+        layout = default_layout(scenario)
+    if chunk_draws is None:
+        chunk_draws = default_chunk_draws(scenario)
+
+    logging.info(f'Generating artifact for scenario {scenario} with '
+                 f'{draws or "the default number of"} draws at '
+                 f'{str(output_path)}')
 
-    logging.info(f'Generating artifact for scenario {scenario} with {draws} '
-                 f'draws at {str(output_path)}')
+    if layout != 'generic':
+        logging.info(f'Storing tables in the {layout} layout, which can only '
+                     f'be read by the artifact managers in this package '
+                     f'(see vivarium_unimelb_COVID19.compact_artifact)')
 
-    assemble_artifacts(draws, output_path)
+    assemble_artifacts(draws, output_path, workers=workers, rebuild=rebuild,
+                       layout=layout, variants=variants,
+                       chunk_draws=chunk_draws)
 
 
 @click.command()
@@ -33,13 +120,61 @@ def make_model_specifications():
 
     create_model_specifications(output_path)
 
+def parse_spawn(ctx, param, value):
+    """Parse the number of processes, which may be ``'auto'``."""
+    if value == 'auto':
+        return value
+    try:
+        num_procs = int(value)
+    except ValueError:
+        num_procs = 0
+    if num_procs < 1:
+        raise click.BadParameter('must be a positive integer or "auto"')
+    return num_procs
+
 @click.command()
 @click.option('-d', '--draws', default=5, metavar='NUM',
               help='The number of draws for which to run simulations')
-@click.option('-s', '--spawn', default=1, metavar='NUM',
-              help='The number of simulations to run in parallel')
+@click.option('-s', '--spawn', default='1', metavar='NUM', callback=parse_spawn,
+              help='The number of simulations to run in parallel, or "auto"')
+@click.option('--min-free-memory', default=MIN_FREE_MB, metavar='MB',
+              help='With "--spawn auto", wait for this much free memory '
+              'before starting each simulation')
+@click.option('--collect', is_flag=True,
+              help='Write one output file per specification for all draws')
+@click.option('--warm', is_flag=True,
+              help='Reuse loaded data across draws of the same specification')
+@click.option('--preload', is_flag=True,
+              help='Start workers from a process that has imported vivarium')
+@click.option('--preload-artifacts', is_flag=True,
+              help='Load the artifacts before starting workers (implies --warm)')
+@click.option('--shared-artifacts', is_flag=True,
+              help='Load each artifact once into memory shared by all workers')
+@click.option('--history', type=click.Path(), metavar='FILE',
+              help='Record the time taken by each simulation in this file')
+@click.option('--timings', default=TIMINGS_FILE, type=click.Path(),
+              metavar='FILE',
+              help='Simulation timings written by simulate_all_models.py')
+@click.option('--cache', type=click.Path(), metavar='DIR',
+              help='Reuse the outputs of simulations cached in this directory')
+@click.option('--dry-run', is_flag=True,
+              help='Estimate the total time and peak memory, and exit')
+@click.option('--queue', type=click.Path(), metavar='PATH',
+              help='Add the simulations to a shared job queue (SQLite)')
+@click.option('--worker', is_flag=True,
+              help='Run simulations from the job queue until it is empty')
+@click.option('--summary', type=click.Path(), metavar='FILE',
+              help='Summarise the outputs across draws in this CSV file')
+@click.option('--summary-every', default=0, metavar='NUM',
+              help='Publish an interim summary after every NUM draws')
+@click.option('--branch', is_flag=True,
+              help='Simulate the time-steps shared by several scenarios once')
 @click.argument('spec_files', type=click.Path(exists=True), nargs=-1)
-def run_uncertainty_analysis(draws, spawn, spec_files):
+def run_uncertainty_analysis(draws, spawn, min_free_memory, collect, warm,
+                             preload,
+                             preload_artifacts, shared_artifacts, history,
+                             timings, cache, dry_run, queue, worker, summary,
+                             summary_every, branch, spec_files):
     """
     Run MSLT tobacco intervention simulations for multiple value draws.
 
@@ -49,4 +184,234 @@ def run_uncertainty_analysis(draws, spawn, spec_files):
     num_draws = draws
     num_procs = spawn
 
-    run_many(spec_files, num_draws, num_procs)
\ No newline at end of file
+    if worker and not queue:
+        raise click.UsageError('--worker requires --queue')
+    if queue:
+        if collect or summary:
+            raise click.UsageError(
+                '--collect and --summary cannot be used with --queue')
+        if spec_files:
+            added = JobQueue(queue).enqueue(spec_files, num_draws)
+            logging.info(f'Added {added} simulations to {queue}')
+        if worker:
+            if num_procs == 'auto':
+                num_procs = get_worker_sizing(
+                    [], TimingHistory(history, timings)).estimate_workers()
+            # Start num_procs workers, each of which claims jobs from the
+            # queue until there are no unfinished jobs.
+            worker_args = (queue, True, warm, history, cache)
+            run_in_parallel(run_worker, [worker_args] * num_procs, num_procs)
+        return
+
+    # Start the simulations with the longest predicted run times first.
+    timing_history = TimingHistory(history, timings)
+
+    if dry_run:
+        if num_procs == 'auto':
+            num_procs = get_worker_sizing(
+                spec_files, timing_history).estimate_workers()
+            click.echo(f'Processes: {num_procs}')
+        num_jobs = len(get_draw_numbers(num_draws))
+        table, wall_minutes, peak_memory_mb = plan_batch(
+            spec_files, num_jobs, num_procs, timing_history)
+        click.echo(table.to_string(index=False))
+        click.echo(f'Simulations: {num_jobs * len(spec_files)}')
+        click.echo(f'Estimated time: {wall_minutes:.1f} minutes')
+        if peak_memory_mb is None:
+            click.echo('Estimated peak memory: unknown (no recorded history)')
+        else:
+            click.echo(f'Estimated peak memory: {peak_memory_mb:.0f} MB')
+        return
+
+    if summary:
+        aggregator = SummaryAggregator(summary, publish_every=summary_every)
+        on_result = aggregator.on_result
+    else:
+        on_result = None
+
+    if branch:
+        if collect or cache or shared_artifacts:
+            raise click.UsageError('--collect, --cache and --shared-artifacts'
+                                   ' cannot be used with --branch')
+        if num_procs == 'auto':
+            num_procs = get_worker_sizing(
+                spec_files, timing_history).estimate_workers()
+        run_branches(spec_files, num_draws, num_procs, on_result=on_result)
+        if summary:
+            aggregator.publish()
+        return
+
+    run_many(spec_files, num_draws, num_procs, on_result=on_result,
+             collect=collect, warm=warm, preload=preload,
+             preload_artifacts=preload_artifacts,
+             shared_artifacts=shared_artifacts, history=timing_history,
+             cache_dir=cache, min_free_mb=min_free_memory)
+
+    if summary:
+        aggregator.publish()
+
+@click.command()
+@click.argument('scenario', type=click.Choice(['minimal', 'uncertainty']))
+@click.option('-d', '--draws', default=5, metavar='NUM',
+              help='The number of draws for which to run simulations')
+@click.option('-s', '--spawn', default=1, metavar='NUM',
+              help='The number of tasks to run in parallel')
+@click.option('--history', type=click.Path(), metavar='FILE',
+              help='Record the time taken by each simulation in this file')
+@click.option('--timings', default=TIMINGS_FILE, type=click.Path(),
+              metavar='FILE',
+              help='Simulation timings written by simulate_all_models.py')
+@click.option('--cache', type=click.Path(), metavar='DIR',
+              help='Reuse the outputs of simulations cached in this directory')
+@click.option('--summary', type=click.Path(), metavar='FILE',
+              help='Summarise the outputs across draws in this CSV file')
+@click.option('--summary-every', default=0, metavar='NUM',
+              help='Publish an interim summary after every NUM draws')
+@click.option('--rebuild', is_flag=True,
+              help='Rebuild the artifact tables of the selected variants, '
+                   'even if their inputs are unchanged')
+@click.option('--layout', type=click.Choice(LAYOUTS),
+              help='The layout in which the artifact tables are stored '
+                   '(default: as per make_artifacts)')
+@click.option('--variant', 'variants', multiple=True,
+              type=click.Choice(list(VARIANTS) + ['all']),
+              callback=parse_variants,
+              help='A variant of the epidemic input data to build and '
+                   'simulate (default: base); may be repeated, or use "all"')
+@click.option('--chunk-draws', type=click.IntRange(min=1), metavar='NUM',
+              help='The number of draws of each artifact table to calculate '
+                   'at once (default: as per make_artifacts)')
+def run_all(scenario, draws, spawn, history, timings, cache, summary,
+            summary_every, rebuild, layout, variants, chunk_draws):
+    """
+    Build the artifacts and model specifications, run the simulations and
+    summarise their outputs, starting each step as soon as its inputs are
+    ready.
+    """
+    logging.basicConfig(level=logging.INFO)
+
+    artifact_draws = default_artifact_draws(scenario)
+    if layout is None:
+        layout = default_layout(scenario)
+    if chunk_draws is None:
+        chunk_draws = default_chunk_draws(scenario)
+    failed = run_workflow(Path('.'), draws, spawn, artifact_draws,
+                          summary_file=summary, summary_every=summary_every,
+                          history_file=history, cache_dir=cache,
+                          rebuild=rebuild, layout=layout,
+                          variants=variants, chunk_draws=chunk_draws,
+                          timings_file=timings)
+    if failed:
+        raise click.ClickException(f'{len(failed)} tasks failed or were '
+                                   f'not run')
+
+@click.command()
+@click.option('-d', '--draws', default=5, metavar='NUM',
+              help='The number of draws for which to run simulations')
+@click.option('--watch', is_flag=True,
+              help='Report progress until all simulations have finished')
+@click.option('--interval', default=60, metavar='SECONDS',
+              help='The time between progress reports')
+@click.argument('queue', type=click.Path())
+@click.argument('spec_files', type=click.Path(exists=True), nargs=-1)
+def coordinate_jobs(draws, watch, interval, queue, spec_files):
+    """
+    Add simulations to a shared job queue and report their progress.
+
+    The simulations are run by starting workers on any machine that can
+    access the queue (``run_uncertainty_analysis --queue QUEUE --worker``).
+    You can provide any number of model specification files.
+    """
+    logging.basicConfig(level=logging.INFO)
+
+    job_queue = JobQueue(queue)
+    if spec_files:
+        added = job_queue.enqueue(spec_files, draws)
+        logging.info(f'Added {added} simulations to {queue}')
+
+    while True:
+        counts = job_queue.progress()
+        click.echo(', '.join(f'{status}: {count}'
+                             for (status, count) in counts.items()))
+        if not watch or job_queue.unfinished() == 0:
+            break
+        time.sleep(interval)
+
+@click.command()
+@click.argument('cache_dir', type=click.Path(exists=True, file_okay=False))
+@click.argument('spec_files', type=click.Path(), nargs=-1)
+def invalidate_cache(cache_dir, spec_files):
+    """
+    Remove cached simulation outputs, so that these simulations will be run
+    again.
+
+    If any model specification files are provided, only the outputs of these
+    model specifications are removed; otherwise the entire cache is cleared.
+    """
+    logging.basicConfig(level=logging.INFO)
+
+    cache = ResultCache(cache_dir)
+    cache.invalidate(spec_files if spec_files else None)
+
+@click.command()
+@click.option('-o', '--output', default=None, type=click.Path(file_okay=False),
+              metavar='DIR',
+              help='The bundle directory (default: the model_spec file with suffix .bundle)')
+@click.argument('spec_file', type=click.Path(exists=True, dir_okay=False))
+def compile_bundle(output, spec_file):
+    """
+    Compile a model_spec file into a run bundle: a directory that contains
+    the artifact tables that this simulation loads, as memory-mapped arrays,
+    and a model_spec file that reads its tables from the bundle.
+    """
+    logging.basicConfig(level=logging.INFO)
+
+    bundle_spec = compile_run_bundle(spec_file, output)
+    click.echo(str(bundle_spec))
+
+@click.command()
+@click.option('-o', '--output', default=None, type=click.Path(),
+              metavar='FILE',
+              help='The CSV file in which to save the summary')
+@click.argument('history_file', type=click.Path(exists=True))
+def summarise_telemetry(output, history_file):
+    """
+    Summarise the run telemetry recorded with the --history option of
+    run_uncertainty_analysis, for each model_spec file and package version.
+    """
+    logging.basicConfig(level=logging.INFO)
+
+    summary = summarise_history(history_file)
+    if output is None:
+        click.echo(summary.to_string(index=False))
+    else:
+        summary.to_csv(output, index=False)
+
+@click.command()
+@click.option('-r', '--rate', 'rates', type=float, multiple=True,
+              required=True, metavar='RATE',
+              help='An annual discount rate (may be given multiple times)')
+@click.option('--step-size', type=int, metavar='DAYS',
+              help='The simulation time-step size, in days (default: '
+                   'inferred from the output dates, which it must match)')
+@click.option('-o', '--output', default='discounted_totals.csv',
+              type=click.Path(), metavar='FILE',
+              help='The CSV file in which to save the discounted totals')
+@click.argument('result_files', type=click.Path(exists=True), nargs=-1)
+def rediscount_results(rates, step_size, output, result_files):
+    """
+    Discount the HALYs and health costs in existing simulation outputs at
+    one or more discount rates, without re-running the simulations.
+
+    You can provide any number of morbidity and mortality output files.
+    """
+    logging.basicConfig(level=logging.INFO)
+
+    logging.info(f'Discounting {len(result_files)} output files at rates '
+                 f'{list(rates)}')
+
+    try:
+        df = rediscount_files(result_files, rates, step_size)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    df.to_csv(output, index=False)
@@ -0,0 +1,310 @@
+"""
+================
+Compact Artifact
+================
+
+This module contains tools for storing artifact tables in a compact layout:
+each table is stored as a table of bins (the age, sex and year columns) and
+a single contiguous matrix of values (bins by draws), which is chunked along
+the draw axis and may be compressed. A single draw, or every draw, can be
+read from this matrix without parsing the rows of a generic table.
+
+Tables in this layout are stored under their usual entity key and are listed
+in the artifact's keyspace, but they can only be read by the artifact
+managers in this package (see
+:class:`~vivarium_unimelb_COVID19.artifact_cache.TimedArtifactManager`) and
+by :func:`load_entity`, rather than by :meth:`Artifact.load`.
+
+"""
+import os
+
+import numpy as np
+import pandas as pd
+import tables
+
+from vivarium.framework.artifact import hdf
+
+
+LAYOUT_ATTR = 'layout'
+"""The group attribute that identifies tables stored in the compact layout."""
+
+COMPACT_LAYOUT = 'compact'
+"""The value of ``LAYOUT_ATTR`` for tables stored in the compact layout."""
+
+BINS_NODE = 'bins'
+"""The name of the node that contains the bins of each table."""
+
+VALUES_NODE = 'values'
+"""The name of the node that contains the values of each table."""
+
+CHUNK_DRAWS = 16
+"""The number of draws in each chunk of the values matrix."""
+
+COMPLIB = 'blosc'
+"""The compression library used when the values are compressed."""
+
+
+_ENTRIES = {}
+"""The bins and columns of each table in the compact layout that has been
+read by this process (or ``None`` for tables in other layouts), keyed by
+artifact path and modification time."""
+
+
+def can_store(data):
+    """
+    Return whether a table can be stored in the compact layout: it must be
+    indexed by its bins, and every column must be a numeric draw column (or
+    a single ``value`` column).
+
+    Parameters
+    ----------
+    data
+        The table, indexed by its bins.
+
+    """
+    if not isinstance(data, pd.DataFrame) or data.empty:
+        return False
+    if not all(str(c).startswith('draw_') or c == 'value'
+               for c in data.columns):
+        return False
+    return all(pd.api.types.is_numeric_dtype(dtype) for dtype in data.dtypes)
+
+
+def write_table(artifact, entity_key, data, complevel=0,
+                chunk_draws=CHUNK_DRAWS):
+    """
+    Write a table to an artifact in the compact layout.
+
+    Parameters
+    ----------
+    artifact
+        The artifact object.
+    entity_key
+        The key associated with the table.
+    data
+        The table, indexed by its bins (see :func:`can_store`).
+    complevel
+        The compression level (0--9); the values are not compressed if this
+        is zero.
+    chunk_draws
+        The number of draws in each chunk of the values matrix.
+
+    """
+    if entity_key in artifact.keys:
+        raise ValueError('{} already in artifact'.format(entity_key))
+    path = hdf.EntityKey(entity_key).path
+    bins = data.index.to_frame(index=False)
+    values = np.ascontiguousarray(data.values, dtype=float)
+
+    # NOTE: the fixed format stores text columns (e.g., sex) as variable
+    # length arrays with large chunks, so we use the table format.
+    with pd.HDFStore(artifact.path, mode='a', complevel=9) as store:
+        store.put('{}/{}'.format(path, BINS_NODE), bins, format='table')
+    with tables.open_file(artifact.path, mode='a') as f:
+        group = f.get_node(path)
+        group._v_attrs[LAYOUT_ATTR] = COMPACT_LAYOUT
+        group._v_attrs['columns'] = [str(c) for c in data.columns]
+        if complevel:
+            filters = tables.Filters(complevel=complevel, complib=COMPLIB)
+        else:
+            filters = None
+        chunkshape = (max(1, values.shape[0]),
+                      max(1, min(chunk_draws, values.shape[1])))
+        # NOTE: the values matrix is extendable along the draw axis, so that
+        # further draws can be appended (see append_columns).
+        array = f.create_earray(group, VALUES_NODE, atom=tables.Float64Atom(),
+                                shape=(values.shape[0], 0),
+                                chunkshape=chunkshape, filters=filters)
+        array.append(values)
+        array.flush()
+
+    # NOTE: the artifact does not provide a public method for adding a key
+    # without writing the data, so we update its keyspace directly.
+    artifact._keys.append(entity_key)
+
+
+def append_columns(artifact, entity_key, data):
+    """
+    Append value columns (e.g., further draws) to a table that is stored in
+    the compact layout, without reading the existing values.
+
+    Parameters
+    ----------
+    artifact
+        The artifact object.
+    entity_key
+        The key associated with the table.
+    data
+        The columns to append, indexed by the same bins (in the same order)
+        as the stored table.
+
+    """
+    entry = get_entry(artifact.path, entity_key)
+    if entry is None:
+        raise ValueError('{} is not stored in the compact layout in {}'.format(
+            entity_key, artifact.path))
+    if not data.index.equals(entry['index']):
+        raise ValueError('The bins of {} differ from those in {}'.format(
+            entity_key, artifact.path))
+    columns = [str(c) for c in data.columns]
+    duplicates = set(columns) & set(entry['columns'])
+    if duplicates:
+        raise ValueError('Columns {} are already in {}'.format(
+            sorted(duplicates), entity_key))
+    values = np.ascontiguousarray(data.values, dtype=float)
+
+    path = hdf.EntityKey(entity_key).path
+    with tables.open_file(artifact.path, mode='a') as f:
+        array = f.get_node('{}/{}'.format(path, VALUES_NODE))
+        if not isinstance(array, tables.EArray):
+            raise ValueError('The values of {} cannot be extended'.format(
+                entity_key))
+        array.append(values)
+        array.flush()
+        group = f.get_node(path)
+        group._v_attrs['columns'] = entry['columns'] + columns
+    # NOTE: the file's modification time may not change if it is modified
+    # twice in quick succession, so we also update the cached entry.
+    entry['columns'] = entry['columns'] + columns
+
+
+def get_entry(artifact_path, entity_key):
+    """
+    Return the bin index and the value columns of a table stored in the
+    compact layout, or ``None`` if the table is stored in another layout (or
+    does not exist). These are only read the first time that each table is
+    requested by each process, and are discarded when the artifact file is
+    modified.
+
+    Parameters
+    ----------
+    artifact_path
+        The path to the artifact file.
+    entity_key
+        The key associated with the table.
+
+    """
+    artifact_path = str(artifact_path)
+    cache_key = (artifact_path, os.stat(artifact_path).st_mtime_ns)
+    if cache_key not in _ENTRIES:
+        # Discard entries from earlier versions of this artifact.
+        for stale_key in [k for k in _ENTRIES if k[0] == artifact_path]:
+            del _ENTRIES[stale_key]
+        _ENTRIES[cache_key] = {}
+    entries = _ENTRIES[cache_key]
+    if entity_key in entries:
+        return entries[entity_key]
+
+    path = hdf.EntityKey(entity_key).path
+    entry = None
+    with tables.open_file(artifact_path, mode='r') as f:
+        if path in f:
+            node = f.get_node(path)
+            if (isinstance(node, tables.Group)
+                    and LAYOUT_ATTR in node._v_attrs
+                    and node._v_attrs[LAYOUT_ATTR] == COMPACT_LAYOUT):
+                entry = {'columns': list(node._v_attrs['columns'])}
+    if entry is not None:
+        bins = pd.read_hdf(artifact_path, '{}/{}'.format(path, BINS_NODE))
+        index = pd.MultiIndex.from_frame(bins)
+        if index.nlevels == 1:
+            index = index.get_level_values(0)
+        entry['index'] = index
+    entries[entity_key] = entry
+    return entry
+
+
+def clear_cache():
+    """Discard the bins of every table that has been read."""
+    _ENTRIES.clear()
+
+
+def is_compact(artifact_path, entity_key):
+    """
+    Return whether a table is stored in the compact layout.
+
+    Parameters
+    ----------
+    artifact_path
+        The path to the artifact file.
+    entity_key
+        The key associated with the table.
+
+    """
+    return get_entry(artifact_path, entity_key) is not None
+
+
+def load_table(artifact_path, entity_key, draw=None):
+    """
+    Return a table stored in the compact layout, indexed by its bins (i.e.,
+    as per :meth:`Artifact.load` for a table in the generic layout).
+
+    If a draw is selected, only the chunk of the values matrix that contains
+    this draw is read, so the time taken does not depend on the number of
+    draws in the table.
+
+    Parameters
+    ----------
+    artifact_path
+        The path to the artifact file.
+    entity_key
+        The key associated with the table.
+    draw
+        The draw number, or ``None`` to read every draw. Tables without draw
+        columns are read in full.
+
+    """
+    entry = get_entry(artifact_path, entity_key)
+    if entry is None:
+        raise ValueError('{} is not stored in the compact layout in {}'.format(
+            entity_key, artifact_path))
+    columns = entry['columns']
+    path = '{}/{}'.format(hdf.EntityKey(entity_key).path, VALUES_NODE)
+    with tables.open_file(str(artifact_path), mode='r') as f:
+        array = f.get_node(path)
+        draw_col = None if draw is None else 'draw_{}'.format(draw)
+        if draw_col in columns:
+            ix = columns.index(draw_col)
+            columns = [draw_col]
+            values = array[:, ix:ix + 1]
+        else:
+            values = array[:, :]
+    return pd.DataFrame(values, index=entry['index'], columns=columns)
+
+
+def load_entity(artifact, entity_key):
+    """
+    Return the data associated with a key in an artifact, whatever layout it
+    is stored in, as per :meth:`Artifact.load`.
+
+    Parameters
+    ----------
+    artifact
+        The artifact object.
+    entity_key
+        The key associated with the data.
+
+    """
+    # NOTE: the artifact retains each table that it loads, so we add tables
+    # in the compact layout to its cache.
+    if (entity_key in artifact.keys and entity_key not in artifact._cache
+            and is_compact(artifact.path, entity_key)):
+        artifact._cache[entity_key] = load_table(artifact.path, entity_key)
+    return artifact.load(entity_key)
+
+
+def load_keys(artifact_path):
+    """
+    Return the keys in an artifact's keyspace (including tables stored in
+    the compact layout, which are not listed by :func:`hdf.get_keys`).
+
+    Parameters
+    ----------
+    artifact_path
+        The path to the artifact file.
+
+    """
+    if not os.path.exists(str(artifact_path)):
+        return []
+    return [str(key) for key in
+            hdf.load(str(artifact_path), 'metadata.keyspace', None, None)]
@@ -0,0 +1,157 @@
+"""
+===========
+Discounting
+===========
+
+This module contains tools for discounting the HALYs and health costs
+recorded by the :class:`~vivarium_unimelb_COVID19.observer.MorbidityMortality`
+observer, at any number of discount rates, without re-running the
+simulations.
+
+The observer discounts each time-step at the rate ``discount_rate`` per year,
+compounded at each time-step, so the discount factor at the ``n``-th recorded
+time-step is ``(1 + discount_rate * step_size / 365) ** -n``. The time-step
+size is inferred from the dates of the recorded time-steps.
+
+"""
+import numpy as np
+import pandas as pd
+
+
+DISCOUNTED_COLUMNS = ['HALY', 'bau_HALY', 'expenditure', 'bau_expenditure']
+"""The undiscounted observer outputs that are discounted."""
+
+
+def discount_factors(steps, rates, step_size=30):
+    """
+    Return the discount factors for each recorded time-step.
+
+    Parameters
+    ----------
+    steps
+        The (1-based) time-step number of each record.
+    rates
+        The annual discount rates.
+    step_size
+        The simulation time-step size, in days.
+
+    Returns
+    -------
+        An array of shape ``(r, n)`` for ``r`` discount rates and ``n``
+        records.
+
+    """
+    rates = np.asarray(rates, dtype=float)
+    steps = np.asarray(steps, dtype=float)
+    step_rates = rates * step_size / 365
+    return np.power(1 + step_rates[:, np.newaxis], - steps[np.newaxis, :])
+
+
+def infer_step_size(data):
+    """
+    Return the simulation time-step size, in days, from the dates of the
+    time-steps recorded by an observer.
+
+    Parameters
+    ----------
+    data
+        The observer output table, which must contain ``step`` and ``date``
+        columns.
+
+    Returns
+    -------
+        The time-step size, or ``None`` if fewer than two time-steps were
+        recorded.
+
+    """
+    dates = pd.to_datetime(data.groupby('step')['date'].first())
+    steps = dates.index.values
+    if len(steps) < 2:
+        return None
+    days = np.diff(dates.values).astype('timedelta64[D]').astype(int)
+    sizes = np.unique(days / np.diff(steps))
+    if len(sizes) != 1:
+        raise ValueError('Observer outputs have inconsistent time-step sizes '
+                         '{}'.format(list(sizes)))
+    step_size = float(sizes[0])
+    return int(step_size) if step_size.is_integer() else step_size
+
+
+def rediscount(data, rates, step_size=None, columns=None):
+    """
+    Calculate the discounted totals of the undiscounted outputs recorded by
+    an observer, for each discount rate.
+
+    Parameters
+    ----------
+    data
+        The observer output table, which must contain ``step`` and ``date``
+        columns and one record per cohort per time-step.
+    rates
+        The annual discount rates.
+    step_size
+        The simulation time-step size, in days (default: inferred from the
+        recorded dates); this must agree with the recorded dates.
+    columns
+        The columns to discount (default: ``DISCOUNTED_COLUMNS``).
+
+    Returns
+    -------
+        A table of the discounted totals, with one row per discount rate.
+
+    """
+    if columns is None:
+        columns = DISCOUNTED_COLUMNS
+    if 'step' not in data.columns:
+        raise ValueError('Observer outputs do not record the time-step')
+    steps = np.unique(data['step'].values)
+    if np.any(np.diff(steps) != 1):
+        raise ValueError('Observer outputs must be recorded at every time-step')
+    if 'date' not in data.columns:
+        raise ValueError('Observer outputs do not record the date')
+    inferred = infer_step_size(data)
+    if step_size is None:
+        if inferred is None:
+            raise ValueError('Cannot infer the time-step size from a single '
+                             'time-step')
+        step_size = inferred
+    elif inferred is not None and inferred != step_size:
+        raise ValueError('The time-step size is {} days, but the observer '
+                         'outputs were recorded every {} days'.format(
+                             step_size, inferred))
+
+    factors = discount_factors(data['step'].values, rates, step_size)
+    totals = factors @ data[columns].values
+
+    df = pd.DataFrame(totals, columns=columns)
+    df.insert(0, 'discount_rate', np.asarray(rates, dtype=float))
+    return df
+
+
+def rediscount_files(result_files, rates, step_size=None, columns=None):
+    """
+    Calculate the discounted totals for each observer output file, for each
+    discount rate.
+
+    Parameters
+    ----------
+    result_files
+        The observer output (CSV) files.
+    rates
+        The annual discount rates.
+    step_size
+        The simulation time-step size, in days (default: inferred from the
+        recorded dates of each file).
+    columns
+        The columns to discount (default: ``DISCOUNTED_COLUMNS``).
+
+    """
+    if columns is None:
+        columns = DISCOUNTED_COLUMNS
+    tables = []
+    for result_file in result_files:
+        data = pd.read_csv(result_file, usecols=['step', 'date'] + columns)
+        df = rediscount(data, rates, step_size, columns)
+        df.insert(0, 'file', str(result_file))
+        tables.append(df)
+    return pd.concat(tables, ignore_index=True)
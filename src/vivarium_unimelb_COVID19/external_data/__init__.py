@@ -1,3 +1,3 @@
 from .artifact import assemble_artifacts
 from .build_simulation_files import create_model_specifications
-from .parallel import run_many
\ No newline at end of file
+from .parallel import run_many, run_batch, get_draw_numbers
\ No newline at end of file
@@ -1,19 +1,30 @@
 import datetime
+import hashlib
+import importlib
+import inspect
+import json
 import logging
 import os
+from collections import OrderedDict, namedtuple
 from pathlib import Path
 
 import numpy as np
 import pandas as pd
+import tables
 from vivarium.framework.artifact import hdf
 from vivarium.framework.artifact import Artifact
 
+from vivarium_unimelb_COVID19 import compact_artifact
+from vivarium_unimelb_COVID19.__about__ import __version__
 from vivarium_unimelb_COVID19.external_data.population import Population
 from vivarium_unimelb_COVID19.external_data.epidemic import Epidemic
 from vivarium_unimelb_COVID19.external_data.mortality_effects import MortEffects
 from vivarium_unimelb_COVID19.external_data.disease import AcuteDisease
 from vivarium_unimelb_COVID19.external_data.disease_modifier import Disease_modifier
 from vivarium_unimelb_COVID19.external_data.uncertainty import Normal, LogNormal
+from vivarium_unimelb_COVID19.external_data.parallel import run_in_parallel
+from vivarium_unimelb_COVID19.external_data.input_cache import (
+    hash_file, hash_input_file)
 
 #YEAR_START = 2011
 BASE_LIFETABLE_YEAR_START = 2017
@@ -24,14 +35,21 @@ RANDOM_SEED = 49430
 #POPULATIONS = ['australia','new_zealand','sweden']
 POPULATIONS = ['australia','new_zealand']
 ACUTE_DISEASES = ['RTC', 'SelfHarm']
-SCENARIOS = ['elimination', 'flatten', 'suppress']
-#SCENARIOS = ['elimination_asymp', 'flatten_asymp', 'suppress_asymp']
-#SCENARIOS = ['elimination_verity', 'flatten_verity', 'suppress_verity']
-#SCENARIOS = ['suppress_0point5inf', 'suppress_5inf', 'flatten_60inf']
-#SCENARIOS = ['elimination_24m', 'flatten_24m', 'suppress_24m']
-#SCENARIOS = ['elimination_36m', 'flatten_36m', 'suppress_36m']
-#SCENARIOS = ['elimination_doubledr', 'flatten_doubledr', 'suppress_doubledr']
-#SCENARIOS = ['elimination_halfifr', 'flatten_halfifr', 'suppress_halfifr']
+
+#The intervention scenarios of each variant of the epidemic input data. The
+#input data files of each variant have the suffix '_<variant>' (e.g.,
+#dead_table_asymp.csv), except for the base variant (see get_variant_suffix).
+VARIANTS = OrderedDict([
+    ('base', ['elimination', 'flatten', 'suppress']),
+    ('asymp', ['elimination_asymp', 'flatten_asymp', 'suppress_asymp']),
+    ('verity', ['elimination_verity', 'flatten_verity', 'suppress_verity']),
+    ('misc', ['suppress_0point5inf', 'suppress_5inf', 'flatten_60inf']),
+    ('24m', ['elimination_24m', 'flatten_24m', 'suppress_24m']),
+    ('36m', ['elimination_36m', 'flatten_36m', 'suppress_36m']),
+    ('doubledr', ['elimination_doubledr', 'flatten_doubledr', 'suppress_doubledr']),
+    ('halfifr', ['elimination_halfifr', 'flatten_halfifr', 'suppress_halfifr']),
+])
+BASE_VARIANT = 'base'
 
 
 def check_for_bin_edges(df):
@@ -45,129 +63,815 @@ def check_for_bin_edges(df):
     else:
         raise ValueError('Table does not have bins')
 
+
+def get_variant_suffix(variant):
+    """
+    Return the suffix of the input data files for a variant of the epidemic
+    input data (see ``VARIANTS``).
+
+    :param variant: The variant name.
+    """
+    if variant not in VARIANTS:
+        raise ValueError('Unknown variant: {}'.format(variant))
+    return '' if variant == BASE_VARIANT else '_{}'.format(variant)
+
+
+def get_variant_scenarios(variants):
+    """
+    Return the intervention scenarios of one or more variants of the
+    epidemic input data.
+
+    :param variants: The variant names.
+    """
+    return [scenario for variant in variants for scenario in VARIANTS[variant]]
+
 def get_data_dir(population):
     here = Path(__file__).resolve()
     return here.parent / 'input_data' / population
 
 
-def assemble_artifacts(num_draws, output_path: Path, seed: int = RANDOM_SEED):
+#A table that is written to an artifact: the artifact key, the data source
+#(see get_table_source) that provides the table, the source method (and its
+#arguments) that returns the table, whether the table has a column for each
+#draw, and the number of draws that are read from the data source (see
+#get_draw_chunks).
+TableJob = namedtuple('TableJob', ['population', 'key', 'source',
+                                   'source_args', 'method', 'args',
+                                   'has_draws', 'num_draws'])
+
+#The data sources that have been loaded by this process.
+_TABLE_SOURCES = {}
+
+#The data source classes.
+SOURCE_TYPES = {
+    'population': Population,
+    'mortality_effects': MortEffects,
+    'epidemic': Epidemic,
+    'acute_disease': AcuteDisease,
+    'disease_modifier': Disease_modifier,
+}
+
+#The artifact key that records how each table was built (see
+#get_table_hash).
+BUILD_MANIFEST_KEY = 'metadata.build_manifest'
+
+#The modules that write the tables to the artifact, whose code affects every
+#table (see get_code_hashes).
+WRITER_MODULES = [
+    'vivarium_unimelb_COVID19.external_data.artifact',
+    'vivarium_unimelb_COVID19.compact_artifact',
+]
+
+#The layouts in which tables can be stored: the generic vivarium layout, the
+#compact layout (see vivarium_unimelb_COVID19.compact_artifact), and the
+#compact layout with compressed values.
+LAYOUTS = ['generic', 'compact', 'compressed']
+
+#The compression level of the 'compressed' layout.
+COMPRESSED_LEVEL = 5
+
+#The number of draws of each table in the uncertainty artifacts.
+UNCERTAINTY_DRAWS = 2000
+
+#The default number of draws of each table that are calculated at once when
+#building artifacts with many draws (see get_draw_chunks).
+DEFAULT_CHUNK_DRAWS = 200
+
+
+def assemble_artifacts(num_draws, output_path: Path, seed: int = RANDOM_SEED,
+                       workers: int = 1, rebuild: bool = False,
+                       layout: str = 'generic',
+                       variants=(BASE_VARIANT,), chunk_draws=None):
     """
     Assemble the data artifacts required to simulate the various interventions.
 
     Parameters
     ----------
     num_draws
-        The number of random draws to sample for each rate and quantity,
-        for the uncertainty analysis.
+        The number of draws of each table (``draw_0`` to ``draw_<n - 1>``),
+        which must be present in the input data, or ``None`` for the number
+        of draws (``DRAW_NUM``) defined by each data source module.
     output_path
         The path to the artifact being assembled.
     seed
         The seed for the pseudo-random number generator used to generate the
         random samples.
+    workers
+        The number of processes that calculate the tables; if this is greater
+        than one, the tables for every population are calculated in parallel
+        (see :func:`assemble_artifacts_in_parallel`).
+    rebuild
+        Whether to rebuild every table of the selected variants, rather than
+        only those tables whose inputs have changed (see :class:`ArtifactWriter`).
+    layout
+        The layout in which the tables are stored (see ``LAYOUTS``).
+    variants
+        The variants of the epidemic input data (see ``VARIANTS``) whose
+        tables are written to each artifact; the tables that do not depend
+        on the variant are only written once.
+    chunk_draws
+        The number of draws of each table that are calculated at once (see
+        :func:`get_draw_chunks`), or ``None`` to calculate every draw at
+        once.
+
+    """
+    if workers > 1:
+        assemble_artifacts_in_parallel(POPULATIONS, num_draws, output_path,
+                                       seed, workers, rebuild, layout,
+                                       variants, chunk_draws)
+        return
+
+    for population in POPULATIONS:
+        assemble_artifact(population, num_draws, output_path, seed, rebuild,
+                          layout, variants, chunk_draws)
+
+
+def assemble_artifact(population, num_draws, output_path: Path,
+                      seed: int = RANDOM_SEED, rebuild: bool = False,
+                      layout: str = 'generic', variants=(BASE_VARIANT,),
+                      chunk_draws=None):
+    """
+    Assemble the data artifact for a single population.
+
+    Parameters
+    ----------
+    population
+        The population name (i.e., the input data directory).
+    num_draws
+        The number of draws of each table (``draw_0`` to ``draw_<n - 1>``),
+        which must be present in the input data, or ``None`` for the number
+        of draws (``DRAW_NUM``) defined by each data source module.
+    output_path
+        The directory in which the artifact is written.
+    seed
+        The seed for the pseudo-random number generator used to generate the
+        random samples.
+    rebuild
+        Whether to rebuild every table of the selected variants, rather than
+        only those tables whose inputs have changed.
+    layout
+        The layout in which the tables are stored (see ``LAYOUTS``).
+    variants
+        The variants of the epidemic input data (see ``VARIANTS``).
+    chunk_draws
+        The number of draws of each table that are calculated at once, or
+        ``None`` to calculate every draw at once.
+
+    Returns
+    -------
+    The path to the artifact file.
 
     """
     prng = np.random.RandomState(seed=seed)
     logger = logging.getLogger(__name__)
 
-    for population in POPULATIONS:
-        data_dir = get_data_dir(population)
+    logger.info('{} Generating artifacts'.format(
+        datetime.datetime.now().strftime("%H:%M:%S")))
 
-        # Instantiate components for the population.
-        pop = Population(data_dir, BASE_LIFETABLE_YEAR_START)
-        mort = MortEffects(data_dir, SIMULATION_YEAR_START, 'ExcessMort')
-        epi = Epidemic(data_dir, SIMULATION_YEAR_START)
+    writer = ArtifactWriter(output_path, population, rebuild, layout,
+                            variants, chunk_draws, num_draws)
+    for job, draws in writer.tasks:
+        writer.add(job, calculate_table(job, draws), draws)
+    writer.check_complete()
+    _TABLE_SOURCES.clear()
 
-        # Now write all of the required tables:
-        pop_artifact_fmt = '{}.hdf'.format(population)
+    print(writer.artifact_file)
+    return writer.artifact_file
 
-        logger.info('{} Generating artifacts'.format(
-            datetime.datetime.now().strftime("%H:%M:%S")))
 
-        pop_artifact_file = output_path / pop_artifact_fmt
+def assemble_artifacts_in_parallel(populations, num_draws, output_path: Path,
+                                   seed: int = RANDOM_SEED, workers: int = 2,
+                                   rebuild: bool = False,
+                                   layout: str = 'generic',
+                                   variants=(BASE_VARIANT,),
+                                   chunk_draws=None):
+    """
+    Assemble the data artifacts for several populations, calculating the
+    tables in a pool of worker processes.
 
+    The tables are sent to this process, which writes them to each artifact
+    in the same order as :func:`assemble_artifact`, so that the artifacts are
+    identical to those assembled by a single process.
 
-        # Initialise each artifact file.
-        if pop_artifact_file.exists():
-            pop_artifact_file.unlink()
+    Parameters
+    ----------
+    populations
+        The population names.
+    num_draws
+        The number of draws of each table (``draw_0`` to ``draw_<n - 1>``),
+        which must be present in the input data, or ``None`` for the number
+        of draws (``DRAW_NUM``) defined by each data source module.
+    output_path
+        The directory in which the artifacts are written.
+    seed
+        The seed for the pseudo-random number generator used to generate the
+        random samples.
+    workers
+        The number of worker processes.
+    rebuild
+        Whether to rebuild every table of the selected variants, rather than
+        only those tables whose inputs have changed.
+    layout
+        The layout in which the tables are stored (see ``LAYOUTS``).
+    variants
+        The variants of the epidemic input data (see ``VARIANTS``); the
+        tables for every variant are calculated in the same pool.
+    chunk_draws
+        The number of draws of each table that are calculated at once, or
+        ``None`` to calculate every draw at once.
+
+    Returns
+    -------
+    A list of the artifact files.
+
+    Raises
+    ------
+    RuntimeError
+        If any of the tables could not be calculated; the message contains
+        the key of the first table that failed and its traceback.
 
-        # Write the data tables to each artifact file.
-        art = Artifact(str(pop_artifact_file))
+    """
+    logger = logging.getLogger(__name__)
+    logger.info('{} Generating artifacts with {} workers'.format(
+        datetime.datetime.now().strftime("%H:%M:%S"), workers))
+
+    writers = {}
+    tasks = []
+    for population in populations:
+        writers[population] = ArtifactWriter(output_path, population, rebuild,
+                                             layout, variants, chunk_draws,
+                                             num_draws)
+        tasks.extend(writers[population].tasks)
+
+    def on_result(args, data):
+        job, draws = args
+        writers[job.population].add(job, data, draws)
+
+    errors = []
+
+    def on_error(args, error):
+        job, draws = args
+        errors.append((job, draws, error))
+
+    run_in_parallel(calculate_table, tasks, workers, on_result=on_result,
+                    on_error=on_error)
+
+    if errors:
+        job, draws, error = errors[0]
+        table = 'table {}'.format(job.key)
+        if draws is not None:
+            table = 'draws {} to {} of {}'.format(draws[0], draws[-1], table)
+        msg = 'Could not calculate {} for {} ({} of {} jobs failed):\n{}'
+        raise RuntimeError(msg.format(table, job.population, len(errors),
+                                      len(tasks), error))
+    for writer in writers.values():
+        writer.check_complete()
+        print(writer.artifact_file)
+    return [writer.artifact_file for writer in writers.values()]
+
+
+def get_source_draws(source, num_draws=None):
+    """
+    Return the number of draws that are read from a type of data source, or
+    ``None`` if the data source does not have draws.
 
-        # Write the main population tables.
-        logger.info('{} Writing population tables'.format(
-            datetime.datetime.now().strftime("%H:%M:%S")))
+    :param source: The type of data source.
+    :param num_draws: The number of draws, or ``None`` for the number of
+        draws (``DRAW_NUM``) defined by the data source module.
+    """
+    source_module = inspect.getmodule(SOURCE_TYPES[source])
+    if not hasattr(source_module, 'DRAW_NUM'):
+        return None
+    return source_module.DRAW_NUM if num_draws is None else num_draws
 
-        write_table(art, 'population.structure',
-                        pop.get_population())
-        write_table(art, 'cause.all_causes.mortality',
-                        pop.get_mortality_rate())
-        write_table(art, 'cause.all_causes.disability_rate',
-                        pop.get_disability_rate())
-        write_table(art, 'population.expenditure',
-                        pop.get_expenditure())
 
-        # Write the mortality effect tables.
-        logger.info('{} Writing mortality effects tables'.format(
-            datetime.datetime.now().strftime("%H:%M:%S")))
+def get_table_jobs(population, variants=(BASE_VARIANT,), num_draws=None):
+    """
+    Return the tables that are written to a population's artifact, in the
+    order that they are written.
+
+    The tables that do not depend on the variant of the epidemic input data
+    are only written once; the scenario names of each variant are distinct,
+    so the tables for every variant can be stored in the same artifact.
+
+    :param population: The population name.
+    :param variants: The variants of the epidemic input data (see
+        ``VARIANTS``).
+    :param num_draws: The number of draws of each table, or ``None`` for the
+        number of draws defined by each data source module.
+    """
+    if num_draws is not None and num_draws < 1:
+        raise ValueError('Invalid number of draws: {}'.format(num_draws))
+    jobs = []
+
+    def add(key, source, source_args, method, *args, draws=True):
+        jobs.append(TableJob(population, key, source, source_args, method,
+                             args, draws, get_source_draws(source, num_draws)))
+
+    # The main population tables.
+    add('population.structure', 'population', (), 'get_population',
+        draws=False)
+    add('cause.all_causes.base_mortality', 'population', (),
+        'get_base_mortality_rate')
+    add('cause.all_causes.mortality_apc', 'population', (),
+        'get_mortality_apc', draws=False)
+    add('cause.all_causes.mortality_projection', 'population', (),
+        'get_mortality_projection', draws=False)
+    add('cause.all_causes.disability_rate', 'population', (),
+        'get_disability_rate')
+    add('population.expenditure', 'population', (), 'get_expenditure')
+
+    # The mortality effect tables.
+    add('mortality_effects.ExcessMort', 'mortality_effects', ('ExcessMort',),
+        'get_mort_effects', draws=False)
+
+    # The epidemic tables.
+    for variant in variants:
+        suffix = (get_variant_suffix(variant),)
+        for scenario in VARIANTS[variant]:
+            add('COVID19.infection_prop.{}'.format(scenario), 'epidemic',
+                suffix, 'get_infection_proportion', scenario)
+            add('COVID19.fatality_risk.{}'.format(scenario), 'epidemic',
+                suffix, 'get_fatality_risk', scenario)
+            add('COVID19.disability_risk.{}'.format(scenario), 'epidemic',
+                suffix, 'get_disability_risk', scenario)
+            add('COVID19.health_cost.{}'.format(scenario), 'epidemic',
+                suffix, 'get_health_cost', scenario)
+
+    # The acute disease tables.
+    for disease in ACUTE_DISEASES:
+        add('acute_disease.{}.mortality'.format(disease), 'acute_disease',
+            (disease,), 'get_death_risk')
+        add('acute_disease.{}.morbidity'.format(disease), 'acute_disease',
+            (disease,), 'get_disability_risk')
+
+    # The disease modifier tables.
+    for variant in variants:
+        for disease in ACUTE_DISEASES:
+            source_args = ('unemployment', disease,
+                           get_variant_suffix(variant))
+            for scenario in VARIANTS[variant]:
+                add('acute_disease.{}.mortality_modifier_unemployment_{}'.format(disease, scenario),
+                    'disease_modifier', source_args,
+                    'get_disease_rate_scalar', scenario, 'mortality')
+                add('acute_disease.{}.disability_modifier_unemployment_{}'.format(disease, scenario),
+                    'disease_modifier', source_args,
+                    'get_disease_rate_scalar', scenario, 'disability')
 
-        write_table(art, 'mortality_effects.ExcessMort',
-                        mort.get_mort_effects())
+    return jobs
 
-        # Write epidemic tables.
-        logger.info('{} Writing epidemic tables'.format(
-            datetime.datetime.now().strftime("%H:%M:%S")))
 
-        for scenario in SCENARIOS:
-            write_table(art, 'COVID19.infection_prop.{}'.format(scenario),
-                        epi.get_infection_proportion(scenario))
-        
-            write_table(art, 'COVID19.fatality_risk.{}'.format(scenario),
-                        epi.get_fatality_risk(scenario))
+def get_table_source(population, source, source_args=(), draws=None):
+    """
+    Return the data source that provides some of a population's tables,
+    which is only loaded the first time that it is requested by each process.
+
+    Only the most recently requested chunk of draws of each data source is
+    retained, so that the memory used by each data source does not depend on
+    the number of draws.
+
+    :param population: The population name.
+    :param source: The type of data source.
+    :param source_args: Additional arguments for the data source.
+    :param draws: The draws to load (default: every draw); this is ignored
+        by data sources that do not have draws.
+    """
+    source_key = (population, source, tuple(source_args))
+    key = source_key + (draws,)
+    if key in _TABLE_SOURCES:
+        return _TABLE_SOURCES[key]
+    # Discard the other chunks of draws of this data source.
+    for other in [k for k in _TABLE_SOURCES if k[:3] == source_key]:
+        del _TABLE_SOURCES[other]
+
+    data_dir = get_data_dir(population)
+    if source == 'population':
+        value = Population(data_dir, BASE_LIFETABLE_YEAR_START, draws)
+    elif source == 'mortality_effects':
+        value = MortEffects(data_dir, SIMULATION_YEAR_START, *source_args)
+    elif source == 'epidemic':
+        value = Epidemic(data_dir, SIMULATION_YEAR_START, *source_args,
+                         draws=draws)
+    elif source == 'acute_disease':
+        value = AcuteDisease(data_dir, source_args[0], SIMULATION_YEAR_START,
+                             draws)
+    elif source == 'disease_modifier':
+        value = Disease_modifier(data_dir, SIMULATION_YEAR_START,
+                                 *source_args, draws=draws)
+    else:
+        raise ValueError('Unknown data source: {}'.format(source))
+    _TABLE_SOURCES[key] = value
+    return value
 
-            write_table(art, 'COVID19.disability_risk.{}'.format(scenario),
-                        epi.get_disability_risk(scenario))
 
-            write_table(art, 'COVID19.health_cost.{}'.format(scenario),
-                        epi.get_health_cost(scenario))       
+def get_draw_chunks(job, chunk_draws=None):
+    """
+    Return the chunks of draws in which a table is calculated, so that the
+    tables of artifacts with many draws can be calculated and written without
+    loading every draw of the input data at once. Each chunk is a ``range``
+    of draw numbers, or ``None`` for every draw (``job.num_draws``).
+
+    Tables without draw columns (and tables from data sources without draws)
+    are calculated in a single chunk; for these tables, only the first chunk
+    of draws of the data source is loaded.
+
+    :param job: The :class:`TableJob`.
+    :param chunk_draws: The number of draws in each chunk, or ``None`` to
+        calculate every draw at once.
+    """
+    if chunk_draws is None or job.num_draws is None:
+        return [None]
+    chunks = [range(start, min(start + chunk_draws, job.num_draws))
+              for start in range(0, job.num_draws, chunk_draws)]
+    if not job.has_draws:
+        return chunks[:1]
+    return chunks
 
-        # Write the acute disease tables.
-        for disease in ACUTE_DISEASES:
-            logger.info('{} Writing tables for {}'.format(
-                datetime.datetime.now().strftime("%H:%M:%S"), disease))
 
-            acdis = AcuteDisease(data_dir, disease, SIMULATION_YEAR_START)
+def get_input_patterns(job):
+    """
+    Return the (glob) patterns that match the input data files from which a
+    table is calculated, relative to the population's data directory. These
+    include only the files of the job's variant of the epidemic input data
+    (e.g., ``dead_table_asymp.csv``), so that changing the files of one
+    variant does not rebuild the tables of the other variants.
 
-            write_table(art, 'acute_disease.{}.mortality'.format(disease),
-                        acdis.get_death_risk())
-            
-            write_table(art, 'acute_disease.{}.morbidity'.format(disease),
-                        acdis.get_disability_risk())
+    :param job: The :class:`TableJob`.
+    """
+    if job.source == 'population':
+        return ['base_population*.csv']
+    elif job.source == 'mortality_effects':
+        return ['{}_mortality_effects.csv'.format(*job.source_args)]
+    elif job.source == 'epidemic':
+        prefixes = {'get_infection_proportion': 'percent_infected',
+                    'get_fatality_risk': 'dead_table',
+                    'get_disability_risk': 'dr_table',
+                    'get_health_cost': 'popcost_table'}
+        return ['{}{}.csv'.format(prefixes[job.method], *job.source_args)]
+    elif job.source == 'acute_disease':
+        return ['diseases/{}_disease_input*.csv'.format(*job.source_args)]
+    elif job.source == 'disease_modifier':
+        modifier, disease, suffix = job.source_args
+        if suffix:
+            return ['diseases/{}_{}_pif_scenario{}.csv'.format(
+                disease, modifier, suffix)]
+        return ['diseases/{}_{}_pif.csv'.format(disease, modifier)]
+    raise ValueError('Unknown data source: {}'.format(job.source))
+
+
+def get_code_hashes(source):
+    """
+    Return a hash of each module whose code affects the tables of a data
+    source: the module that defines the data source, the modules in this
+    package from which it imports (e.g., the input data reader and the
+    mortality projection), and the ``WRITER_MODULES``.
+
+    :param source: The data source name (see ``SOURCE_TYPES``).
+    """
+    source_module = inspect.getmodule(SOURCE_TYPES[source])
+    modules = {source_module.__name__: source_module}
+    for value in vars(source_module).values():
+        module = inspect.getmodule(value)
+        if module is not None and module.__name__.startswith(
+                'vivarium_unimelb_COVID19.'):
+            modules[module.__name__] = module
+    for name in WRITER_MODULES:
+        modules[name] = importlib.import_module(name)
+    return {name: hash_file(inspect.getsourcefile(module))
+            for name, module in modules.items()}
+
+
+def get_table_hash(job, layout='generic'):
+    """
+    Return a hash of everything from which a table is calculated: the input
+    data files, the code that calculates and writes it (see
+    :func:`get_code_hashes`), the number of draws, the starting year, the
+    method arguments (e.g., the scenario) and the package version, and of the
+    layout in which it is stored.
+
+    :param job: The :class:`TableJob`.
+    :param layout: The layout in which the table is stored.
+    """
+    data_dir = get_data_dir(job.population)
+    files = {}
+    for pattern in get_input_patterns(job):
+        for path in sorted(data_dir.glob(pattern)):
+            files[str(path.relative_to(data_dir))] = hash_input_file(path)
+
+    if job.source == 'population':
+        year_start = BASE_LIFETABLE_YEAR_START
+    else:
+        year_start = SIMULATION_YEAR_START
+    content = json.dumps({
+        'key': job.key,
+        'source': [job.source] + list(job.source_args),
+        'method': [job.method] + list(job.args),
+        'files': files,
+        'code': get_code_hashes(job.source),
+        'draws': job.num_draws,
+        'year_start': year_start,
+        'version': __version__,
+        'layout': layout,
+    }, sort_keys=True)
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+def load_build_manifest(artifact_file):
+    """
+    Return the hash of each table in an artifact, as recorded when the
+    artifact was built, or an empty dictionary if the artifact does not
+    exist or was built without a manifest.
+
+    :param artifact_file: The artifact file.
+    """
+    if not Path(artifact_file).exists():
+        return {}
+    if BUILD_MANIFEST_KEY not in compact_artifact.load_keys(artifact_file):
+        return {}
+    return hdf.load(str(artifact_file), BUILD_MANIFEST_KEY, None, None)
+
+
+def get_stale_jobs(artifact_file, population, hashes=None, layout='generic',
+                   variants=(BASE_VARIANT,), num_draws=None):
+    """
+    Return the tables in a population's artifact that must be (re)built:
+    those that are missing, or whose hash (see :func:`get_table_hash`)
+    differs from the hash recorded in the artifact.
+
+    :param artifact_file: The artifact file.
+    :param population: The population name.
+    :param hashes: The hash of each table, if already calculated.
+    :param layout: The layout in which the tables are stored.
+    :param variants: The variants of the epidemic input data (see
+        ``VARIANTS``).
+    :param num_draws: The number of draws of each table (see
+        :func:`get_table_jobs`).
+    """
+    jobs = get_table_jobs(population, variants, num_draws)
+    if hashes is None:
+        hashes = {job.key: get_table_hash(job, layout) for job in jobs}
+    manifest = load_build_manifest(artifact_file)
+    if manifest:
+        keys = set(compact_artifact.load_keys(artifact_file))
+    else:
+        keys = set()
+    return [job for job in jobs
+            if job.key not in keys or manifest.get(job.key) != hashes[job.key]]
 
-        # Write disease modifier tables.
-        logger.info('{} Writing disease modifier tables'.format(
-                datetime.datetime.now().strftime("%H:%M:%S")))
-        for disease in ACUTE_DISEASES:
-            unempl = Disease_modifier(data_dir, SIMULATION_YEAR_START, 'unemployment', disease)
-            for scenario in SCENARIOS:
-                write_table(art, 'acute_disease.{}.mortality_modifier_unemployment_{}'.format(disease, scenario),
-                                unempl.get_disease_rate_scalar(scenario, 'mortality'))
 
-                write_table(art, 'acute_disease.{}.disability_modifier_unemployment_{}'.format(disease, scenario),
-                                unempl.get_disease_rate_scalar(scenario, 'disability'))
+def calculate_table(job, draws=None):
+    """
+    Calculate a table that is written to an artifact.
 
+    :param job: The :class:`TableJob`.
+    :param draws: The draws to calculate (default: every draw; see
+        :func:`get_draw_chunks`).
+    """
+    if draws is None and job.num_draws is not None:
+        draws = range(job.num_draws)
+    source = get_table_source(job.population, job.source, job.source_args,
+                              draws)
+    return getattr(source, job.method)(*job.args)
 
-        print(pop_artifact_file)
 
+def combine_draws(chunks):
+    """
+    Return a table that contains the draw columns of every chunk of a table;
+    the chunks must have identical rows.
 
-def write_table(artifact, path, data):
+    :param chunks: The chunks of the table, in order.
+    """
+    first = chunks[0]
+    others = [chunk[[c for c in chunk.columns if str(c).startswith('draw_')]]
+              for chunk in chunks[1:]]
+    return pd.concat([first] + others, axis=1)
+
+
+class ArtifactWriter:
+    """
+    Write the tables for a population's artifact in the order defined by
+    :func:`get_table_jobs`, regardless of the order in which the tables are
+    calculated.
+
+    If the artifact already exists, only the tables whose inputs have changed
+    (see :func:`get_stale_jobs`) are written, replacing the existing tables,
+    and the other tables are retained; the tables that must be written are
+    listed in ``jobs``. If ``rebuild`` is ``True``, every table of the
+    selected variants is written. Tables for variants of the epidemic input
+    data that are not being built are retained in both cases, unless the
+    artifact was built without a manifest, in which case the artifact file
+    is replaced.
+
+    If ``chunk_draws`` is not ``None``, each table is calculated in chunks of
+    draws (see :func:`get_draw_chunks`); the ``(job, draws)`` chunks that
+    must be calculated are listed in ``tasks``, in the order that they are
+    written. In the compact layouts, the first chunk of every table is
+    written before the second chunk of any table (so that only one chunk of
+    each data source is loaded at a time), and each chunk is appended to the
+    table as soon as it is calculated. The generic layout does not allow
+    columns to be appended, so the chunks of each table are calculated in
+    turn and combined before the table is written.
+
+    :param output_path: The directory in which the artifact is written.
+    :param population: The population name.
+    :param rebuild: Whether to write every table of the selected variants,
+        rather than only those tables whose inputs have changed.
+    :param layout: The layout in which the tables are stored (see
+        ``LAYOUTS``).
+    :param variants: The variants of the epidemic input data whose tables
+        are written (see ``VARIANTS``).
+    :param chunk_draws: The number of draws of each table that are
+        calculated at once, or ``None`` to calculate every draw at once.
+    :param num_draws: The number of draws of each table (see
+        :func:`get_table_jobs`).
+    """
+
+    def __init__(self, output_path, population, rebuild=False,
+                 layout='generic', variants=(BASE_VARIANT,),
+                 chunk_draws=None, num_draws=None):
+        logger = logging.getLogger(__name__)
+        if layout not in LAYOUTS:
+            raise ValueError('Unknown layout: {}'.format(layout))
+        if chunk_draws is not None and chunk_draws < 1:
+            raise ValueError('Invalid chunk size: {}'.format(chunk_draws))
+        self.artifact_file = Path(output_path) / '{}.hdf'.format(population)
+        self.layout = layout
+        all_jobs = get_table_jobs(population, variants, num_draws)
+        self.hashes = {job.key: get_table_hash(job, layout)
+                       for job in all_jobs}
+        self.manifest = load_build_manifest(self.artifact_file)
+
+        if self.manifest and not rebuild:
+            self.jobs = get_stale_jobs(self.artifact_file, population,
+                                       self.hashes, layout, variants,
+                                       num_draws)
+            logger.info('{} of {} tables in {} are up to date'.format(
+                len(all_jobs) - len(self.jobs), len(all_jobs),
+                self.artifact_file))
+        else:
+            self.jobs = all_jobs
+        if not self.manifest:
+            # Initialise the artifact file.
+            if self.artifact_file.exists():
+                self.artifact_file.unlink()
+        self.artifact = Artifact(str(self.artifact_file))
+        self.removed = False
+
+        if rebuild and self.manifest:
+            # NOTE: the tables that will be rebuilt are removed from the
+            # manifest before any of them are written, so that an interrupted
+            # rebuild is resumed by the next build.
+            for job in self.jobs:
+                self.manifest.pop(job.key, None)
+            self.artifact.replace(BUILD_MANIFEST_KEY, self.manifest)
+
+        # Remove tables that are no longer part of the artifact.
+        known_keys = {job.key for job in get_table_jobs(population, VARIANTS)}
+        for key in list(self.artifact.keys):
+            if key.startswith('metadata.') or key in known_keys:
+                continue
+            logger.info('Removing table {} from {}'.format(
+                key, self.artifact_file))
+            self.artifact.remove(key)
+            self.manifest.pop(key, None)
+            self.removed = True
+
+        self.chunks = {job.key: get_draw_chunks(job, chunk_draws)
+                       for job in self.jobs}
+        if layout == 'generic':
+            self.tasks = [(job, draws) for job in self.jobs
+                          for draws in self.chunks[job.key]]
+        else:
+            num_chunks = max([len(c) for c in self.chunks.values()] + [0])
+            self.tasks = [(job, self.chunks[job.key][ix])
+                          for ix in range(num_chunks) for job in self.jobs
+                          if ix < len(self.chunks[job.key])]
+        self.pending = {}
+        self.buffers = {}
+        self.appended = set()
+        self.written = 0
+        if not self.tasks:
+            self.write_manifest()
+
+    def add(self, job, data, draws=None):
+        """
+        Write a chunk of a table, and any subsequent chunks that have already
+        been calculated, or retain it until the preceding chunks are written.
+
+        :param job: The :class:`TableJob`.
+        :param data: The table data.
+        :param draws: The draws in this chunk of the table (see
+            :func:`get_draw_chunks`).
+        """
+        self.pending[(job.key, draws)] = data
+        while self.written < len(self.tasks):
+            job, draws = self.tasks[self.written]
+            if (job.key, draws) not in self.pending:
+                break
+            self.write_chunk(job.key, draws,
+                             self.pending.pop((job.key, draws)))
+            self.written += 1
+            if self.written == len(self.tasks):
+                self.write_manifest()
+
+    def write_chunk(self, key, draws, data):
+        """
+        Write a chunk of a table, appending it to the preceding chunks where
+        the layout allows.
+
+        :param key: The table key.
+        :param draws: The draws in this chunk of the table.
+        :param data: The table data.
+        """
+        chunks = self.chunks[key]
+        first = draws == chunks[0]
+        last = draws == chunks[-1]
+        if first and not last and self.layout != 'generic':
+            if compact_artifact.can_store(index_table(data)):
+                self.appended.add(key)
+
+        if key in self.appended and not first:
+            append_table(self.artifact, key, data)
+        elif key in self.appended or last:
+            if not first:
+                data = combine_draws(self.buffers.pop(key) + [data])
+            if key in self.artifact.keys:
+                self.artifact.remove(key)
+                self.removed = True
+            write_table(self.artifact, key, data, self.layout)
+        else:
+            self.buffers.setdefault(key, []).append(data)
+
+        if last:
+            self.manifest[key] = self.hashes[key]
+            self.appended.discard(key)
+
+    def write_manifest(self):
+        """
+        Record the hash of each table in the artifact; this is only done
+        once every table has been written, so that an incomplete build is
+        resumed by the next build. If any tables were removed or replaced,
+        the artifact is then repacked (see :func:`repack_artifact`).
+        """
+        if BUILD_MANIFEST_KEY in self.artifact.keys:
+            self.artifact.replace(BUILD_MANIFEST_KEY, self.manifest)
+        else:
+            self.artifact.write(BUILD_MANIFEST_KEY, self.manifest)
+        if self.removed:
+            repack_artifact(self.artifact_file)
+            self.removed = False
+
+    def check_complete(self):
+        """Raise an exception if any of the tables were not written."""
+        if self.written < len(self.tasks):
+            missing = sorted({job.key for (job, _) in
+                              self.tasks[self.written:]})
+            msg = 'Tables {} were not written to {}'.format(
+                missing, self.artifact_file)
+            raise ValueError(msg)
+
+
+def repack_artifact(artifact_file):
+    """
+    Copy an artifact to a new file, which then replaces the artifact, as per
+    ``ptrepack``. HDF5 files do not release the space used by nodes that are
+    removed, so an artifact whose tables have been replaced would otherwise
+    grow with each build.
+
+    :param artifact_file: The artifact file.
+    """
+    logger = logging.getLogger(__name__)
+    artifact_file = Path(artifact_file)
+    tmp_file = artifact_file.with_name('{}.{}.tmp'.format(artifact_file.name,
+                                                          os.getpid()))
+    size = artifact_file.stat().st_size
+    try:
+        tables.copy_file(str(artifact_file), str(tmp_file), overwrite=True)
+        os.replace(str(tmp_file), str(artifact_file))
+    finally:
+        if tmp_file.exists():
+            tmp_file.unlink()
+    logger.info('Repacked {} from {:.1f} MB to {:.1f} MB'.format(
+        artifact_file, size / 2 ** 20, artifact_file.stat().st_size / 2 ** 20))
+
+
+def write_table(artifact, path, data, layout='generic'):
     """
     Write a data table to an artifact, after ensuring that it doesn't contain
-    any NA values.
+    any NA values. Values that are not tables are written as is.
 
     :param artifact: The artifact object.
     :param path: The table path.
     :param data: The table data.
+    :param layout: The layout in which the table is stored (see ``LAYOUTS``);
+        tables that cannot be stored in the compact layout are stored in the
+        generic layout.
     """
+    if not isinstance(data, pd.DataFrame):
+        # Other values (e.g., dictionaries of parameters) are stored as is.
+        artifact.write(path, data)
+        return
+
     if np.any(data.isna()):
         msg = 'NA values in table {} for {}'.format(path, artifact.path)
         raise ValueError(msg)
@@ -176,13 +880,50 @@ def write_table(artifact, path, data):
     logger.info('{} Writing table {} to {}'.format(
         datetime.datetime.now().strftime("%H:%M:%S"), path, artifact.path))
 
-    #Add age,sex,year etc columns to multi index
-    col_index_filters = ['year','age','sex', 'date', 'year_start','year_end','age_start','age_end', 'date_start', 'date_end']
-    data.set_index([col_name for col_name in data.columns if col_name in col_index_filters], inplace =True)
-    
+    data = index_table(data)
+
+    #Store the bins and the draws as a single matrix
+    if layout != 'generic' and compact_artifact.can_store(data):
+        complevel = COMPRESSED_LEVEL if layout == 'compressed' else 0
+        compact_artifact.write_table(artifact, path, data, complevel)
+        return
+
     #Convert wide to long
     if ('value' not in data.columns) and ('draw_0' not in data.columns):
         data = (pd.melt(data.reset_index(), id_vars=data.index.names,var_name = 'measure')
                 .set_index(data.index.names+['measure']))
 
     artifact.write(path, data)
+
+
+def index_table(data):
+    """
+    Return a table indexed by its age, sex and year (etc) columns.
+
+    :param data: The table data.
+    """
+    #Add age,sex,year etc columns to multi index
+    col_index_filters = ['year','age','sex', 'date', 'year_start','year_end','age_start','age_end', 'date_start', 'date_end']
+    return data.set_index([col_name for col_name in data.columns if col_name in col_index_filters])
+
+
+def append_table(artifact, path, data):
+    """
+    Append further draws to a table that is stored in the compact layout, after
+    ensuring that they don't contain any NA values.
+
+    :param artifact: The artifact object.
+    :param path: The table path.
+    :param data: The table data, with the same rows as the stored table.
+    """
+    if np.any(data.isna()):
+        msg = 'NA values in table {} for {}'.format(path, artifact.path)
+        raise ValueError(msg)
+
+    data = index_table(data)
+
+    logger = logging.getLogger(__name__)
+    logger.info('{} Appending {} draws to table {} in {}'.format(
+        datetime.datetime.now().strftime("%H:%M:%S"), len(data.columns),
+        path, artifact.path))
+    compact_artifact.append_columns(artifact, path, data)
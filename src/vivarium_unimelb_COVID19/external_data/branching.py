@@ -0,0 +1,349 @@
+"""
+Simulate groups of model specifications whose inputs are identical for the
+first part of the simulation period, by simulating this shared prefix once
+and continuing each specification from a snapshot of the shared prefix.
+"""
+
+import datetime
+import json
+import logging
+
+import pandas as pd
+
+from vivarium_unimelb_COVID19 import artifact_cache
+from vivarium_unimelb_COVID19.external_data.parallel import (
+    build_cached_specification, get_components, get_draw_numbers,
+    get_loaded_keys, get_observer_results,
+    initialise_simulation_from_specification_config, run_in_parallel)
+
+
+#The settings that may differ between the model specifications in a group:
+#the scenario only selects which tables are loaded (and these tables are
+#compared separately), and the observer settings only affect the outputs.
+BRANCH_SETTINGS = [
+    ('scenario',),
+    ('observer', 'discount_rate'),
+    ('observer', 'output_prefix'),
+]
+
+#The private simulation attributes that are used to fork a simulation (see
+#fork_simulation): the state table, the clock time, the lifecycle state and
+#the components.
+FORK_ATTRIBUTES = [
+    ('_population', '_population'),
+    ('_clock', '_time'),
+    ('_lifecycle', 'set_state'),
+    ('_component_manager', 'list_components'),
+]
+
+#The columns that identify the rows of an artifact table.
+KEY_COLUMNS = ['sex', 'age', 'age_start', 'age_end', 'year', 'year_start',
+               'year_end', 'date', 'date_start', 'date_end', 'measure']
+
+
+def group_key(spec_file):
+    """
+    Return a value that identifies the model specifications that can share
+    a prefix: those that only differ in their ``BRANCH_SETTINGS``.
+
+    :param spec_file: The YAML model specification file.
+    """
+    spec_dict = build_cached_specification(spec_file).to_dict()
+    configuration = spec_dict.get('configuration', {})
+    for setting in BRANCH_SETTINGS:
+        section = configuration
+        for name in setting[:-1]:
+            section = section.get(name, {})
+        section.pop(setting[-1], None)
+    return json.dumps(spec_dict, sort_keys=True, default=str)
+
+
+def group_specifications(spec_files):
+    """
+    Divide model specifications into groups that can share a prefix,
+    retaining the order of the specifications.
+
+    :param spec_files: A list of model specification files.
+    :returns: A list of groups, each of which is a list of files.
+    """
+    groups = {}
+    order = []
+    for spec_file in spec_files:
+        key = group_key(spec_file)
+        if key not in groups:
+            groups[key] = []
+            order.append(key)
+        groups[key].append(spec_file)
+    return [groups[key] for key in order]
+
+
+def fractional_year(time):
+    """
+    Return the (fractional) year that is used to look up the values of
+    year-specific tables at a given simulation time, as per
+    ``vivarium.framework.lookup``.
+    """
+    return time.year + time.timetuple().tm_yday / 365.25
+
+
+def table_divergence(data_a, data_b):
+    """
+    Return the earliest year at which the values of two tables differ: the
+    start of the first year bin in which any value differs.
+
+    :param data_a: The first table.
+    :param data_b: The second table.
+    :returns: ``None`` if the tables are identical, or ``-inf`` if they
+        differ from the start (e.g., if they have different rows or columns,
+        or they differ in their first year bin).
+    """
+    if not (isinstance(data_a, pd.DataFrame)
+            and isinstance(data_b, pd.DataFrame)):
+        try:
+            return None if data_a == data_b else float('-inf')
+        except ValueError:
+            return float('-inf')
+
+    if (list(data_a.columns) != list(data_b.columns)
+            or data_a.shape != data_b.shape):
+        return float('-inf')
+    data_a = data_a.reset_index(drop=True)
+    data_b = data_b.reset_index(drop=True)
+    key_cols = [c for c in data_a.columns if c in KEY_COLUMNS]
+    if not data_a[key_cols].equals(data_b[key_cols]):
+        return float('-inf')
+
+    value_cols = [c for c in data_a.columns if c not in KEY_COLUMNS]
+    a = data_a[value_cols]
+    b = data_b[value_cols]
+    same = (a == b) | (a.isnull() & b.isnull())
+    differs = ~same.all(axis=1)
+    if not differs.any():
+        return None
+    if 'year_start' not in data_a.columns:
+        return float('-inf')
+    year = data_a.loc[differs, 'year_start'].min()
+    # NOTE: simulation times before the first year bin use the values of the
+    # first year bin.
+    if year <= data_a['year_start'].min():
+        return float('-inf')
+    return year
+
+
+def get_scenario(simulation):
+    """Return the scenario of a simulation, or ``None`` if it has none."""
+    configuration = simulation.configuration
+    if 'scenario' in configuration:
+        return str(configuration.scenario)
+    return None
+
+
+def get_tables(simulation, draw):
+    """
+    Return the artifact tables loaded by a simulation that has been set up,
+    with the scenario name in each key replaced by ``{scenario}``, so that
+    the tables of different scenarios can be compared.
+
+    :param simulation: The simulation object.
+    :param draw: The draw number.
+    """
+    artifact_path = simulation.configuration.input_data.artifact_path
+    scenario = get_scenario(simulation)
+    tables = {}
+    for key in get_loaded_keys(simulation):
+        data = artifact_cache.load_table(artifact_path, key)
+        if isinstance(data, pd.DataFrame):
+            data = artifact_cache.select_draw(data, draw)
+        if scenario:
+            template = key.replace(scenario, '{scenario}')
+        else:
+            template = key
+        tables[template] = data
+    return tables
+
+
+def simulation_divergence(trunk_tables, branch_tables, interpolation_order=0):
+    """
+    Return the earliest year at which the inputs of two simulations differ,
+    ``None`` if they are identical, or ``-inf`` if they differ from the
+    start.
+
+    :param trunk_tables: The tables loaded by the first simulation (see
+        :func:`get_tables`).
+    :param branch_tables: The tables loaded by the second simulation.
+    :param interpolation_order: The order of the lookup table interpolation;
+        the tables are only compared bin by bin if this is zero.
+    """
+    if set(trunk_tables.keys()) != set(branch_tables.keys()):
+        return float('-inf')
+    years = []
+    for key in trunk_tables:
+        year = table_divergence(trunk_tables[key], branch_tables[key])
+        if year is not None:
+            years.append(year)
+    if not years:
+        return None
+    if interpolation_order != 0:
+        return float('-inf')
+    return min(years)
+
+
+def can_fork(simulation):
+    """
+    Return whether a simulation provides the (private) attributes that are
+    used to fork it (see ``FORK_ATTRIBUTES``), which may differ between
+    versions of vivarium.
+
+    :param simulation: The simulation object.
+    """
+    for manager, attribute in FORK_ATTRIBUTES:
+        if not hasattr(getattr(simulation, manager, None), attribute):
+            return False
+    return hasattr(simulation, 'time_step_events')
+
+
+def fork_simulation(trunk, branch):
+    """
+    Continue a simulation (``branch``) from the current state of another
+    simulation (``trunk``), with the same components and population. Both
+    simulations must have been set up and have initialised their simulants.
+
+    :param trunk: The simulation whose state is copied.
+    :param branch: The simulation that continues from this state.
+    :raises ValueError: If the simulations cannot be forked (see
+        :func:`can_fork`).
+    """
+    if not (can_fork(trunk) and can_fork(branch)):
+        raise ValueError('Simulations cannot be forked with this version '
+                         'of vivarium')
+    # NOTE: the simulation does not provide public accessors for its state
+    # table or clock, so we use the managers directly.
+    branch._population._population = trunk._population._population.copy()
+    branch._clock._time = trunk._clock.time
+    trunk_components = get_components(trunk)
+    branch_components = get_components(branch)
+    for name, component in trunk_components.items():
+        if hasattr(component, 'get_state'):
+            branch_components[name].set_state(component.get_state())
+    # Move the branch into the main loop (without emitting any events), in
+    # case there are no time-steps remaining before the simulation ends.
+    for event in branch.time_step_events:
+        branch._lifecycle.set_state(event)
+
+
+def simulate_branches(spec_files, draw_number, write_files=True):
+    """
+    Run the simulations for a group of model specifications (see
+    :func:`group_specifications`) for a specific draw number.
+
+    The first specification is simulated in full. Each of the other
+    specifications is continued from a snapshot of the first simulation,
+    taken at the last time-step before their inputs differ, so that the
+    time-steps that they have in common are only simulated once.
+    Specifications whose inputs differ from the start (and every
+    specification, if the simulations cannot be forked) are simulated
+    independently.
+
+    :param spec_files: The model specification files in the group.
+    :param draw_number: The draw number.
+    :param write_files: Whether the observers should write their outputs to
+        disk (``observer.write_files``).
+    :returns: A dictionary that maps each model specification file to the
+        outputs of each observer.
+    """
+    logger = logging.getLogger(__name__)
+    simulations = []
+    for spec_file in spec_files:
+        spec = build_cached_specification(spec_file)
+        spec.configuration.input_data.input_draw_number = draw_number
+        spec.configuration.update({'observer': {'write_files': write_files}},
+                                  layer='override', source='simulate_branches')
+        simulation = initialise_simulation_from_specification_config(
+            spec, artifact_cache.PLUGIN_CONFIGURATION)
+        simulation.setup()
+        simulation.initialize_simulants()
+        simulations.append(simulation)
+
+    trunk = simulations[0]
+    interpolation_order = trunk.configuration.interpolation.order
+    trunk_tables = get_tables(trunk, draw_number)
+    forkable = can_fork(trunk)
+    if not forkable:
+        logger.warning('Simulations cannot be forked with this version of '
+                       'vivarium; simulating every branch in full')
+    forks = []
+    independent = []
+    for spec_file, simulation in zip(spec_files[1:], simulations[1:]):
+        year = simulation_divergence(trunk_tables,
+                                     get_tables(simulation, draw_number),
+                                     interpolation_order)
+        if year is None:
+            year = float('inf')
+        if year == float('-inf') or not forkable:
+            # NOTE: forking this simulation would replace its own initial
+            # state with that of the trunk.
+            independent.append((spec_file, simulation))
+        else:
+            forks.append((year, spec_file, simulation))
+    forks.sort(key=lambda fork: fork[0])
+
+    # Simulate the trunk, and fork each branch at the last time-step before
+    # its inputs differ from those of the trunk.
+    clock = trunk._clock
+    for year, spec_file, simulation in forks:
+        while (clock.time < clock.stop_time
+               and fractional_year(clock.time) < year):
+            trunk.step()
+        fork_simulation(trunk, simulation)
+        logger.info('{} Forked {} at {}'.format(
+            datetime.datetime.now().strftime("%H:%M:%S"),
+            spec_file, clock.time))
+    trunk.run()
+    trunk.finalize()
+
+    results = {spec_files[0]: get_observer_results(trunk)}
+    branches = [(spec_file, simulation) for (_, spec_file, simulation) in forks]
+    for spec_file, simulation in branches + independent:
+        simulation.run()
+        simulation.finalize()
+        results[spec_file] = get_observer_results(simulation)
+    return {spec_file: results[spec_file] for spec_file in spec_files}
+
+
+def run_branches(spec_files, num_draws, num_procs, on_result=None,
+                 write_files=True):
+    """
+    Run a number of model simulations in serial or in parallel, as per
+    :func:`~.parallel.run_many`, simulating the common prefix of each group
+    of model specifications once (see :func:`simulate_branches`).
+
+    :param spec_files: A list of model specification files.
+    :param num_draws: The number of draws (not including draw zero) or a
+        sequence of draw numbers.
+    :param num_procs: The number of processes to spawn.
+    :param on_result: An optional function that is called in the main process
+        as ``on_result(args, value)`` for each completed simulation, where
+        ``args`` is the tuple ``(spec_file, draw)`` and ``value`` is the
+        outputs of each observer.
+    :param write_files: Whether the observers should write their outputs to
+        disk.
+    :returns: ``True`` if the simulations completed successfully, otherwise
+        ``False``.
+    """
+    groups = group_specifications(spec_files)
+    draws = get_draw_numbers(num_draws)
+
+    def on_group_result(args, value):
+        if on_result is None or value is None:
+            return
+        for spec_file, results in value.items():
+            on_result((spec_file, args[1]), results)
+
+    jobs = [(tuple(group), draw, write_files)
+            for group in groups for draw in draws]
+    if num_procs == 1:
+        for args in jobs:
+            on_group_result(args, simulate_branches(*args))
+        return True
+    return run_in_parallel(simulate_branches, jobs, num_procs,
+                           on_group_result if on_result else None)
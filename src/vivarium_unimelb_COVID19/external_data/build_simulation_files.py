@@ -8,6 +8,9 @@ import jinja2
 
 from pathlib import Path
 
+from vivarium_unimelb_COVID19.external_data.artifact import (
+    POPULATIONS, VARIANTS, get_variant_scenarios)
+
 
 def get_model_specification_template_file():
     here = Path(__file__).resolve()
@@ -19,26 +22,37 @@ def get_model_specification_BAU_template_file():
     return here.parent / 'yaml_template_BAU.in'
 
 
+#The intervention scenarios: those of every variant of the epidemic input
+#data. The simulation populations (POPULATIONS) and the variants are defined
+#with the artifacts that the model specifications use.
+SCENARIOS = get_variant_scenarios(VARIANTS)
+
+
 def create_model_specifications(output_dir):
     """
     Construct the model specifications for the intervention simulations.
     """
+    for population in POPULATIONS:
+        create_population_specifications(output_dir, population)
 
-    # The simulation populations.
-    #populations = ['new_zealand_test']
-    populations = ['australia','new_zealand','sweden']
-    scenarios = ['flatten', 'elimination', 'suppress',
-                 'elimination_asymp', 'flatten_asymp', 'suppress_asymp',
-                 'elimination_verity', 'flatten_verity', 'suppress_verity',
-                 'suppress_0point5inf', 'suppress_5inf', 'flatten_60inf',
-                 'elimination_24m', 'flatten_24m', 'suppress_24m',
-                 'elimination_36m', 'flatten_36m', 'suppress_36m',
-                 'elimination_doubledr', 'flatten_doubledr', 'suppress_doubledr',
-                 'elimination_halfifr', 'flatten_halfifr', 'suppress_halfifr']
 
-    template_file = get_model_specification_template_file()
-    BAU_template_file = get_model_specification_BAU_template_file()
+def create_population_specifications(output_dir, population,
+                                     scenarios=SCENARIOS):
+    """
+    Construct the model specifications for a single population: one for each
+    intervention scenario, and one for the BAU.
 
+    Files whose contents have not changed are not rewritten, so that their
+    modification times are preserved.
+
+    :param output_dir: The directory in which to write the files.
+    :param population: The population name.
+    :param scenarios: The intervention scenarios.
+    :returns: A list of the model specification files.
+    """
+    out_files = []
+
+    template_file = get_model_specification_template_file()
     with template_file.open('r') as f:
         template_contents = f.read()
 
@@ -48,22 +62,20 @@ def create_model_specifications(output_dir):
 
     out_format = 'COVID19_{}_{}.yaml'
 
+    for scenario in scenarios:
+        out_file = output_dir / out_format.format(population, scenario)
 
-    for population in populations:
-        for scenario in scenarios:
-            out_file = output_dir / out_format.format(population, scenario)
-
-            template_args = {
-                'output_root': str(out_file.parent.parent),
-                'basename': out_file.stem,
-                'population': population,
-                'scenario': scenario
-            }
-            out_content = template.render(template_args)
-            with out_file.open('w') as f:
-                f.write(out_content)
+        template_args = {
+            'output_root': str(out_file.parent.parent),
+            'basename': out_file.stem,
+            'population': population,
+            'scenario': scenario
+        }
+        write_if_changed(out_file, template.render(template_args))
+        out_files.append(out_file)
 
     #BAU
+    BAU_template_file = get_model_specification_BAU_template_file()
     with BAU_template_file.open('r') as f:
         template_contents = f.read()
 
@@ -71,17 +83,28 @@ def create_model_specifications(output_dir):
                                trim_blocks=True,
                                lstrip_blocks=True)
 
-    out_format = 'COVID19_{}_BAU.yaml'
+    out_file = output_dir / 'COVID19_{}_BAU.yaml'.format(population)
+    template_args = {
+        'output_root': str(out_file.parent.parent),
+        'basename': out_file.stem,
+        'population': population
+    }
+    write_if_changed(out_file, template.render(template_args))
+    out_files.append(out_file)
 
+    return out_files
 
-    for population in populations:
-        out_file = output_dir / out_format.format(population)
 
-        template_args = {
-            'output_root': str(out_file.parent.parent),
-            'basename': out_file.stem,
-            'population': population
-        }
-        out_content = template.render(template_args)
-        with out_file.open('w') as f:
-            f.write(out_content)
+def write_if_changed(out_file, out_content):
+    """
+    Write the contents of a file, unless the file already has these contents.
+
+    :param out_file: The file path.
+    :param out_content: The file contents.
+    """
+    if out_file.exists():
+        with out_file.open('r') as f:
+            if f.read() == out_content:
+                return
+    with out_file.open('w') as f:
+        f.write(out_content)
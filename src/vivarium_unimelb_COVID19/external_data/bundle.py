@@ -0,0 +1,100 @@
+"""
+Compile a model specification into a *run bundle*: a directory that contains
+every artifact table that the simulation loads, saved as memory-mappable
+arrays (see :mod:`~vivarium_unimelb_COVID19.shared_artifact`), and a copy of
+the model specification that reads its tables from this directory.
+"""
+
+import logging
+import shutil
+from pathlib import Path
+
+import yaml
+
+from vivarium_unimelb_COVID19 import artifact_cache, shared_artifact
+from vivarium_unimelb_COVID19.external_data.parallel import (
+    build_cached_specification, get_artifact_path, get_loaded_keys,
+    initialise_simulation_from_specification_config)
+
+
+#The name of the model specification file in each bundle.
+BUNDLE_SPECIFICATION = 'model_specification.yaml'
+
+#The suffix of the default bundle directory for each model specification.
+BUNDLE_SUFFIX = '.bundle'
+
+
+def get_required_keys(spec_file):
+    """
+    Return the artifact keys that a simulation loads, by setting up the
+    simulation (for draw zero).
+
+    :param spec_file: The YAML model specification file.
+    """
+    spec = build_cached_specification(spec_file)
+    simulation = initialise_simulation_from_specification_config(
+        spec, artifact_cache.TIMED_PLUGIN_CONFIGURATION)
+    simulation.setup()
+    return sorted(get_loaded_keys(simulation))
+
+
+def get_bundle_dir(spec_file):
+    """Return the default bundle directory for a model specification."""
+    spec_file = Path(spec_file)
+    return spec_file.parent / (spec_file.stem + BUNDLE_SUFFIX)
+
+
+def compile_bundle(spec_file, bundle_dir=None):
+    """
+    Compile a model specification into a run bundle, replacing the bundle if
+    it already exists.
+
+    The bundle contains only the tables that the simulation loads (e.g., the
+    tables for its scenario), and the bundle's model specification selects
+    the :class:`~vivarium_unimelb_COVID19.shared_artifact.SharedArtifactManager`
+    so that each table is read from the bundle by memory-mapping a single
+    array, rather than from the artifact.
+
+    :param spec_file: The YAML model specification file.
+    :param bundle_dir: The bundle directory (default: the model
+        specification file with suffix ``BUNDLE_SUFFIX``).
+    :returns: The bundle's model specification file.
+    """
+    logger = logging.getLogger(__name__)
+    spec_file = Path(spec_file)
+    if bundle_dir is None:
+        bundle_dir = get_bundle_dir(spec_file)
+    bundle_dir = Path(bundle_dir).resolve()
+
+    artifact_path = get_artifact_path(spec_file)
+    keys = get_required_keys(spec_file)
+    logger.info('Saving {} tables from {} to {}'.format(
+        len(keys), artifact_path, bundle_dir))
+
+    # Build the bundle in a temporary directory and then move it into place,
+    # so that the bundle is never left incomplete.
+    tmp_dir = bundle_dir.parent / (bundle_dir.name + '.tmp')
+    if tmp_dir.exists():
+        shutil.rmtree(str(tmp_dir))
+    tmp_dir.mkdir(parents=True)
+    shared_artifact.export_artifact(artifact_path, str(tmp_dir), keys)
+
+    with spec_file.open() as f:
+        spec_dict = yaml.safe_load(f)
+    input_data = spec_dict.setdefault('configuration', {}).setdefault(
+        'input_data', {})
+    input_data['artifact_path'] = str(artifact_path)
+    input_data['shared_artifact_path'] = str(bundle_dir)
+    plugins = spec_dict.setdefault('plugins', {}).setdefault('required', {})
+    plugins['data'] = dict(
+        shared_artifact.PLUGIN_CONFIGURATION['required']['data'])
+    # NOTE: the order of the components determines the order in which they
+    # are set up (and modify each pipeline), so it must be preserved.
+    with (tmp_dir / BUNDLE_SPECIFICATION).open('w') as f:
+        yaml.safe_dump(spec_dict, f, default_flow_style=False,
+                       sort_keys=False)
+
+    if bundle_dir.exists():
+        shutil.rmtree(str(bundle_dir))
+    tmp_dir.rename(bundle_dir)
+    return bundle_dir / BUNDLE_SPECIFICATION
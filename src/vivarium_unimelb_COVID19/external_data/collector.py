@@ -0,0 +1,214 @@
+"""Collect simulation outputs from many workers into consolidated files."""
+
+import multiprocessing
+import os
+import queue
+import signal
+
+import pandas as pd
+
+from vivarium_unimelb_COVID19.observer import consolidated_output_file
+
+
+#The number of result batches that may be waiting to be written; workers
+#block when the queue is full.
+MAX_PENDING_BATCHES = 64
+
+#The number of buffered rows for an output file that triggers a write.
+FLUSH_ROWS = 500000
+
+#The time (in seconds) that a worker waits for space in the queue before
+#checking whether the collector is still running.
+PUT_WAIT_SECONDS = 5
+
+
+class ResultCollector:
+    """
+    A dedicated process that receives the observer outputs of each
+    simulation from a queue, and writes them to one file per model
+    specification and observer, with a ``draw`` column that identifies the
+    simulation draw.
+
+    Outputs are buffered in memory and written in large sequential appends.
+    The queue is bounded, so that workers wait (rather than consume more
+    memory) when the collector falls behind. If the collector fails to write
+    an output file, it stops: workers then fail to send their outputs, and
+    :meth:`close` raises an exception.
+
+    :param max_pending: The maximum number of result batches waiting in the
+        queue.
+    :param flush_rows: The number of buffered rows for an output file that
+        triggers a write to that file.
+    :param context: The ``multiprocessing`` context used to create the queue
+        and start the collector process (default: the default context); this
+        should be the same context that is used to start the workers.
+
+    Use as a context manager, so that all buffered outputs are written when
+    the simulations are finished:
+
+    .. code-block:: python
+
+       with ResultCollector() as collector:
+           collector.put(output_prefix, draw, results)
+    """
+
+    def __init__(self, max_pending=MAX_PENDING_BATCHES, flush_rows=FLUSH_ROWS,
+                 context=None):
+        if context is None:
+            context = multiprocessing.get_context()
+        self.context = context
+        self.queue = context.Queue(maxsize=max_pending)
+        self.stopped = context.Event()
+        self.flush_rows = flush_rows
+        self._process = None
+        self._owner_pid = None
+
+    def __getstate__(self):
+        # NOTE: worker processes receive the queue and the stopped event, but
+        # only the process that started the collector can manage it.
+        state = self.__dict__.copy()
+        state['context'] = None
+        state['_process'] = None
+        return state
+
+    def start(self):
+        """Start the collector process."""
+        self._process = self.context.Process(
+            target=collect_results,
+            args=[self.queue, self.flush_rows, self.stopped])
+        self._process.start()
+        self._owner_pid = os.getpid()
+
+    def is_alive(self):
+        """
+        Return whether the collector process is still running. In processes
+        other than the one that started the collector, this only detects
+        that the collector has stopped once it has set its ``stopped`` event.
+        """
+        if self.stopped.is_set():
+            return False
+        if self._process is not None and os.getpid() == self._owner_pid:
+            return self._process.is_alive()
+        return True
+
+    def put(self, output_prefix, draw, results):
+        """
+        Send the outputs of a single simulation to the collector. This will
+        block while the queue is full.
+
+        :param output_prefix: The observer output prefix for the simulation
+            (``observer.output_prefix``).
+        :param draw: The simulation draw number.
+        :param results: A dictionary that maps observer output suffixes to
+            the recorded tables.
+        :raises RuntimeError: If the collector has stopped.
+        """
+        if not self._put((output_prefix, draw, results)):
+            # Do not wait for outputs that were queued but will not be read
+            # before this process exits.
+            self.queue.cancel_join_thread()
+            msg = 'The result collector has stopped; draw {} of {} was lost'
+            raise RuntimeError(msg.format(draw, output_prefix))
+
+    def _put(self, item):
+        """
+        Put an item on the queue, and return ``False`` if the collector
+        stops before there is space in the queue.
+        """
+        while self.is_alive():
+            try:
+                self.queue.put(item, timeout=PUT_WAIT_SECONDS)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def close(self):
+        """
+        Write all buffered outputs and wait for the collector to finish.
+
+        :raises RuntimeError: If the collector did not finish successfully,
+            in which case some of the outputs were not written.
+        """
+        self._put(None)
+        self._process.join()
+        if self._process.exitcode != 0:
+            msg = 'Result collector exit code: {}; not all outputs were written'
+            raise RuntimeError(msg.format(self._process.exitcode))
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+
+def collect_results(result_q, flush_rows, stopped=None):
+    """
+    Receive simulation outputs from a queue and write them to consolidated
+    output files, until ``None`` is received. Errors that occur when writing
+    an output file are not caught, so that the process exits with a non-zero
+    exit code.
+
+    :param result_q: The queue from which to receive
+        ``(output_prefix, draw, results)`` tuples.
+    :param flush_rows: The number of buffered rows for an output file that
+        triggers a write to that file.
+    :param stopped: An optional ``multiprocessing.Event`` that is set when
+        this function returns or raises an exception.
+    """
+    # The main process is responsible for handling KeyboardInterrupt.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    buffers = {}
+    buffered_rows = {}
+    started = set()
+
+    def flush(path):
+        tables = buffers.pop(path, [])
+        buffered_rows.pop(path, None)
+        if not tables:
+            return
+        data = pd.concat(tables, ignore_index=True)
+        write_consolidated(data, path, append=path in started)
+        started.add(path)
+
+    try:
+        while True:
+            item = result_q.get()
+            if item is None:
+                break
+            output_prefix, draw, results = item
+            for suffix, table in results.items():
+                path = consolidated_output_file(output_prefix, suffix)
+                table = table.copy()
+                table.insert(0, 'draw', draw)
+                buffers.setdefault(path, []).append(table)
+                buffered_rows[path] = buffered_rows.get(path, 0) + len(table)
+                if buffered_rows[path] >= flush_rows:
+                    flush(path)
+
+        for path in list(buffers.keys()):
+            flush(path)
+    finally:
+        if stopped is not None:
+            stopped.set()
+
+
+def write_consolidated(data, path, append):
+    """
+    Write (or append) a table of outputs to a consolidated output file.
+
+    :param data: The table of outputs.
+    :param path: The consolidated output file.
+    :param append: Whether to append to an existing file; otherwise the file
+        is created (or overwritten) and the column names are written.
+    """
+    out_folder = os.path.dirname(path)
+    if out_folder:
+        os.makedirs(out_folder, exist_ok=True)
+
+    mode = 'a' if append else 'w'
+    with open(path, mode, newline='') as f:
+        data.to_csv(f, header=not append, index=False)
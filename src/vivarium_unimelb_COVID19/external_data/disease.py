@@ -5,26 +5,32 @@ import pandas as pd
 import numpy as np
 import pathlib
 
+from .input_cache import read_input_csv
 
 #Includes draw 0
 DRAW_NUM = 10
 
 #from .uncertainty import sample_fixed_rate_from
 
-def get_dataframe(filename):
+def get_dataframe(filename, columns=None):
     data_file = filename
     data_path = str(pathlib.Path(data_file).resolve())
-    df = pd.read_csv(data_path)
+    df = read_input_csv(data_path, columns=columns)
 
     return df
 
 class AcuteDisease:
 
-    def __init__(self, data_dir, name, year_start):
+    def __init__(self, data_dir, name, year_start, draws=None):
         self._name = name
 
+        # Only read the selected draws (default: every draw).
+        if draws is None:
+            draws = range(DRAW_NUM)
+        draw_cols = ['draw_{}'.format(i) for i in draws]
+
         disease_data_file = '{}/diseases/{}_disease_input.csv'.format(data_dir, name)
-        df = get_dataframe(disease_data_file)
+        df = get_dataframe(disease_data_file, ['age', 'sex', 'measure'] + draw_cols)
 
         self._year_start = year_start
         self._year_end = year_start + df['age'].max() - df['age'].min()
@@ -39,7 +45,6 @@ class AcuteDisease:
         df.insert(1, 'year_end', self._year_end + 1)
 
         index_cols = ['age_start', 'age_end', 'year_start', 'year_end', 'sex']
-        draw_cols = ['draw_{}'.format(i) for i in range(DRAW_NUM)] 
         self.cols = index_cols + draw_cols
 
         self._data = df
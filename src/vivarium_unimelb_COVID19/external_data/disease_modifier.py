@@ -6,37 +6,44 @@ import pathlib
 
 from datetime import datetime
 
+from .input_cache import read_input_csv, ScenarioTables
+
 #Includes draw 0
 DRAW_NUM = 10
 
-def get_dataframe(filename):
+def get_dataframe(filename, draw_columns):
     data_file = filename
     data_path = str(pathlib.Path(data_file).resolve())
-    df = pd.read_csv(data_path)
+    columns = ['scenario', 'age_start', 'age_end', 'time_start', 'time_end', 'sex']
+    df = read_input_csv(data_path, columns=columns + draw_columns)
 
     return df
 
 class Disease_modifier:
 
-    def __init__(self, data_dir, year_start, modifier, disease_name):
+    def __init__(self, data_dir, year_start, modifier, disease_name,
+                 scenario_suffix='', draws=None):
         self.year_start = year_start
-        modifier_data_file = '{}/diseases/{}_{}_pif.csv'.format(data_dir, disease_name, modifier)
-        #modifier_data_file = '{}/diseases/{}_{}_pif_scenario_asymp.csv'.format(data_dir, disease_name, modifier)
-        #modifier_data_file = '{}/diseases/{}_{}_pif_scenario_verity.csv'.format(data_dir, disease_name, modifier)
-        #modifier_data_file = '{}/diseases/{}_{}_pif_scenario_misc.csv'.format(data_dir, disease_name, modifier)
-        #modifier_data_file = '{}/diseases/{}_{}_pif_scenario_24m.csv'.format(data_dir, disease_name, modifier)
-        #modifier_data_file = '{}/diseases/{}_{}_pif_scenario_36m.csv'.format(data_dir, disease_name, modifier)
-        #modifier_data_file = '{}/diseases/{}_{}_pif_scenario_doubledr.csv'.format(data_dir, disease_name, modifier)
-        #modifier_data_file = '{}/diseases/{}_{}_pif_scenario_halfifr.csv'.format(data_dir, disease_name, modifier)
-        df = get_dataframe(modifier_data_file)
+        # Only read the selected draws (default: every draw).
+        if draws is None:
+            draws = range(DRAW_NUM)
+        self.draw_columns = ['draw_{}'.format(i) for i in draws]
+        # The suffix of the input data file selects the variant of the
+        # epidemic input data (e.g., '_asymp'; see artifact.VARIANTS).
+        if scenario_suffix:
+            modifier_data_file = '{}/diseases/{}_{}_pif_scenario{}.csv'.format(data_dir, disease_name, modifier, scenario_suffix)
+        else:
+            modifier_data_file = '{}/diseases/{}_{}_pif.csv'.format(data_dir, disease_name, modifier)
+        df = get_dataframe(modifier_data_file, self.draw_columns)
 
         self._data = df
+        self._scenario_data = ScenarioTables(df)
 
     def get_disease_rate_scalar(self, scenario, rate_name):
         """Return the effects of a single rate for a single disease for each age stratum."""
         #df = self._data.loc[(self._data['scenario'] == scenario) &
         #                    (self._data['rate'] == rate_name)]
-        df = self._data.loc[self._data['scenario'] == scenario]
+        df = self._scenario_data.get(scenario)
 
         #Convert relative year columns to absolute years
         df = df.rename(columns={'time_start': 'year_start', 'time_end': 'year_end'})
@@ -44,9 +51,7 @@ class Disease_modifier:
         df['year_end'] += self.year_start
 
         index_cols = ['age_start', 'age_end', 'year_start', 'year_end', 'sex']
-        draw_cols = ['draw_{}'.format(i) for i in range(DRAW_NUM)]
-
-        cols = cols = index_cols + draw_cols
+        cols = cols = index_cols + self.draw_columns
 
         return df[cols]
 
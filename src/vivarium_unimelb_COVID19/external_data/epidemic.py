@@ -6,54 +6,61 @@ import pathlib
 
 from datetime import datetime
 
+from .input_cache import read_input_csv, ScenarioTables
+
 #Includes draw 0
 DRAW_NUM = 10
 
+#The columns of each epidemic data table that are used, in addition to the
+#draw columns.
+INPUT_COLUMNS = ['scenario', 'age_start', 'age_end', 'time_start', 'time_end', 'sex']
+
 #from .uncertainty import sample_fixed_rate_from
 
-def get_dataframe(filename):
+def get_dataframe(filename, draw_columns):
     data_file = filename
     data_path = str(pathlib.Path(data_file).resolve())
-    df = pd.read_csv(data_path)
+    df = read_input_csv(data_path, columns=INPUT_COLUMNS + draw_columns)
 
     return df
 
 class Epidemic:
 
-    def __init__(self, data_dir, year_start):
+    def __init__(self, data_dir, year_start, scenario_suffix='', draws=None):
         self.year_start = year_start
 
-        scenario_suffix = ''
-        #scenario_suffix = '_asymp'
-        #scenario_suffix = '_verity'
-        #scenario_suffix = '_misc'
-        #scenario_suffix = '_24m'
-        #scenario_suffix = '_36m'
-        #scenario_suffix = '_doubledr'
-        #scenario_suffix = '_halfifr'
+        # Only read the selected draws (default: every draw).
+        if draws is None:
+            draws = range(DRAW_NUM)
+        self.draw_columns = ['draw_{}'.format(i) for i in draws]
+
+        # The suffix of the input data files selects the variant of the
+        # epidemic input data (e.g., '_asymp'; see artifact.VARIANTS).
 
         infection_data_file = '{}/percent_infected{}.csv'.format(data_dir, scenario_suffix)
-        infection_df = get_dataframe(infection_data_file)
+        infection_df = get_dataframe(infection_data_file, self.draw_columns)
 
         fatality_data_file = '{}/dead_table{}.csv'.format(data_dir, scenario_suffix)
-        fatality_df = get_dataframe(fatality_data_file)
+        fatality_df = get_dataframe(fatality_data_file, self.draw_columns)
 
         disability_data_file = '{}/dr_table{}.csv'.format(data_dir, scenario_suffix)
-        disability_df = get_dataframe(disability_data_file)
+        disability_df = get_dataframe(disability_data_file, self.draw_columns)
 
         cost_data_file = '{}/popcost_table{}.csv'.format(data_dir, scenario_suffix)
-        cost_df = get_dataframe(cost_data_file)
+        cost_df = get_dataframe(cost_data_file, self.draw_columns)
 
-        self._infection_data = infection_df
-        self._fatality_data = fatality_df
-        self._disability_data = disability_df
-        self._cost_data = cost_df
+        # Separate the rows for each scenario once, rather than filtering
+        # each table for every scenario.
+        self._infection_data = ScenarioTables(infection_df)
+        self._fatality_data = ScenarioTables(fatality_df)
+        self._disability_data = ScenarioTables(disability_df)
+        self._cost_data = ScenarioTables(cost_df)
 
 
     def get_infection_proportion(self, scenario):
         """Return the proportion of infected for each age stratum."""
 
-        df = self._infection_data.loc[self._infection_data['scenario'] == scenario]
+        df = self._infection_data.get(scenario)
 
         #Convert relative year columns to absolute years
         df = df.rename(columns={'time_start': 'year_start', 'time_end': 'year_end'})
@@ -61,9 +68,7 @@ class Epidemic:
         df['year_end'] += self.year_start
 
         index_cols = ['age_start', 'age_end', 'year_start', 'year_end', 'sex']
-        draw_cols = ['draw_{}'.format(i) for i in range(DRAW_NUM)]
-
-        cols = cols = index_cols + draw_cols
+        cols = cols = index_cols + self.draw_columns
 
         return df[cols]
 
@@ -71,7 +76,7 @@ class Epidemic:
     def get_fatality_risk(self, scenario):
         """Return the fatality risk for each age stratum."""
 
-        df = self._fatality_data.loc[self._fatality_data['scenario'] == scenario]
+        df = self._fatality_data.get(scenario)
 
         #Convert relative year columns to absolute years
         df = df.rename(columns={'time_start': 'year_start', 'time_end': 'year_end'})
@@ -79,9 +84,7 @@ class Epidemic:
         df['year_end'] += self.year_start
 
         index_cols = ['age_start', 'age_end', 'year_start', 'year_end', 'sex']
-        draw_cols = ['draw_{}'.format(i) for i in range(DRAW_NUM)]
-
-        cols = cols = index_cols + draw_cols
+        cols = cols = index_cols + self.draw_columns
 
         return df[cols]
 
@@ -89,7 +92,7 @@ class Epidemic:
     def get_disability_risk(self, scenario):
         """Return the disability risk for each age stratum."""
 
-        df = self._disability_data.loc[self._disability_data['scenario'] == scenario]
+        df = self._disability_data.get(scenario)
 
         #Convert relative year columns to absolute years
         df = df.rename(columns={'time_start': 'year_start', 'time_end': 'year_end'})
@@ -97,9 +100,7 @@ class Epidemic:
         df['year_end'] += self.year_start
 
         index_cols = ['age_start', 'age_end', 'year_start', 'year_end', 'sex']
-        draw_cols = ['draw_{}'.format(i) for i in range(DRAW_NUM)]
-
-        cols = cols = index_cols + draw_cols
+        cols = cols = index_cols + self.draw_columns
 
         return df[cols]
 
@@ -107,7 +108,7 @@ class Epidemic:
     def get_health_cost(self, scenario):
         """Return the health cost due to epidemic for each age stratum."""
 
-        df = self._cost_data.loc[self._cost_data['scenario'] == scenario]
+        df = self._cost_data.get(scenario)
 
         #Convert relative year columns to absolute years
         df = df.rename(columns={'time_start': 'year_start', 'time_end': 'year_end'})
@@ -115,8 +116,6 @@ class Epidemic:
         df['year_end'] += self.year_start
 
         index_cols = ['age_start', 'age_end', 'year_start', 'year_end', 'sex']
-        draw_cols = ['draw_{}'.format(i) for i in range(DRAW_NUM)]
-
-        cols = cols = index_cols + draw_cols
+        cols = cols = index_cols + self.draw_columns
 
         return df[cols]
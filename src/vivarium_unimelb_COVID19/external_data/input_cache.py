@@ -0,0 +1,269 @@
+"""
+Cache the contents of input data CSV files in a columnar format, so that
+each file is only parsed once and only the required columns are read.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+
+#The directory (alongside each CSV file) in which the cached columns are
+#stored.
+CACHE_DIR_NAME = '.column_cache'
+
+#The file that lists the cached columns and their types.
+INDEX_FILE = 'columns.json'
+
+#The directory (in each cache directory) that records the hash of each CSV
+#file, with the size and modification time of the file when it was hashed.
+HASHES_DIR_NAME = 'hashes'
+
+#The hash of each CSV file that has been read by this process, identified by
+#its path, size and modification time.
+_FILE_HASHES = {}
+
+
+def hash_file(path):
+    """
+    Return a hash of the contents of a file; this is only calculated once
+    for each version of the file (as identified by its size and modification
+    time).
+
+    :param path: The file path.
+    """
+    path = str(Path(path).resolve())
+    stat = os.stat(path)
+    version = (path, stat.st_size, stat.st_mtime_ns)
+    if version not in _FILE_HASHES:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        _FILE_HASHES[version] = digest.hexdigest()
+    return _FILE_HASHES[version]
+
+
+def get_cache_dir(path, cache_dir=None):
+    """
+    Return the cache directory for a CSV file.
+
+    :param path: The CSV file path.
+    :param cache_dir: The cache directory (default: ``CACHE_DIR_NAME`` in the
+        directory that contains the CSV file).
+    """
+    if cache_dir is None:
+        cache_dir = Path(path).resolve().parent / CACHE_DIR_NAME
+    return Path(cache_dir)
+
+
+def read_hash_record(record_file):
+    """
+    Return the hash record stored in a file (see :func:`hash_input_file`),
+    or ``None`` if the file does not exist or cannot be read.
+
+    :param record_file: The record file.
+    """
+    try:
+        with Path(record_file).open() as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def hash_input_file(path, cache_dir=None):
+    """
+    Return a hash of the contents of a CSV file, as per :func:`hash_file`.
+
+    The hash is recorded in the cache directory with the size and
+    modification time of the file, so that other processes can identify the
+    file without reading it; it is only calculated again when the file
+    changes, in which case the cached columns of the previous version of the
+    file are removed (unless another file has the same contents).
+
+    :param path: The CSV file path.
+    :param cache_dir: The cache directory (see :func:`get_cache_dir`).
+    """
+    path = Path(path).resolve()
+    stat = os.stat(str(path))
+    version = (str(path), stat.st_size, stat.st_mtime_ns)
+    if version in _FILE_HASHES:
+        return _FILE_HASHES[version]
+
+    cache_dir = get_cache_dir(path, cache_dir)
+    hashes_dir = cache_dir / HASHES_DIR_NAME
+    record_file = hashes_dir / '{}.json'.format(
+        hashlib.sha256(str(path).encode('utf-8')).hexdigest())
+    current = {'path': str(path), 'size': stat.st_size,
+               'mtime_ns': stat.st_mtime_ns}
+    record = read_hash_record(record_file)
+    if record is not None and all(record.get(key) == value
+                                  for (key, value) in current.items()):
+        _FILE_HASHES[version] = record['hash']
+        return record['hash']
+
+    current['hash'] = hash_file(path)
+    try:
+        hashes_dir.mkdir(parents=True, exist_ok=True)
+        tmp_file = '{}.{}.tmp'.format(record_file, os.getpid())
+        with open(tmp_file, 'w') as f:
+            json.dump(current, f, indent=2)
+        os.replace(tmp_file, str(record_file))
+    except OSError:
+        # The cache is not writable.
+        return current['hash']
+
+    if record is not None and record.get('hash') != current['hash']:
+        remove_entry_if_unused(cache_dir, record.get('hash'))
+    return current['hash']
+
+
+def remove_entry_if_unused(cache_dir, file_hash):
+    """
+    Remove the cached columns of a superseded version of a CSV file, unless
+    the hash record of another file refers to them.
+
+    :param cache_dir: The cache directory.
+    :param file_hash: The hash of the superseded version.
+    """
+    if not file_hash:
+        return
+    for record_file in (cache_dir / HASHES_DIR_NAME).glob('*.json'):
+        record = read_hash_record(record_file)
+        if record is not None and record.get('hash') == file_hash:
+            return
+    shutil.rmtree(str(cache_dir / file_hash), ignore_errors=True)
+
+
+def get_entry_dir(path, cache_dir=None):
+    """
+    Return the directory that contains the cached columns of a CSV file.
+
+    :param path: The CSV file path.
+    :param cache_dir: The cache directory (see :func:`get_cache_dir`).
+    """
+    return get_cache_dir(path, cache_dir) / hash_input_file(path, cache_dir)
+
+
+def write_columns(data, entry_dir):
+    """
+    Store each column of a table as a separate NumPy array.
+
+    Columns of strings are stored as fixed-width string arrays, so that they
+    can be memory-mapped; columns that contain other Python objects (e.g.,
+    strings and missing values) are stored as pickled arrays.
+
+    :param data: The table.
+    :param entry_dir: The directory in which the columns are stored; it is
+        replaced in its entirety or not at all.
+    """
+    entry_dir = Path(entry_dir)
+    tmp_dir = Path('{}.{}.tmp'.format(entry_dir, os.getpid()))
+    tmp_dir.mkdir(parents=True, exist_ok=True)
+
+    columns = []
+    for ix, name in enumerate(data.columns):
+        values = data[name].values
+        kind = 'array'
+        if values.dtype.kind not in 'biuf':
+            values = np.asarray(values, dtype=object)
+            if all(isinstance(value, str) for value in values):
+                values = values.astype(str)
+                kind = 'str'
+            else:
+                kind = 'object'
+        np.save(str(tmp_dir / '{}.npy'.format(ix)), values,
+                allow_pickle=(kind == 'object'))
+        columns.append({'name': name, 'kind': kind})
+
+    with (tmp_dir / INDEX_FILE).open('w') as f:
+        json.dump(columns, f, indent=2)
+    try:
+        os.rename(str(tmp_dir), str(entry_dir))
+    except OSError:
+        # Another process has already cached this file.
+        shutil.rmtree(str(tmp_dir), ignore_errors=True)
+
+
+def read_columns(entry_dir, columns=None):
+    """
+    Return a table whose columns were stored by :func:`write_columns`,
+    memory-mapping the stored arrays so that only the selected columns are
+    read.
+
+    :param entry_dir: The directory in which the columns are stored.
+    :param columns: The columns to read (default: every column).
+    """
+    entry_dir = Path(entry_dir)
+    with (entry_dir / INDEX_FILE).open() as f:
+        stored = json.load(f)
+    positions = {column['name']: ix for (ix, column) in enumerate(stored)}
+    if columns is None:
+        columns = [column['name'] for column in stored]
+    missing = [name for name in columns if name not in positions]
+    if missing:
+        raise KeyError('{} not in {}'.format(missing, entry_dir))
+
+    data = {}
+    for name in columns:
+        ix = positions[name]
+        kind = stored[ix]['kind']
+        array_file = str(entry_dir / '{}.npy'.format(ix))
+        if kind == 'object':
+            values = np.load(array_file, allow_pickle=True)
+        else:
+            values = np.array(np.load(array_file, mmap_mode='r'))
+            if kind == 'str':
+                values = values.astype(object)
+        data[name] = values
+    return pd.DataFrame(data, columns=columns)
+
+
+def read_input_csv(path, columns=None, cache_dir=None):
+    """
+    Return the contents of a CSV file, as per ``pandas.read_csv``.
+
+    The first time that a file is read, its columns are stored in the cache
+    directory, identified by a hash of the file contents (see
+    :func:`hash_input_file`); later reads load the selected columns from the
+    cache without parsing the file.
+
+    :param path: The CSV file path.
+    :param columns: The columns to read (default: every column).
+    :param cache_dir: The cache directory (see :func:`get_entry_dir`).
+    """
+    entry_dir = get_entry_dir(path, cache_dir)
+    if not (entry_dir / INDEX_FILE).exists():
+        data = pd.read_csv(str(path))
+        try:
+            write_columns(data, entry_dir)
+        except OSError:
+            # The cache is not writable, so use the parsed table directly.
+            if columns is not None:
+                data = data[columns]
+            return data
+    return read_columns(entry_dir, columns)
+
+
+class ScenarioTables:
+    """
+    The rows of a table for each scenario, which are separated in a single
+    pass over the table.
+
+    :param data: The table.
+    :param column: The column that identifies the scenario of each row.
+    """
+
+    def __init__(self, data, column='scenario'):
+        self._empty = data.iloc[0:0]
+        self._tables = {scenario: table
+                        for (scenario, table) in data.groupby(column, sort=False)}
+
+    def get(self, scenario):
+        """Return the rows for a scenario (which may be empty)."""
+        return self._tables.get(scenario, self._empty)
@@ -0,0 +1,308 @@
+"""Distribute simulations across many machines, using a shared job queue."""
+
+import datetime
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import traceback
+from pathlib import Path
+
+from .parallel import get_draw_numbers, run_nth_draw
+from .result_cache import get_result_cache
+
+
+#The time (in seconds) for which a worker holds a job without a heartbeat;
+#if a worker stops sending heartbeats, its job is returned to the queue.
+LEASE_SECONDS = 300
+
+#The number of times that a job is attempted before it is marked as failed.
+MAX_ATTEMPTS = 3
+
+#The time (in seconds) that an idle worker waits before checking for jobs.
+POLL_SECONDS = 10
+
+#The job states.
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    spec TEXT NOT NULL,
+    draw INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    worker TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    started REAL,
+    finished REAL,
+    error TEXT,
+    UNIQUE (spec, draw)
+)
+"""
+
+
+class JobQueue:
+    """
+    A queue of (model specification, draw) jobs, stored in an SQLite
+    database that can be shared by workers on many machines (e.g., on a
+    shared filesystem). No server process is required.
+
+    A worker claims a job by taking out a *lease* on it, which it renews by
+    sending heartbeats while the simulation runs. If the worker stops (e.g.,
+    the machine fails), the lease expires and the job is returned to the
+    queue, until it has been attempted ``max_attempts`` times.
+
+    :param path: The path to the queue database, which is created if it does
+        not exist.
+    :param lease_seconds: The duration of each lease, in seconds.
+    :param max_attempts: The maximum number of attempts for each job.
+    """
+
+    def __init__(self, path, lease_seconds=LEASE_SECONDS,
+                 max_attempts=MAX_ATTEMPTS):
+        self.path = str(path)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        with self._connect() as conn:
+            conn.execute(SCHEMA)
+
+    def _connect(self):
+        # NOTE: each operation uses a new connection, so that the queue can
+        # be used from multiple threads (e.g., the heartbeat thread).
+        conn = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+        return _Transaction(conn)
+
+    def enqueue(self, spec_files, draws):
+        """
+        Add a job for each model specification and each draw. Jobs that are
+        already in the queue are not added again.
+
+        :param spec_files: A list of model specification files, which must be
+            accessible (at the same path) to every worker.
+        :param draws: Either the number of draws (not including draw zero) or
+            a sequence of draw numbers.
+        :returns: The number of jobs that were added.
+        """
+        rows = [(str(Path(spec_file).resolve()), draw, PENDING)
+                for spec_file in spec_files
+                for draw in get_draw_numbers(draws)]
+        with self._connect() as conn:
+            before = conn.execute('SELECT COUNT(*) FROM jobs').fetchone()[0]
+            conn.executemany('INSERT OR IGNORE INTO jobs (spec, draw, status)'
+                             ' VALUES (?, ?, ?)', rows)
+            after = conn.execute('SELECT COUNT(*) FROM jobs').fetchone()[0]
+        return after - before
+
+    def _fail_exhausted(self, conn, now):
+        # Running jobs whose lease has expired after their final attempt will
+        # never be claimed again, so they are marked as failed.
+        conn.execute(
+            'UPDATE jobs SET status = ?, lease_expires = NULL,'
+            ' error = COALESCE(error, ?)'
+            ' WHERE status = ? AND lease_expires < ? AND attempts >= ?',
+            (FAILED, 'The lease expired after {} attempts'.format(
+                self.max_attempts), RUNNING, now, self.max_attempts))
+
+    def claim(self, worker):
+        """
+        Claim the next available job: a pending job, or a running job whose
+        lease has expired. Running jobs whose lease has expired after their
+        final attempt are marked as failed.
+
+        :param worker: The worker identifier.
+        :returns: A tuple ``(job_id, spec_file, draw)``, or ``None`` if there
+            are no available jobs.
+        """
+        now = time.time()
+        with self._connect() as conn:
+            self._fail_exhausted(conn, now)
+            row = conn.execute(
+                'SELECT id, spec, draw FROM jobs'
+                ' WHERE (status = ? OR (status = ? AND lease_expires < ?))'
+                ' AND attempts < ?'
+                ' ORDER BY id LIMIT 1',
+                (PENDING, RUNNING, now, self.max_attempts)).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                'UPDATE jobs SET status = ?, worker = ?, lease_expires = ?,'
+                ' attempts = attempts + 1, started = ? WHERE id = ?',
+                (RUNNING, worker, now + self.lease_seconds, now, row[0]))
+        return row
+
+    def heartbeat(self, job_id, worker):
+        """
+        Renew the lease on a running job.
+
+        :returns: ``True`` if the worker still holds the lease.
+        """
+        with self._connect() as conn:
+            cursor = conn.execute(
+                'UPDATE jobs SET lease_expires = ?'
+                ' WHERE id = ? AND worker = ? AND status = ?',
+                (time.time() + self.lease_seconds, job_id, worker, RUNNING))
+            return cursor.rowcount == 1
+
+    def complete(self, job_id, worker):
+        """Record that a job has been completed."""
+        with self._connect() as conn:
+            conn.execute(
+                'UPDATE jobs SET status = ?, finished = ?, error = NULL'
+                ' WHERE id = ? AND worker = ?',
+                (DONE, time.time(), job_id, worker))
+
+    def fail(self, job_id, worker, error):
+        """
+        Record that a job has failed; it is returned to the queue unless it
+        has been attempted ``max_attempts`` times.
+        """
+        with self._connect() as conn:
+            conn.execute(
+                'UPDATE jobs SET status = CASE WHEN attempts < ? THEN ?'
+                ' ELSE ? END, lease_expires = NULL, error = ?'
+                ' WHERE id = ? AND worker = ?',
+                (self.max_attempts, PENDING, FAILED, error, job_id, worker))
+
+    def progress(self):
+        """
+        Return the number of jobs in each state, including running jobs
+        whose lease has expired (``'expired'``). Running jobs whose lease has
+        expired after their final attempt are first marked as failed.
+        """
+        counts = {PENDING: 0, RUNNING: 0, DONE: 0, FAILED: 0, 'expired': 0}
+        now = time.time()
+        with self._connect() as conn:
+            self._fail_exhausted(conn, now)
+            rows = conn.execute(
+                'SELECT status, lease_expires < ?, COUNT(*) FROM jobs'
+                ' GROUP BY status, lease_expires < ?',
+                (now, now)).fetchall()
+        for status, expired, count in rows:
+            if status == RUNNING and expired:
+                status = 'expired'
+            counts[status] = counts.get(status, 0) + count
+        return counts
+
+    def unfinished(self):
+        """Return the number of jobs that have not completed or failed."""
+        counts = self.progress()
+        return counts[PENDING] + counts[RUNNING] + counts['expired']
+
+
+class _Transaction:
+    """
+    Run the statements in a ``with`` block as a single transaction, which
+    takes a write lock on the database when it begins, and close the
+    connection afterwards.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute('BEGIN IMMEDIATE')
+        return self.conn
+
+    def __exit__(self, exc_type, exc_value, tb):
+        try:
+            if exc_type is None:
+                self.conn.execute('COMMIT')
+            else:
+                self.conn.execute('ROLLBACK')
+        finally:
+            self.conn.close()
+
+
+def default_worker_id():
+    """Return an identifier for this worker: the host name and process ID."""
+    return '{}:{}'.format(socket.gethostname(), os.getpid())
+
+
+def run_worker(queue_path, write_files=True, warm=False, history_file=None,
+               cache_dir=None, lease_seconds=LEASE_SECONDS,
+               poll_seconds=POLL_SECONDS):
+    """
+    Claim and run jobs from a queue until there are no unfinished jobs.
+
+    While other workers are running jobs, this worker waits for new jobs to
+    become available (e.g., because another worker stopped sending
+    heartbeats), rather than exiting.
+
+    :param queue_path: The path to the queue database.
+    :param write_files: Whether the observers should write their outputs to
+        disk.
+    :param warm: Whether to reuse the model specification and artifact tables
+        that were loaded for earlier jobs.
+    :param history_file: An optional file in which to record the time taken
+        by each simulation.
+    :param cache_dir: An optional directory in which simulation outputs are
+        cached.
+    :param lease_seconds: The duration of each lease, in seconds.
+    :param poll_seconds: The time that an idle worker waits before checking
+        for jobs.
+    :returns: The number of jobs that this worker completed.
+    """
+    logger = logging.getLogger(__name__)
+    job_queue = JobQueue(queue_path, lease_seconds=lease_seconds)
+    worker = default_worker_id()
+    # NOTE: the cache retains the artifact hashes between jobs.
+    cache = get_result_cache(cache_dir)
+    completed = 0
+
+    while True:
+        job = job_queue.claim(worker)
+        if job is None:
+            if job_queue.unfinished() == 0:
+                break
+            time.sleep(poll_seconds)
+            continue
+
+        job_id, spec_file, draw = job
+        stop = threading.Event()
+        beat = threading.Thread(target=send_heartbeats,
+                                args=[job_queue, job_id, worker, stop])
+        beat.daemon = True
+        beat.start()
+        try:
+            run_nth_draw(spec_file, draw, write_files, warm, None,
+                         history_file, cache)
+        except Exception:
+            error = traceback.format_exc()
+            print(error)
+            job_queue.fail(job_id, worker, error)
+        else:
+            job_queue.complete(job_id, worker)
+            completed += 1
+        finally:
+            stop.set()
+            beat.join()
+
+    logger.info('{} Worker {} completed {} jobs'.format(
+        datetime.datetime.now().strftime("%H:%M:%S"), worker, completed))
+    return completed
+
+
+def send_heartbeats(job_queue, job_id, worker, stop):
+    """
+    Renew the lease on a job at regular intervals, until ``stop`` is set.
+
+    :param job_queue: The :class:`JobQueue`.
+    :param job_id: The job identifier.
+    :param worker: The worker identifier.
+    :param stop: A ``threading.Event`` that is set when the job finishes.
+    """
+    logger = logging.getLogger(__name__)
+    interval = max(1, job_queue.lease_seconds / 3)
+    while not stop.wait(interval):
+        try:
+            if not job_queue.heartbeat(job_id, worker):
+                logger.warning('Lost the lease on job {}'.format(job_id))
+                return
+        except sqlite3.Error:
+            print(traceback.format_exc())
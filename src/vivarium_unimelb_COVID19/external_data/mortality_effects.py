@@ -6,12 +6,14 @@ import pathlib
 
 from datetime import datetime
 
+from .input_cache import read_input_csv
+
 #from .uncertainty import sample_fixed_rate_from
 
 def get_dataframe(filename):
     data_file = filename
     data_path = str(pathlib.Path(data_file).resolve())
-    df = pd.read_csv(data_path)
+    df = read_input_csv(data_path)
 
     return df
 
@@ -1,17 +1,55 @@
 """Run multiple simulations in parallel."""
 
+import copy
 import datetime
+import functools
 import itertools
 import logging
 import multiprocessing
+import os
 import queue
 import pickle
 import signal
+import time
 import traceback
 
 import vivarium.framework.configuration as config
 import vivarium.framework.engine as engine
 import vivarium.framework.plugins as plugins
+from vivarium.framework.artifact import parse_artifact_path_config
+
+from vivarium_unimelb_COVID19 import artifact_cache, shared_artifact
+from vivarium_unimelb_COVID19.observer import output_csv_mkdir, output_file
+from vivarium_unimelb_COVID19.external_data.collector import ResultCollector
+from vivarium_unimelb_COVID19.external_data.result_cache import (
+    get_result_cache, hash_specification)
+from vivarium_unimelb_COVID19.external_data import resources
+from vivarium_unimelb_COVID19.external_data.scheduling import (
+    TIMING_COLUMNS, job_telemetry, peak_memory_mb, record_timing)
+
+
+#The model specifications that have been parsed by this process (warm mode).
+_SPECIFICATIONS = {}
+
+#The modules that are imported by the fork-server before it starts workers.
+PRELOAD_MODULES = [
+    'pandas',
+    'scipy',
+    'vivarium.framework.engine',
+    'vivarium_public_health',
+    'vivarium_unimelb_COVID19.disease',
+    'vivarium_unimelb_COVID19.disease_modifiers',
+    'vivarium_unimelb_COVID19.epidemic',
+    'vivarium_unimelb_COVID19.observer',
+    'vivarium_unimelb_COVID19.population',
+    'vivarium_unimelb_COVID19.external_data.parallel',
+]
+
+#The time (in seconds) that a worker waits for a job before concluding that
+#the job queue is empty. Jobs are put on the queue before the workers are
+#started, but may not have been flushed to the queue's pipe when a worker
+#first reads from it, so ``job_q.empty()`` cannot be used instead.
+JOB_WAIT_SECONDS = 1
 
 
 def fails_to_pickle(item):
@@ -61,7 +99,8 @@ def fails_to_pickle(item):
     return False
 
 
-def run_in_parallel(func, iterable, n_proc):
+def run_in_parallel(func, iterable, n_proc, on_result=None, context=None,
+                    sizing=None, on_error=None, send_values=None):
     """
     Perform multiple simulations in parallel by spawning multiple processes.
 
@@ -69,6 +108,23 @@ def run_in_parallel(func, iterable, n_proc):
     :param iterable: A sequence of simulation arguments, represented as tuples
         and *unpacked* before passing to ``func`` (i.e., ``func(*args)``).
     :param n_proc: The number of processes to spawn.
+    :param on_result: An optional function that is called in the main process
+        as ``on_result(args, value)`` for each completed job, where ``value``
+        is the value returned by ``func(*args)``; the returned values are sent
+        from the worker processes through a pipe and must be picklable.
+    :param context: The ``multiprocessing`` context used to start the worker
+        processes (see :func:`get_worker_context`); if this is not the
+        default context, ``func`` must be picklable.
+    :param sizing: An optional :class:`~.resources.WorkerSizing` object, in
+        which case ``n_proc`` is the maximum number of processes, and
+        processes are started as the memory used by each process is measured
+        and as memory is available.
+    :param on_error: An optional function that is called in the main process
+        as ``on_error(args, error)`` for each job that raised an exception,
+        where ``error`` is the formatted traceback.
+    :param send_values: Whether to send the value returned by each job to the
+        main process; otherwise, ``on_result`` receives ``None`` in place of
+        each value (default: ``True`` if ``on_result`` is provided).
 
     :returns: ``True`` if all jobs were successfully completed (i.e., each
         process terminated with an exit code of ``0``).
@@ -77,22 +133,32 @@ def run_in_parallel(func, iterable, n_proc):
     # KeyboardInterrupt exceptions correctly. For details, see:
     # http://bryceboe.com/2012/02/14/python-multiprocessing-pool-and-keyboardinterrupt-revisited/
     logger = logging.getLogger(__name__)
-    job_q = multiprocessing.Queue()
+    if context is None:
+        context = multiprocessing.get_context()
+    job_q = context.Queue()
+    if send_values is None:
+        send_values = on_result is not None
+    if on_result is not None or on_error is not None or sizing is not None:
+        result_q = context.Queue()
+    else:
+        result_q = None
     workers = []
 
-    def apply_func(job_q):
-        # Ignore the signal that raises KeyboardInterrupt exceptions; the main
-        # loop will handle this exception and ensure each process terminates.
-        signal.signal(signal.SIGINT, signal.SIG_IGN)
+    def start_workers(count):
+        for i in range(len(workers), count):
+            proc = context.Process(target=apply_func,
+                                   args=[func, job_q, result_q, i, sizing,
+                                         send_values])
+            workers.append(proc)
+            proc.start()
 
-        while not job_q.empty():
-            try:
-                args = job_q.get(block=False)
-                func(*args)
-            except queue.Empty:
-                pass
-            except Exception:
-                print(traceback.format_exc())
+    def on_memory(memory_mb):
+        # Start more workers if there is sufficient memory.
+        sizing.update(memory_mb)
+        target = min(n_proc, sizing.num_workers())
+        if target > len(workers) and not job_q.empty():
+            resources.log_sizing(sizing, target)
+            start_workers(target)
 
     n_job = 0
     for args in iterable:
@@ -111,11 +177,23 @@ def run_in_parallel(func, iterable, n_proc):
         if n_proc > n_job:
             # Spawn no more processes than there are jobs
             n_proc = n_job
-        logger.info("Spawning {} workers for {} jobs".format(n_proc, n_job))
-        for i in range(n_proc):
-            proc = multiprocessing.Process(target=apply_func, args=[job_q])
-            workers.append(proc)
-            proc.start()
+        if sizing is None:
+            logger.info("Spawning {} workers for {} jobs".format(n_proc,
+                                                                 n_job))
+            start_workers(n_proc)
+        else:
+            # NOTE: each worker limits its own threads (see apply_func), so
+            # that the threads of this process are not limited.
+            num_workers = min(n_proc, sizing.num_workers())
+            resources.log_sizing(sizing, num_workers)
+            start_workers(num_workers)
+        if result_q is not None:
+            # Collect the results as they arrive. This must be done before
+            # joining the workers, because a process that has put items on a
+            # queue will not terminate until these items have been consumed.
+            receive_results(result_q, workers, on_result,
+                            on_memory=on_memory if sizing else None,
+                            on_error=on_error)
         # Wait for each worker to finish. Without this loop, we jump straight
         # to the finally clause and the KeyboardInterrupt handler (below) is
         # never triggered.
@@ -123,7 +201,8 @@ def run_in_parallel(func, iterable, n_proc):
             worker.join()
     except KeyboardInterrupt:
         # Force each worker to terminate.
-        logger.info("Received CTRL-C, terminating {} workers".format(n_proc))
+        logger.info("Received CTRL-C, terminating {} workers".format(
+            len(workers)))
         for worker in workers:
             worker.terminate()
     except Exception as e:
@@ -143,47 +222,553 @@ def run_in_parallel(func, iterable, n_proc):
         return all_good
 
 
+def apply_func(func, job_q, result_q, worker_index=0, sizing=None,
+               send_values=True):
+    """
+    Perform simulations in a worker process until the job queue is empty
+    (i.e., no job arrives within ``JOB_WAIT_SECONDS``).
+
+    :param func: The function that performs a single simulation.
+    :param job_q: The queue of simulation arguments.
+    :param result_q: The queue on which to put
+        ``(args, value, memory_mb, error)`` tuples, where ``memory_mb`` is the
+        peak memory used by this process and ``error`` is the formatted
+        traceback if the job raised an exception (otherwise ``None``), or
+        ``None`` if neither the results nor the memory are required.
+    :param worker_index: The (0-based) index of this worker.
+    :param sizing: An optional :class:`~.resources.WorkerSizing` object,
+        which determines whether this worker is pinned to a single CPU, how
+        many threads it may use, and how much memory must be available before
+        it starts each job.
+    :param send_values: Whether to send the value returned by each job on
+        ``result_q``; otherwise, ``None`` is sent in its place, so that only
+        the peak memory is sent to the main process.
+    """
+    # Ignore the signal that raises KeyboardInterrupt exceptions; the main
+    # loop will handle this exception and ensure each process terminates.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
 
+    if sizing is not None:
+        if sizing.pin:
+            resources.pin_to_cpu(worker_index)
+        if sizing.threads:
+            resources.limit_threads(sizing.threads)
 
-def initialise_simulation_from_specification_config(model_specification):
+    first_job = True
+    while True:
+        if sizing is not None and not first_job:
+            resources.wait_for_memory(sizing.min_free_mb)
+        first_job = False
+        try:
+            args = job_q.get(timeout=JOB_WAIT_SECONDS)
+        except queue.Empty:
+            break
+        try:
+            value = func(*args)
+        except Exception:
+            error = traceback.format_exc()
+            print(error)
+            if result_q is not None:
+                result_q.put((args, None, peak_memory_mb(), error))
+            continue
+        if result_q is not None:
+            if not send_values:
+                value = None
+            result_q.put((args, value, peak_memory_mb(), None))
+
+
+def get_worker_context(spec_files=(), preload_artifacts=False):
+    """
+    Return the ``multiprocessing`` context used to start worker processes,
+    so that workers do not need to import the simulation modules (and,
+    optionally, load the artifacts) themselves.
+
+    By default, workers are forked from a fork-server that has imported the
+    modules in ``PRELOAD_MODULES``. If ``preload_artifacts`` is ``True``,
+    the artifact for each model specification is loaded into the
+    :mod:`~vivarium_unimelb_COVID19.artifact_cache` of this process, and the
+    workers are forked directly from this process, so that they share the
+    loaded tables (copy-on-write). Workers must run in warm mode in order to
+    use these tables.
+
+    Where these start methods are not supported (e.g., on Windows), the
+    default context is returned.
+
+    :param spec_files: The model specification files for which simulations
+        will be run.
+    :param preload_artifacts: Whether to load the artifacts before starting
+        the workers.
+    """
+    logger = logging.getLogger(__name__)
+    start_methods = multiprocessing.get_all_start_methods()
+
+    if preload_artifacts:
+        if 'fork' not in start_methods:
+            logger.warning('Cannot share preloaded artifacts with workers')
+            return multiprocessing.get_context()
+        artifact_paths = set()
+        for spec_file in spec_files:
+            artifact_path = get_artifact_path(spec_file)
+            if artifact_path:
+                artifact_paths.add(artifact_path)
+        for artifact_path in sorted(artifact_paths):
+            logger.info('Preloading {}'.format(artifact_path))
+            artifact_cache.preload(artifact_path)
+        return multiprocessing.get_context('fork')
+
+    if 'forkserver' not in start_methods:
+        return multiprocessing.get_context()
+    context = multiprocessing.get_context('forkserver')
+    context.set_forkserver_preload(PRELOAD_MODULES)
+    return context
+
+
+def receive_results(result_q, workers, on_result, timeout=0.5,
+                    on_memory=None, on_error=None):
+    """
+    Pass each result to ``on_result`` as it arrives from the worker
+    processes, until every worker has terminated and the queue is empty.
+
+    :param result_q: The queue on which workers put
+        ``(args, value, memory_mb, error)`` tuples (see :func:`apply_func`).
+    :param workers: The worker processes; ``on_memory`` may start more
+        workers and add them to this list.
+    :param on_result: The function that is called for each result, or
+        ``None``.
+    :param timeout: The time (in seconds) to wait for each result before
+        checking whether any of the workers are still running.
+    :param on_memory: An optional function that is called with the peak
+        memory of the worker that produced each result.
+    :param on_error: An optional function that is called as
+        ``on_error(args, error)`` for each job that raised an exception.
+    """
+    while True:
+        try:
+            args, value, memory_mb, error = result_q.get(timeout=timeout)
+        except queue.Empty:
+            if not any(worker.is_alive() for worker in workers):
+                break
+            continue
+        if error is not None:
+            if on_error is not None:
+                on_error(args, error)
+        elif on_result is not None:
+            on_result(args, value)
+        if on_memory is not None:
+            on_memory(memory_mb)
+
+
+def initialise_simulation_from_specification_config(model_specification,
+                                                     plugin_configuration=None):
     """
     Construct a simulation object from a model specification.
 
     :param model_specification: The simulation specification (``ConfigTree``).
+    :param plugin_configuration: Optional plugin configuration that overrides
+        the plugins in the model specification.
     """
     
-    simulation = engine.SimulationContext(model_specification, None, None, None)
+    simulation = engine.SimulationContext(model_specification, None, None,
+                                          plugin_configuration)
 
     return simulation
 
 
-def run_nth_draw(model_specification_file, draw_number):
+def build_cached_specification(model_specification_file):
+    """
+    Return the model specification for a YAML file, which is only parsed the
+    first time that it is requested by each process. The artifact path is
+    resolved to an absolute path, since the specification no longer refers
+    to the original file.
+
+    :param model_specification_file: The YAML model specification file.
+    """
+    key = str(model_specification_file)
+    if key not in _SPECIFICATIONS:
+        spec = config.build_model_specification(model_specification_file)
+        spec_dict = spec.to_dict()
+        if spec.configuration.input_data.artifact_path:
+            artifact_path = parse_artifact_path_config(spec.configuration)
+            spec_dict['configuration']['input_data']['artifact_path'] = \
+                artifact_path
+        _SPECIFICATIONS[key] = spec_dict
+    spec_dict = copy.deepcopy(_SPECIFICATIONS[key])
+    return config.build_model_specification(spec_dict)
+
+
+def get_artifact_path(model_specification_file):
+    """
+    Return the absolute path of the artifact used by a model specification,
+    or ``None`` if it does not use an artifact.
+
+    :param model_specification_file: The YAML model specification file.
+    """
+    spec = build_cached_specification(model_specification_file)
+    return spec.configuration.input_data.artifact_path
+
+
+def load_result_cache(cache_dir, spec_files):
+    """
+    Return the :class:`~.result_cache.ResultCache` for a cache directory,
+    having calculated the hashes of the artifact tables used by each model
+    specification, so that the worker processes (to which the cache is sent
+    in place of its directory) do not each calculate these hashes.
+
+    :param cache_dir: The cache directory.
+    :param spec_files: A list of model specification files.
+    """
+    cache = get_result_cache(cache_dir)
+    artifact_paths = set(get_artifact_path(spec_file)
+                         for spec_file in spec_files)
+    for artifact_path in sorted(p for p in artifact_paths if p):
+        # NOTE: a simulation whose artifact does not exist will fail when it
+        # is run, and should not prevent the other simulations from running.
+        if os.path.exists(artifact_path):
+            cache.artifact_hashes(artifact_path)
+    return cache
+
+
+def load_specification(model_specification_file, warm=False, segments=None):
+    """
+    Return the model specification for a simulation, which is only parsed
+    once per process (see :func:`build_cached_specification`) in warm mode
+    or when tables are read from shared memory segments.
+
+    :param model_specification_file: The YAML model specification file.
+    :param warm: Whether the simulation runs in warm mode.
+    :param segments: An optional dictionary that maps artifact paths to
+        shared memory segments.
+    """
+    if warm or segments:
+        return build_cached_specification(model_specification_file)
+    return config.build_model_specification(model_specification_file)
+
+
+def simulate_nth_draw(model_specification_file, draw_number,
+                      write_files=True, warm=False, segments=None,
+                      history_file=None, cache_dir=None, spec=None):
+    """
+    Run a model simulation for a specific draw number, and return the outputs
+    of each observer.
+
+    :param model_specification_file: The YAML model specification file.
+    :param draw_number: The draw number to select for rates and values that
+        have multiple draws.
+    :param write_files: Whether the observers should write their outputs to
+        disk (``observer.write_files``).
+    :param warm: Whether to reuse the model specification and artifact tables
+        that were loaded by earlier simulations in this process (see
+        :mod:`~vivarium_unimelb_COVID19.artifact_cache`).
+    :param segments: An optional dictionary that maps artifact paths to
+        shared memory segments (see
+        :mod:`~vivarium_unimelb_COVID19.shared_artifact`); if the model
+        specification's artifact has a segment, tables are read from this
+        segment instead of the artifact (unless the model specification was
+        compiled into a run bundle, see :mod:`~.bundle`).
+    :param history_file: An optional file in which to record the time taken
+        (see :mod:`~.scheduling`).
+    :param cache_dir: An optional :class:`~.result_cache.ResultCache` (or
+        its directory); if this simulation has already been completed, its
+        cached outputs are returned (and written to disk, if ``write_files``
+        is ``True``) instead of running the simulation.
+    :param spec: The model specification for this simulation, if it has
+        already been loaded (see :func:`load_specification`); it is modified
+        for this draw.
+    :returns: A dictionary that maps the output suffix of each observer to
+        the table that it recorded.
+    """
+    if spec is None:
+        spec = load_specification(model_specification_file, warm, segments)
+    if warm:
+        plugin_config = artifact_cache.PLUGIN_CONFIGURATION
+    elif history_file is not None:
+        # NOTE: use an artifact manager that records the time spent loading
+        # data, so that it can be included in the telemetry.
+        plugin_config = artifact_cache.TIMED_PLUGIN_CONFIGURATION
+    else:
+        plugin_config = None
+
+    segment_path = None
+    if segments:
+        segment_path = segments.get(spec.configuration.input_data.artifact_path)
+    if 'shared_artifact_path' in spec.configuration.input_data:
+        # NOTE: this model specification was compiled into a run bundle (see
+        # :mod:`~.bundle`), so its tables are always read from the bundle.
+        plugin_config = shared_artifact.PLUGIN_CONFIGURATION
+    elif segment_path is not None:
+        plugin_config = shared_artifact.PLUGIN_CONFIGURATION
+        spec.configuration.update(
+            {'input_data': {'shared_artifact_path': segment_path}},
+            layer='override', source='simulate_nth_draw')
+    spec.configuration.input_data.input_draw_number = draw_number
+    spec.configuration.update({'observer': {'write_files': write_files}},
+                              layer='override', source='simulate_nth_draw')
+
+    cache = get_result_cache(cache_dir)
+    if cache is not None:
+        artifact_path = get_artifact_path(model_specification_file)
+        job_key = hash_specification(spec, draw_number)
+        results = cache.get(job_key, artifact_path)
+        if results is not None:
+            logger = logging.getLogger(__name__)
+            logger.info('Using cached outputs for draw #{} of {}'.format(
+                draw_number, model_specification_file))
+            if write_files:
+                write_results(spec.configuration, results)
+            return results
+
+    start_time = time.time()
+    simulation = initialise_simulation_from_specification_config(
+        spec, plugin_config)
+    phase_times = [time.time()]
+    for phase in [simulation.setup, simulation.initialize_simulants]:
+        phase()
+        phase_times.append(time.time())
+    # Check the observers' output suffixes before running the simulation.
+    get_observers(simulation)
+    run_start = simulation._clock.time
+    for phase in [simulation.run, simulation.finalize]:
+        phase()
+        phase_times.append(time.time())
+
+    results = get_observer_results(simulation)
+    if history_file is not None:
+        # Record the total time and the time taken by each phase, as per
+        # simulate_all_models.py, in minutes.
+        times = [phase_times[-1] - start_time]
+        times.extend(end - start for (start, end)
+                     in zip(phase_times[:-1], phase_times[1:]))
+        timings = {name: t / 60 for (name, t) in zip(TIMING_COLUMNS, times)}
+        steps = get_time_steps(simulation, run_start)
+        telemetry = job_telemetry(
+            steps=steps,
+            run_seconds=phase_times[3] - phase_times[2],
+            artifact_load_seconds=get_artifact_load_seconds(simulation),
+            output_bytes=get_output_bytes(spec.configuration, results,
+                                          write_files))
+        record_timing(history_file, model_specification_file, draw_number,
+                      timings, peak_memory_mb(), telemetry)
+
+    if cache is not None:
+        cache.put(job_key, model_specification_file, draw_number, results,
+                  artifact_path, get_loaded_keys(simulation))
+    return results
+
+
+def write_results(configuration, results):
+    """
+    Write observer outputs to the files that the observers would write.
+
+    :param configuration: The simulation configuration.
+    :param results: A dictionary that maps the output suffix of each observer
+        to the table that it recorded.
+    """
+    for suffix, table in results.items():
+        output_csv_mkdir(table, output_file(configuration, suffix), idx=False)
+
+
+def get_loaded_keys(simulation):
+    """
+    Return the artifact keys that were loaded by a simulation.
+
+    :param simulation: The simulation object.
+    """
+    # NOTE: the simulation does not provide a public accessor for its
+    # plugins, so we use the plugin manager directly.
+    manager = simulation._plugin_manager.get_plugin('data')
+    if hasattr(manager, 'loaded_keys'):
+        return set(manager.loaded_keys)
+    if getattr(manager, 'artifact', None) is not None:
+        # NOTE: the artifact retains each table that it loads.
+        return set(manager.artifact._cache.keys())
+    return set()
+
+
+def get_time_steps(simulation, start_time):
+    """
+    Return the number of time-steps that a simulation has taken since its
+    clock was at ``start_time``.
+
+    :param simulation: The simulation object.
+    :param start_time: The earlier simulation time.
+    """
+    # NOTE: the simulation does not provide a public accessor for its clock,
+    # so we use the clock directly.
+    clock = simulation._clock
+    return int(round((clock.time - start_time) / clock.step_size))
+
+
+def get_artifact_load_seconds(simulation):
+    """
+    Return the time spent loading artifact data, in seconds, or ``None`` if
+    the artifact manager does not record this (see
+    :class:`~vivarium_unimelb_COVID19.artifact_cache.TimedArtifactManager`).
+
+    :param simulation: The simulation object.
+    """
+    manager = simulation._plugin_manager.get_plugin('data')
+    return getattr(manager, 'load_seconds', None)
+
+
+def get_output_bytes(configuration, results, write_files=True):
+    """
+    Return the total size of the files written by the observers, in bytes.
+
+    :param configuration: The simulation configuration.
+    :param results: A dictionary that maps the output suffix of each observer
+        to the table that it recorded.
+    :param write_files: Whether the observers wrote their outputs to disk.
+    """
+    if not write_files:
+        return 0
+    total = 0
+    for suffix in results:
+        path = output_file(configuration, suffix)
+        if os.path.exists(path):
+            total += os.path.getsize(path)
+    return total
+
+
+def get_components(simulation):
+    """
+    Return the components of a simulation that has been set up.
+
+    :param simulation: The simulation object.
+    :returns: A dictionary that maps the name of each component to the
+        component.
+    :raises ValueError: If the components cannot be listed with this version
+        of vivarium.
+    """
+    # NOTE: the simulation does not provide a public accessor for its
+    # components, so we use the component manager directly.
+    manager = getattr(simulation, '_component_manager', None)
+    if not hasattr(manager, 'list_components'):
+        raise ValueError('Cannot list the simulation components with this '
+                         'version of vivarium')
+    return manager.list_components()
+
+
+def get_observers(simulation):
+    """
+    Return the observers in a simulation: the components that have an
+    output suffix.
+
+    :param simulation: The simulation object.
+    :returns: A dictionary that maps the output suffix of each observer to
+        the observer.
+    :raises ValueError: If two observers have the same output suffix, since
+        their outputs would be written to the same file.
+    """
+    observers = {}
+    names = {}
+    for name, component in get_components(simulation).items():
+        suffix = getattr(component, 'output_suffix', None)
+        if suffix is None:
+            continue
+        if suffix in observers:
+            msg = 'Observers {} and {} have the same output suffix: {}'
+            raise ValueError(msg.format(names[suffix], name, suffix))
+        observers[suffix] = component
+        names[suffix] = name
+    return observers
+
+
+def get_observer_results(simulation):
+    """
+    Return the outputs recorded by each observer in a simulation that has
+    been finalized.
+
+    :param simulation: The simulation object.
+    :returns: A dictionary that maps the output suffix of each observer to
+        the table that it recorded.
+    :raises ValueError: If two observers have the same output suffix (see
+        :func:`get_observers`).
+    """
+    results = {}
+    for suffix, observer in get_observers(simulation).items():
+        if getattr(observer, 'results', None) is not None:
+            results[suffix] = observer.results
+    return results
+
+
+def run_nth_draw(model_specification_file, draw_number, write_files=True,
+                 warm=False, segments=None, history_file=None,
+                 cache_dir=None, spec=None):
     """
     Run a model simulation for a specific draw number.
 
     :param model_specification_file: The YAML model specification file.
     :param draw_number: The draw number to select for rates and values that
         have multiple draws.
+    :param write_files: Whether the observers should write their outputs to
+        disk (``observer.write_files``).
+    :param warm: Whether to reuse the model specification and artifact tables
+        that were loaded by earlier simulations in this process.
+    :param segments: An optional dictionary that maps artifact paths to
+        shared memory segments.
+    :param history_file: An optional file in which to record the time taken.
+    :param cache_dir: An optional directory in which simulation outputs are
+        cached.
+    :param spec: The model specification for this simulation, if it has
+        already been loaded.
+    :returns: A dictionary that maps the output suffix of each observer to
+        the table that it recorded.
     """
     logger = logging.getLogger(__name__)
     logger.info('{} Simulating draw #{} for {} ...'.format(
         datetime.datetime.now().strftime("%H:%M:%S"),
         draw_number, model_specification_file))
-    spec = config.build_model_specification(model_specification_file)
-    spec.configuration.input_data.input_draw_number = draw_number
 
-    simulation = initialise_simulation_from_specification_config(spec)
-    simulation.setup()
-    simulation.initialize_simulants()
-    simulation.run()
-    simulation.finalize()
+    results = simulate_nth_draw(model_specification_file, draw_number,
+                                write_files, warm, segments, history_file,
+                                cache_dir, spec)
 
     logger.info('{} Simulation for draw #{} complete'.format(
         datetime.datetime.now().strftime("%H:%M:%S"),
         draw_number))
 
+    return results
+
+
+def run_nth_draw_collected(collector, model_specification_file,
+                           draw_number, warm=False, segments=None,
+                           history_file=None, cache_dir=None):
+    """
+    Run a model simulation for a specific draw number, and send the observer
+    outputs to a :class:`~.collector.ResultCollector` instead of having each
+    observer write its own file.
+
+    :param collector: The :class:`~.collector.ResultCollector`.
+    :param model_specification_file: The YAML model specification file.
+    :param draw_number: The draw number to select for rates and values that
+        have multiple draws.
+    :param warm: Whether to reuse the model specification and artifact tables
+        that were loaded by earlier simulations in this process.
+    :param segments: An optional dictionary that maps artifact paths to
+        shared memory segments.
+    :param history_file: An optional file in which to record the time taken.
+    :param cache_dir: An optional directory in which simulation outputs are
+        cached.
+    :returns: A dictionary that maps the output suffix of each observer to
+        the table that it recorded.
+    """
+    spec = load_specification(model_specification_file, warm, segments)
+    output_prefix = spec.configuration.observer.output_prefix
+    results = run_nth_draw(model_specification_file, draw_number,
+                           write_files=False, warm=warm, segments=segments,
+                           history_file=history_file, cache_dir=cache_dir,
+                           spec=spec)
+    # Note: this blocks while the collector's queue is full, and raises an
+    # exception if the collector has stopped.
+    collector.put(output_prefix, draw_number, results)
+    return results
+
 
-def run_many(spec_files, num_draws, num_procs):
+def run_many(spec_files, num_draws, num_procs, on_result=None,
+             write_files=True, collect=False, warm=False, preload=False,
+             preload_artifacts=False, shared_artifacts=False, history=None,
+             cache_dir=None, min_free_mb=resources.MIN_FREE_MB,
+             on_error=None):
     """
     Run a number of model simulations in serial or in parallel.
 
@@ -192,19 +777,317 @@ def run_many(spec_files, num_draws, num_procs):
         including draw number zero (i.e., the expected values).
     :param num_procs: The number of processes to spawn in order to run these
         simulations; set this to values greater than 1 to run multiple
-        simulations in parallel.
+        simulations in parallel, or to ``'auto'`` to choose the number of
+        processes from the number of CPUs and the memory used by each process
+        (see :class:`~.resources.WorkerSizing`), in which case each process
+        is pinned to a single CPU and limited to a single thread.
+    :param on_result: An optional function that is called in the main process
+        as ``on_result((spec_file, draw, ...), results)`` for each
+        completed simulation, where ``results`` are the observer outputs.
+    :param write_files: Whether the observers should write their outputs to
+        disk.
+    :param collect: Whether to send the observer outputs to a single
+        collector process, which writes one file per model specification and
+        observer that contains every draw, instead of having each simulation
+        write its own files.
+    :param warm: Whether each process should reuse the model specification
+        and artifact tables that it loaded for earlier draws of the same
+        model specification, rather than reading them again for each draw.
+        Every draw of each table is kept in memory, so this trades memory
+        for time when running many draws.
+    :param preload: Whether to start the worker processes from a fork-server
+        that has already imported the simulation modules.
+    :param preload_artifacts: Whether to load the artifacts into memory
+        before starting the worker processes, which then share these tables;
+        this implies ``warm`` and ``preload``.
+    :param shared_artifacts: Whether to load each artifact once, in this
+        process, into shared memory, from which every simulation reads its
+        tables; each artifact is removed from shared memory when all of the
+        simulations that use it have finished.
+    :param history: An optional :class:`~.scheduling.TimingHistory`, which
+        is used to start the model specifications with the longest predicted
+        run times first; the time taken by each simulation is recorded in
+        its history file.
+    :param cache_dir: An optional directory in which the outputs of each
+        simulation are cached; simulations whose outputs are already in the
+        cache (for the same model specification, draw, artifact tables and
+        package version) are not run again, so that an interrupted batch can
+        be resumed.
+    :param min_free_mb: When ``num_procs`` is ``'auto'``, processes wait
+        before starting each simulation while less than this much memory (in
+        megabytes) is available.
+    :param on_error: An optional function that is called in the main process
+        as ``on_error((spec_file, draw, ...), error)`` for each simulation
+        that raised an exception, where ``error`` is the formatted traceback.
     :returns: ``True`` if the simulations completed successfully, otherwise
         ``False``.
     """
+    sizing = None
+    if num_procs == 'auto':
+        sizing = get_worker_sizing(spec_files, history, min_free_mb)
+        num_procs = sizing.max_workers
+
+    context = None
+    if preload_artifacts:
+        warm = True
+    if num_procs > 1 and (preload or preload_artifacts):
+        context = get_worker_context(spec_files, preload_artifacts)
+
+    if collect and not write_files:
+        raise ValueError('Cannot collect outputs without writing files')
+
+    history_file = None
+    if history is not None:
+        spec_files = history.order(spec_files)
+        history_file = history.history_file
+
+    if shared_artifacts:
+        # NOTE: the artifacts are released when each simulation completes,
+        # but its outputs are only sent to this process if they are used.
+        send_values = on_result is not None
+        with shared_artifact.SharedArtifactStore() as store:
+            on_result = share_artifacts(store, spec_files, num_draws,
+                                        on_result)
+            return run_simulations(spec_files, num_draws, num_procs,
+                                   on_result, write_files, collect, warm,
+                                   context, dict(store.segments),
+                                   history_file, cache_dir, sizing, on_error,
+                                   send_values)
+
+    return run_simulations(spec_files, num_draws, num_procs, on_result,
+                           write_files, collect, warm, context,
+                           history_file=history_file, cache_dir=cache_dir,
+                           sizing=sizing, on_error=on_error)
+
+
+def get_worker_sizing(spec_files, history=None,
+                      min_free_mb=resources.MIN_FREE_MB):
+    """
+    Return the :class:`~.resources.WorkerSizing` that chooses the number of
+    processes, using the peak memory recorded in the timing history (if
+    any) until the memory used by the first process has been measured.
+
+    :param spec_files: A list of model specification files.
+    :param history: An optional :class:`~.scheduling.TimingHistory`.
+    :param min_free_mb: Processes wait before starting each simulation while
+        less than this much memory (in megabytes) is available.
+    """
+    worker_mb = None
+    if history is not None:
+        predicted = [history.predict_memory_mb(spec_file)
+                     for spec_file in spec_files]
+        predicted = [mb for mb in predicted if mb is not None]
+        if predicted:
+            worker_mb = max(predicted)
+    return resources.WorkerSizing(worker_mb=worker_mb, min_free_mb=min_free_mb)
+
+
+def run_simulations(spec_files, num_draws, num_procs, on_result, write_files,
+                    collect, warm, context, segments=None, history_file=None,
+                    cache_dir=None, sizing=None, on_error=None,
+                    send_values=None):
+    """
+    Run a number of model simulations in serial or in parallel, as per
+    :func:`run_many`.
+
+    :param segments: An optional dictionary that maps artifact paths to
+        shared memory segments.
+    :param history_file: An optional file in which to record the time taken
+        by each simulation.
+    :param cache_dir: An optional directory in which simulation outputs are
+        cached.
+    :param sizing: An optional :class:`~.resources.WorkerSizing`, which
+        chooses the number of processes (up to ``num_procs``).
+    :param on_error: An optional function that is called for each
+        simulation that raised an exception.
+    :param send_values: Whether worker processes send the outputs of each
+        simulation to ``on_result`` (see :func:`run_in_parallel`).
+    """
+    if cache_dir is not None:
+        cache_dir = load_result_cache(cache_dir, spec_files)
+
+    if collect:
+        with ResultCollector(context=context) as collector:
+            func = functools.partial(run_nth_draw_collected, collector)
+            return run_jobs(func, spec_files, num_draws, num_procs, on_result,
+                            context, sizing, warm, segments, history_file,
+                            cache_dir, on_error=on_error,
+                            send_values=send_values)
+
+    return run_jobs(run_nth_draw, spec_files, num_draws, num_procs,
+                    on_result, context, sizing, write_files, warm, segments,
+                    history_file, cache_dir, on_error=on_error,
+                    send_values=send_values)
+
+
+def share_artifacts(store, spec_files, num_draws, on_result=None):
+    """
+    Export the artifact of each model specification to shared memory, with
+    one reference for each simulation that will use it, and return a result
+    handler that releases these references as each simulation completes.
+
+    :param store: The :class:`~.shared_artifact.SharedArtifactStore`.
+    :param spec_files: A list of model specification files.
+    :param num_draws: The number of draws (not including draw zero) or a
+        sequence of draw numbers.
+    :param on_result: An optional function that is also called for each
+        completed simulation.
+    :returns: A function that is called as ``release(args, value)``, where
+        ``value`` is ``None`` if the outputs were not sent from the worker
+        processes.
+    """
+    num_jobs = len(get_draw_numbers(num_draws))
+    artifact_paths = {}
+    for spec_file in spec_files:
+        artifact_path = get_artifact_path(spec_file)
+        if artifact_path:
+            artifact_paths[spec_file] = artifact_path
+            store.add(artifact_path, num_jobs)
+
+    def release(args, value):
+        # NOTE: simulations that fail do not release their references, and
+        # their segments are removed when the store is closed.
+        if args[0] in artifact_paths:
+            store.release(artifact_paths[args[0]])
+        if on_result is not None:
+            on_result(args, value)
+
+    return release
+
+
+def run_jobs(func, spec_files, num_draws, num_procs, on_result=None,
+             context=None, sizing=None, *extra_args, on_error=None,
+             send_values=None):
+    """
+    Run a simulation function for each model specification and each draw,
+    in serial or in parallel.
+
+    :param func: The function that performs a single simulation, which is
+        called as ``func(spec_file, draw, *extra_args)``.
+    :param spec_files: A list of model specification files.
+    :param num_draws: The number of draws (not including draw zero) or a
+        sequence of draw numbers.
+    :param num_procs: The number of processes to spawn.
+    :param on_result: An optional function that is called in the main process
+        as ``on_result(args, value)`` for each completed simulation.
+    :param context: The ``multiprocessing`` context used to start the worker
+        processes, if the simulations are run in parallel.
+    :param sizing: An optional :class:`~.resources.WorkerSizing`, which
+        chooses the number of processes (up to ``num_procs``) if the
+        simulations are run in parallel.
+    :param on_error: An optional function that is called in the main process
+        as ``on_error(args, error)`` for each simulation that raised an
+        exception, where ``error`` is the formatted traceback; if this is not
+        provided, exceptions are raised when the simulations are run
+        serially.
+    :param send_values: Whether worker processes send the value returned by
+        each simulation to ``on_result`` (see :func:`run_in_parallel`).
+    :returns: ``True`` if the simulations completed successfully, otherwise
+        ``False``.
+    """
+    draws = get_draw_numbers(num_draws)
     if num_procs < 1:
         raise ValueError('Invalid number of processes: {}'.format(num_procs))
     elif num_procs == 1:
         # Run the simulations serially.
+        success = True
         for spec_file in spec_files:
-            for draw in range(num_draws + 1):
-                run_nth_draw(spec_file, draw)
-        return True
+            for draw in draws:
+                args = (spec_file, draw) + extra_args
+                if on_error is None:
+                    results = func(*args)
+                else:
+                    try:
+                        results = func(*args)
+                    except Exception:
+                        success = False
+                        on_error(args, traceback.format_exc())
+                        continue
+                if on_result is not None:
+                    on_result(args, results)
+        return success
     else:
         # Run the simulations in parallel.
-        args_iter = itertools.product(spec_files, range(num_draws + 1))
-        return run_in_parallel(run_nth_draw, args_iter, num_procs)
+        args_iter = (args + extra_args for args
+                     in itertools.product(spec_files, draws))
+        return run_in_parallel(func, args_iter, num_procs, on_result,
+                               context, sizing, on_error, send_values)
+
+
+def get_draw_numbers(draws):
+    """
+    Return the draw numbers for which simulations will be run.
+
+    :param draws: Either the number of draws (not including draw zero, so
+        that draws ``0..draws`` are selected) or a sequence of draw numbers.
+    """
+    if isinstance(draws, int):
+        return list(range(draws + 1))
+    return list(draws)
+
+
+def run_batch(spec_files, draws, num_procs=1, write_files=False,
+              as_arrays=False, warm=False, preload=False,
+              shared_artifacts=False):
+    """
+    Run a number of model simulations and return the observer outputs,
+    without needing to write them to disk and read them back in.
+
+    The outputs are sent from the worker processes to the main process
+    through a pipe when the simulations are run in parallel.
+
+    :param spec_files: A list of model specification files.
+    :param draws: Either the number of draws (not including draw zero) or a
+        sequence of draw numbers.
+    :param num_procs: The number of processes to spawn in order to run these
+        simulations.
+    :param write_files: Whether the observers should also write their outputs
+        to disk.
+    :param as_arrays: Return each output table as a NumPy record array rather
+        than a ``pandas.DataFrame``.
+    :param warm: Whether each process should reuse the model specification
+        and artifact tables that it loaded for earlier draws.
+    :param preload: Whether to start the worker processes from a fork-server
+        that has already imported the simulation modules.
+    :param shared_artifacts: Whether to load each artifact once into shared
+        memory, from which every simulation reads its tables.
+    :returns: A dictionary that maps each ``(spec_file, draw)`` tuple to a
+        dictionary of observer outputs, keyed by the observer output suffix.
+    :raises RuntimeError: If any of the simulations failed, in which case the
+        message lists each failed ``(spec_file, draw)`` tuple and the first
+        traceback.
+    """
+    outputs = {}
+    errors = {}
+
+    def on_result(args, results):
+        spec_file, draw = args[:2]
+        if as_arrays:
+            results = {suffix: table.to_records(index=False)
+                       for suffix, table in results.items()}
+        outputs[(spec_file, draw)] = results
+
+    def on_error(args, error):
+        spec_file, draw = args[:2]
+        errors[(spec_file, draw)] = error
+
+    success = run_many(spec_files, draws, num_procs, on_result=on_result,
+                       write_files=write_files, warm=warm, preload=preload,
+                       shared_artifacts=shared_artifacts, on_error=on_error)
+
+    # NOTE: a worker that is terminated does not report its current job.
+    jobs = itertools.product(spec_files, get_draw_numbers(draws))
+    failed = [job for job in jobs if job not in outputs]
+    if failed:
+        error = next((errors[job] for job in failed if job in errors),
+                     'No traceback; the worker process did not finish')
+        msg = '{} of {} simulations failed: {}\n{}'
+        raise RuntimeError(msg.format(len(failed),
+                                      len(failed) + len(outputs),
+                                      ', '.join(repr(job) for job in failed),
+                                      error))
+    if not success:
+        logger = logging.getLogger(__name__)
+        logger.error('Not all simulations completed successfully')
+
+    return outputs
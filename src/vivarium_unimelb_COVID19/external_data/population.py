@@ -4,13 +4,20 @@ import pandas as pd
 import numpy as np
 import pathlib
 
+from vivarium_unimelb_COVID19.population import project_mortality_rate
+
+from .input_cache import read_input_csv
+
 #Includes draw 0
 DRAW_NUM = 10
 
 class Population:
 
-    def __init__(self, data_dir, year_start):
-        self.draw_columns = ['draw_{}'.format(i) for i in range(DRAW_NUM)]
+    def __init__(self, data_dir, year_start, draws=None):
+        # Only read the selected draws (default: every draw).
+        if draws is None:
+            draws = range(DRAW_NUM)
+        self.draw_columns = ['draw_{}'.format(i) for i in draws]
 
         data_file_mort = '{}/base_population_mor.csv'.format(data_dir)
         data_path_mort = str(pathlib.Path(data_file_mort).resolve())
@@ -21,13 +28,17 @@ class Population:
         data_file_exp = '{}/base_population_hexp.csv'.format(data_dir)
         data_path_exp = str(pathlib.Path(data_file_exp).resolve())
 
-        df_mort = pd.read_csv(data_path_mort)
+        mort_columns = ['age', 'sex', 'APC in all-cause mortality', '5-year']
+        df_mort = read_input_csv(data_path_mort,
+                                 columns=mort_columns + self.draw_columns)
         df_mort = df_mort.rename(columns={'mortality per 1 rate': 'mortality_rate',
                                           'APC in all-cause mortality': 'mortality_apc',
                                           '5-year': 'population'})
 
-        df_dis = pd.read_csv(data_path_dis)
-        df_exp = pd.read_csv(data_path_exp)
+        df_dis = read_input_csv(data_path_dis,
+                                columns=['age', 'sex'] + self.draw_columns)
+        df_exp = read_input_csv(data_path_exp,
+                                columns=['age', 'sex'] + self.draw_columns)
 
         # Use identical populations in the BAU and intervention scenarios.
         df_mort['bau_population'] = df_mort['population'].values
@@ -95,18 +106,63 @@ class Population:
     def get_acmr_apc(self):
         """Return the annual percent change (APC) in mortality rate."""
         df = self._mort_data[['year', 'age', 'sex', 'mortality_apc']]
-        df = df.rename(columns={'mortality_apc': 'value'})
+        years = np.array(self.years())
+        num_rows = len(df.index)
+
+        # NOTE: the rows are already sorted by age and sex, so repeating them
+        # for each year preserves the ordering by year, age and sex.
+        df = pd.DataFrame({
+            'year': np.repeat(years, num_rows),
+            'age': np.tile(df['age'].values, len(years)),
+            'sex': np.tile(df['sex'].values, len(years)),
+            'value': np.tile(df['mortality_apc'].values, len(years)),
+        }, columns=['year', 'age', 'sex', 'value'])
+
+        return df
 
-        tables = []
-        for year in self.years():
-            df['year'] = year
-            tables.append(df.copy())
+    def get_base_mortality_rate(self):
+        """Return the base mortality rate for each stratum."""
+        df = self._mort_data[['age', 'sex'] + self.draw_columns]
+
+        # Replace 'age' with age groups.
+        df = df.rename(columns={'age': 'age_start'})
+        df.insert(df.columns.get_loc('age_start') + 1,
+                  'age_end',
+                  df['age_start'] + 1)
 
-        df = pd.concat(tables).sort_values(['year', 'age', 'sex'])
+        df = df.sort_values(['age_start', 'sex'])
         df = df.reset_index(drop=True)
 
         return df
 
+    def get_mortality_apc(self):
+        """
+        Return the annual percent change (APC) in mortality rate for each
+        stratum.
+        """
+        df = self._mort_data[['age', 'sex', 'mortality_apc']]
+        df = df.rename(columns={'age': 'age_start', 'mortality_apc': 'value'})
+        df.insert(df.columns.get_loc('age_start') + 1,
+                  'age_end',
+                  df['age_start'] + 1)
+
+        df = df.sort_values(['age_start', 'sex'])
+        df = df.reset_index(drop=True)
+
+        return df
+
+    def get_mortality_projection(self):
+        """
+        Return the period over which the mortality rate is projected, and the
+        number of years for which the APC applies (see
+        :func:`~vivarium_unimelb_COVID19.population.project_mortality_rate`).
+        """
+        return {
+            'year_start': int(self.year_start),
+            'year_end': int(self.year_end),
+            'apc_years': int(self._num_apc_years),
+        }
+
     def get_mortality_rate(self):
         """
         Return the mortality rate for each strata.
@@ -116,43 +172,9 @@ class Population:
         # NOTE: see column IG in ErsatzInput.
         # - Each cohort has a separate APC (column FE)
         # - ACMR = BASE_ACMR * e^(APC * (year - 2011))
-        df_apc = self.get_acmr_apc()
-        df_acmr = self._mort_data[['age', 'sex'] + self.draw_columns]
-        base_acmr = df_acmr[self.draw_columns].copy()
-
-        # Replace 'age' with age groups.
-        df_acmr = df_acmr.rename(columns={'age': 'age_start'})
-        df_acmr.insert(df_acmr.columns.get_loc('age_start') + 1,
-                       'age_end',
-                       df_acmr['age_start'] + 1)
-
-        # These values apply at each year of the simulation, so we only need
-        # to define a single bin.
-        df_acmr.insert(0, 'year_start', self.year_start -1)
-        df_acmr.insert(1, 'year_end', self.year_start)
-
-        tables = []
-        tables.append(df_acmr.copy())
-        for counter, year in enumerate(self.years()):
-            if counter <= self._num_apc_years:
-                year_apc = df_apc[df_apc.year == year]
-                apc = year_apc['value'].values
-                scale = np.exp(apc * (year - self.year_start))
-                df_acmr.loc[:, self.draw_columns] = base_acmr * scale[:, None]
-            else:
-                # NOTE: use the same scale for this cohort as per the previous
-                # year; shift by 2 because there are male and female cohorts.
-                scale[2:] = scale[:-2]
-                df_acmr.loc[:, self.draw_columns] = base_acmr * scale[:, None]
-            df_acmr['year_start'] = year
-            df_acmr['year_end'] = year + 1
-            tables.append(df_acmr.copy())
-
-        df = pd.concat(tables).sort_values(['year_start', 'age_start',
-                                            'sex'])
-        df = df.reset_index(drop=True)
-
-        return df
+        return project_mortality_rate(self.get_base_mortality_rate(),
+                                      self.get_mortality_apc(),
+                                      self.get_mortality_projection())
 
     def get_expenditure(self):
         """Return the health expenditure for each stratum."""
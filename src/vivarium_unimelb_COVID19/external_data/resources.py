@@ -0,0 +1,180 @@
+"""Choose the number of worker processes from the available memory and CPUs."""
+
+import logging
+import os
+import sys
+import time
+
+from threadpoolctl import threadpool_limits
+
+
+#The environment variables that limit the threads used by NumPy, BLAS, etc.
+THREAD_VARIABLES = ['OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS',
+                    'MKL_NUM_THREADS', 'NUMEXPR_NUM_THREADS',
+                    'VECLIB_MAXIMUM_THREADS']
+
+#The memory (in megabytes) reserved for the main process and the system.
+RESERVE_MB = 1024
+
+#Workers wait before starting a new job while less than this much memory (in
+#megabytes) is available.
+MIN_FREE_MB = 512
+
+#The maximum time (in seconds) that a worker waits for memory to become
+#available before starting a new job regardless.
+MAX_WAIT_SECONDS = 300
+
+
+def available_memory_mb():
+    """
+    Return the memory that is available for new processes, in megabytes, or
+    ``None`` if this cannot be determined (i.e., ``/proc/meminfo`` does not
+    exist).
+    """
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    # NOTE: this value is measured in kilobytes.
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def usable_cpus():
+    """Return the CPUs on which this process is allowed to run."""
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def limit_threads(num_threads):
+    """
+    Limit the number of threads used by numerical libraries in this process
+    and in any processes that it starts.
+
+    The environment variables only affect libraries that are loaded after
+    they are set (e.g., in processes that are started later), so the thread
+    pools of the BLAS and OpenMP libraries that are already loaded by this
+    process (e.g., by NumPy, which may have been imported before a worker was
+    forked) are also limited directly.
+
+    :param num_threads: The maximum number of threads.
+    """
+    for name in THREAD_VARIABLES:
+        os.environ[name] = str(num_threads)
+    threadpool_limits(limits=num_threads)
+    if 'numexpr' in sys.modules:
+        sys.modules['numexpr'].set_num_threads(num_threads)
+
+
+def pin_to_cpu(worker_index):
+    """
+    Restrict this process to a single CPU, selected by the worker index.
+
+    :param worker_index: The (0-based) worker index.
+    """
+    if not hasattr(os, 'sched_setaffinity'):
+        return
+    cpus = usable_cpus()
+    os.sched_setaffinity(0, {cpus[worker_index % len(cpus)]})
+
+
+def wait_for_memory(min_free_mb, max_wait=MAX_WAIT_SECONDS, interval=5):
+    """
+    Wait until at least ``min_free_mb`` megabytes of memory are available,
+    or until ``max_wait`` seconds have passed.
+
+    :param min_free_mb: The required amount of available memory.
+    :param max_wait: The maximum time to wait, in seconds.
+    :param interval: The time between checks, in seconds.
+    """
+    waited = 0
+    while waited < max_wait:
+        free_mb = available_memory_mb()
+        if free_mb is None or free_mb >= min_free_mb:
+            return
+        time.sleep(interval)
+        waited += interval
+
+
+class WorkerSizing:
+    """
+    Choose the number of worker processes from the number of usable CPUs and
+    the memory that was available before any workers were started, based on
+    the peak memory used by each worker.
+
+    Until the peak memory of a worker is known (i.e., until the first job has
+    completed), only a single worker is started, unless ``worker_mb`` is
+    provided (e.g., from the timing history).
+
+    :param max_workers: The maximum number of workers (default: the number of
+        usable CPUs).
+    :param worker_mb: The predicted peak memory of each worker, in megabytes,
+        if known.
+    :param reserve_mb: The memory reserved for the main process and the
+        system, in megabytes.
+    :param min_free_mb: Workers wait before starting a new job while less
+        than this much memory is available.
+    :param pin: Whether to pin each worker to a single CPU.
+    :param threads: The maximum number of threads used by numerical
+        libraries in each worker.
+    """
+
+    def __init__(self, max_workers=None, worker_mb=None, reserve_mb=RESERVE_MB,
+                 min_free_mb=MIN_FREE_MB, pin=True, threads=1):
+        if max_workers is None:
+            max_workers = len(usable_cpus())
+        self.max_workers = max_workers
+        self.worker_mb = worker_mb
+        self.reserve_mb = reserve_mb
+        self.min_free_mb = min_free_mb
+        self.pin = pin
+        self.threads = threads
+        self.baseline_mb = available_memory_mb()
+
+    def update(self, worker_mb):
+        """
+        Record the peak memory used by a worker.
+
+        :param worker_mb: The peak memory, in megabytes, or ``None``.
+        """
+        if worker_mb is None:
+            return
+        if self.worker_mb is None or worker_mb > self.worker_mb:
+            self.worker_mb = worker_mb
+
+    def num_workers(self):
+        """Return the number of workers that should be running."""
+        if self.worker_mb is None:
+            return 1
+        if self.baseline_mb is None:
+            return self.max_workers
+        # NOTE: we use the memory that was available before any workers were
+        # started, because workers that have only just started have not yet
+        # reached their peak memory.
+        free_mb = max(0, self.baseline_mb - self.reserve_mb)
+        num_workers = int(free_mb // max(1, self.worker_mb))
+        return max(1, min(self.max_workers, num_workers))
+
+    def estimate_workers(self):
+        """
+        Return the number of workers that would be running once the memory
+        used by each worker is known; if it is not known, assume that it is
+        not the limiting factor.
+        """
+        if self.worker_mb is None:
+            return self.max_workers
+        return self.num_workers()
+
+
+def log_sizing(sizing, num_workers):
+    """Log the number of workers chosen by a :class:`WorkerSizing`."""
+    logger = logging.getLogger(__name__)
+    if sizing.worker_mb is None:
+        logger.info('Starting {} worker to measure its memory use'.format(
+            num_workers))
+    else:
+        logger.info('Running {} workers ({:.0f} MB each, {} CPUs)'.format(
+            num_workers, sizing.worker_mb, sizing.max_workers))
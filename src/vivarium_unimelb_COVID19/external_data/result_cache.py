@@ -0,0 +1,255 @@
+"""Cache simulation outputs, so that completed simulations are not re-run."""
+
+import hashlib
+import json
+import logging
+import os
+import pickle
+import shutil
+from pathlib import Path
+
+import pandas as pd
+from vivarium.framework.artifact import Artifact
+
+from vivarium_unimelb_COVID19 import compact_artifact
+from vivarium_unimelb_COVID19.__about__ import __version__
+
+
+#The configuration settings that do not affect the simulation outputs, or
+#that are accounted for separately.
+IGNORED_SETTINGS = [
+    ('input_data', 'input_draw_number'),
+    ('input_data', 'artifact_path'),
+    ('observer', 'write_files'),
+    ('input_data', 'shared_artifact_path'),
+]
+
+#The name of the file that describes each cached simulation.
+MANIFEST_FILE = 'manifest.json'
+
+#The name of the file that contains the outputs of each cached simulation.
+RESULTS_FILE = 'results.pickle'
+
+
+def hash_data(data):
+    """
+    Return a hash of the content of a table (or other value) loaded from an
+    artifact.
+
+    :param data: The loaded value.
+    """
+    digest = hashlib.sha256()
+    if isinstance(data, (pd.DataFrame, pd.Series)):
+        if isinstance(data, pd.DataFrame):
+            names = list(data.columns)
+        else:
+            names = [data.name]
+        digest.update(repr(names).encode('utf-8'))
+        digest.update(repr(list(data.index.names)).encode('utf-8'))
+        digest.update(pd.util.hash_pandas_object(data, index=True)
+                      .values.tobytes())
+    else:
+        digest.update(pickle.dumps(data, protocol=2))
+    return digest.hexdigest()
+
+
+def hash_specification(spec, draw):
+    """
+    Return a hash that identifies a simulation: the resolved model
+    specification (ignoring ``IGNORED_SETTINGS``), the draw number and the
+    package version.
+
+    :param spec: The model specification (``ConfigTree``).
+    :param draw: The draw number.
+    """
+    spec_dict = spec.to_dict()
+    configuration = spec_dict.get('configuration', {})
+    for (section, setting) in IGNORED_SETTINGS:
+        configuration.get(section, {}).pop(setting, None)
+    content = json.dumps({'specification': spec_dict,
+                          'draw': draw,
+                          'version': __version__},
+                         sort_keys=True, default=str)
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+def write_atomic(path, content, mode='wb'):
+    """
+    Write the content of a file, such that the file is either replaced in its
+    entirety or not at all.
+
+    :param path: The file path.
+    :param content: The file content.
+    :param mode: The mode in which to open the file.
+    """
+    tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+    with open(tmp_path, mode) as f:
+        f.write(content)
+    os.replace(tmp_path, str(path))
+
+
+class ResultCache:
+    """
+    A local directory that stores the outputs of completed simulations, so
+    that they can be reused instead of re-running the simulations.
+
+    Each simulation is identified by a hash of its resolved model
+    specification, its draw number and the package version (see
+    :func:`hash_specification`). The cache also records a hash of each
+    artifact table that the simulation loaded, and the outputs are only
+    reused if these tables have not changed.
+
+    The artifact hashes that a cache has calculated (or loaded) are retained
+    when the cache is sent to another process, so they can be calculated
+    once, before the worker processes are started.
+
+    :param cache_dir: The cache directory, which is created if it does not
+        exist.
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = Path(cache_dir)
+        self.jobs_dir = self.cache_dir / 'jobs'
+        self.artifacts_dir = self.cache_dir / 'artifacts'
+        self._artifact_hashes = {}
+
+    def entry_dir(self, job_key):
+        """Return the directory that contains a cached simulation."""
+        return self.jobs_dir / job_key[:2] / job_key
+
+    def artifact_hashes(self, artifact_path):
+        """
+        Return a hash of the content of each table in an artifact. These are
+        calculated once for each version of the artifact and are stored in
+        the cache directory.
+
+        :param artifact_path: The path to the artifact file.
+        """
+        artifact_path = str(artifact_path)
+        stat = os.stat(artifact_path)
+        version = '{}-{}-{}'.format(
+            hashlib.sha256(artifact_path.encode('utf-8')).hexdigest()[:16],
+            stat.st_size, stat.st_mtime_ns)
+        if version in self._artifact_hashes:
+            return self._artifact_hashes[version]
+
+        hash_file = self.artifacts_dir / '{}.json'.format(version)
+        if hash_file.exists():
+            with hash_file.open() as f:
+                hashes = json.load(f)
+        else:
+            hashes = {}
+            artifact = Artifact(artifact_path)
+            for entity_key in artifact.keys:
+                data = compact_artifact.load_entity(artifact, entity_key)
+                hashes[entity_key] = hash_data(data)
+                artifact.clear_cache()
+            self.artifacts_dir.mkdir(parents=True, exist_ok=True)
+            write_atomic(hash_file, json.dumps(hashes, indent=2), mode='w')
+        self._artifact_hashes[version] = hashes
+        return hashes
+
+    def get(self, job_key, artifact_path=None):
+        """
+        Return the cached outputs of a simulation, or ``None`` if the
+        simulation is not in the cache, or if any of the artifact tables that
+        it loaded have changed.
+
+        :param job_key: The simulation hash.
+        :param artifact_path: The path to the artifact file.
+        """
+        entry_dir = self.entry_dir(job_key)
+        manifest_file = entry_dir / MANIFEST_FILE
+        if not manifest_file.exists():
+            return None
+        with manifest_file.open() as f:
+            manifest = json.load(f)
+
+        loaded = manifest['artifact_keys']
+        if loaded:
+            if artifact_path is None:
+                return None
+            current = self.artifact_hashes(artifact_path)
+            if any(current.get(key) != value for key, value in loaded.items()):
+                return None
+
+        with (entry_dir / RESULTS_FILE).open('rb') as f:
+            return pickle.load(f)
+
+    def put(self, job_key, spec_file, draw, results, artifact_path=None,
+            loaded_keys=()):
+        """
+        Store the outputs of a completed simulation.
+
+        :param job_key: The simulation hash.
+        :param spec_file: The model specification file.
+        :param draw: The draw number.
+        :param results: A dictionary that maps observer output suffixes to
+            the recorded tables.
+        :param artifact_path: The path to the artifact file.
+        :param loaded_keys: The artifact keys that the simulation loaded.
+        """
+        if loaded_keys and artifact_path is not None:
+            hashes = self.artifact_hashes(artifact_path)
+            loaded = {key: hashes.get(key) for key in sorted(loaded_keys)}
+        else:
+            loaded = {}
+        manifest = {'spec': Path(spec_file).name,
+                    'draw': draw,
+                    'version': __version__,
+                    'artifact_keys': loaded}
+
+        entry_dir = self.entry_dir(job_key)
+        entry_dir.mkdir(parents=True, exist_ok=True)
+        # NOTE: the manifest is written last, so that it is only present if
+        # the outputs have been written in their entirety.
+        write_atomic(entry_dir / RESULTS_FILE,
+                     pickle.dumps(results, protocol=pickle.HIGHEST_PROTOCOL))
+        write_atomic(entry_dir / MANIFEST_FILE,
+                     json.dumps(manifest, indent=2), mode='w')
+
+    def invalidate(self, spec_files=None):
+        """
+        Remove cached simulations.
+
+        :param spec_files: The model specification files whose simulations
+            should be removed; if this is ``None``, every simulation and
+            artifact hash is removed.
+        :returns: The number of simulations that were removed.
+        """
+        logger = logging.getLogger(__name__)
+        if not self.jobs_dir.exists():
+            return 0
+
+        if spec_files is None:
+            names = None
+        else:
+            names = set(Path(spec_file).name for spec_file in spec_files)
+
+        removed = 0
+        for manifest_file in self.jobs_dir.glob('*/*/' + MANIFEST_FILE):
+            if names is not None:
+                with manifest_file.open() as f:
+                    if json.load(f)['spec'] not in names:
+                        continue
+            shutil.rmtree(str(manifest_file.parent), ignore_errors=True)
+            removed += 1
+        if names is None:
+            shutil.rmtree(str(self.artifacts_dir), ignore_errors=True)
+        logger.info('Removed {} cached simulations from {}'.format(
+            removed, self.cache_dir))
+        return removed
+
+
+def get_result_cache(cache_dir):
+    """
+    Return the :class:`ResultCache` for a cache directory, or the cache
+    itself if ``cache_dir`` is already a :class:`ResultCache`.
+
+    :param cache_dir: The cache directory, a :class:`ResultCache` or
+        ``None``.
+    :returns: The cache, or ``None`` if ``cache_dir`` is ``None``.
+    """
+    if cache_dir is None or isinstance(cache_dir, ResultCache):
+        return cache_dir
+    return ResultCache(cache_dir)
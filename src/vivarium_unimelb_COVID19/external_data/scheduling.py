@@ -0,0 +1,289 @@
+"""Predict the cost of each simulation, and schedule simulations accordingly."""
+
+import datetime
+import heapq
+import json
+import os
+import socket
+from pathlib import Path
+
+import pandas as pd
+
+from vivarium_unimelb_COVID19.__about__ import __version__
+
+try:
+    import resource
+except ImportError:
+    # NOTE: the resource module is not available on Windows.
+    resource = None
+
+
+#The timings file written by simulate_all_models.py, which seeds the history.
+TIMINGS_FILE = 'model_timings.csv'
+
+#The timings recorded for each simulation, as per TIMINGS_FILE (in minutes).
+TIMING_COLUMNS = ['total', 'setup', 'initialise', 'run', 'finalise']
+
+#The predicted duration (in minutes) of a simulation with no recorded timings.
+DEFAULT_MINUTES = 1.0
+
+#The telemetry columns that are summarised for each model specification.
+SUMMARY_COLUMNS = TIMING_COLUMNS + ['artifact_load', 'steps_per_second',
+                                    'memory_mb', 'output_bytes']
+
+
+def read_timings_file(timings_file):
+    """
+    Read the simulation timings written by ``simulate_all_models.py``.
+
+    :param timings_file: The timings (CSV) file.
+    :returns: A list of timing records, one for each model specification.
+    """
+    df = pd.read_csv(timings_file, skipinitialspace=True)
+    df.columns = ['spec'] + TIMING_COLUMNS
+    return df.to_dict('records')
+
+
+def record_timing(history_file, spec_file, draw, timings, memory_mb=None,
+                  telemetry=None):
+    """
+    Append the timings of a completed simulation to a history file, which
+    contains one JSON record per line. This may be called by many processes
+    at once; each record is written in a single append.
+
+    Each record also identifies the worker (host and process ID) and the
+    package version, so that records from different machines and releases
+    can be compared.
+
+    :param history_file: The history file.
+    :param spec_file: The model specification file.
+    :param draw: The draw number.
+    :param timings: A dictionary that maps each of ``TIMING_COLUMNS`` to the
+        time taken, in minutes.
+    :param memory_mb: The peak memory used by the simulation process, in
+        megabytes.
+    :param telemetry: An optional dictionary of additional measurements (see
+        :func:`job_telemetry`).
+    """
+    record = {'spec': Path(spec_file).name, 'draw': draw}
+    record.update(timings)
+    if memory_mb is not None:
+        record['memory_mb'] = memory_mb
+    if telemetry is not None:
+        record.update(telemetry)
+    record.update({'host': socket.gethostname(),
+                   'pid': os.getpid(),
+                   'version': __version__,
+                   'finished': datetime.datetime.now().isoformat()})
+    line = json.dumps(record) + '\n'
+    with open(history_file, 'a') as f:
+        f.write(line)
+
+
+def job_telemetry(steps, run_seconds, artifact_load_seconds=None,
+                  output_bytes=None):
+    """
+    Return the additional measurements of a completed simulation that are
+    recorded in the history file.
+
+    :param steps: The number of time-steps that were simulated.
+    :param run_seconds: The time taken to simulate these time-steps, in
+        seconds.
+    :param artifact_load_seconds: The time spent loading artifact data, in
+        seconds, if known.
+    :param output_bytes: The total size of the output files, in bytes.
+    """
+    telemetry = {'steps': steps}
+    if run_seconds > 0:
+        telemetry['steps_per_second'] = steps / run_seconds
+    if artifact_load_seconds is not None:
+        telemetry['artifact_load'] = artifact_load_seconds / 60
+    if output_bytes is not None:
+        telemetry['output_bytes'] = output_bytes
+    return telemetry
+
+
+def peak_memory_mb():
+    """
+    Return the peak memory (resident set size) of this process, in
+    megabytes, or ``None`` if this cannot be determined.
+    """
+    if resource is None:
+        return None
+    # NOTE: ru_maxrss is measured in kilobytes on Linux.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class TimingHistory:
+    """
+    The recorded timings (and memory use) of completed simulations, which
+    are used to predict the cost of future simulations.
+
+    Simulations are identified by the name of their model specification file,
+    so that a prediction is the mean of all recorded simulations for that
+    file. Files without any recorded simulations are predicted from files of
+    the same kind (BAU or intervention); where there are no such files, the
+    mean of all recorded simulations is used.
+
+    :param history_file: The history file, which contains one JSON record
+        per line (see :func:`record_timing`); it need not exist.
+    :param timings_file: An optional timings file written by
+        ``simulate_all_models.py``, whose timings seed the history.
+    """
+
+    def __init__(self, history_file=None, timings_file=None):
+        self.history_file = history_file
+        records = []
+        if timings_file is not None and os.path.exists(timings_file):
+            records.extend(read_timings_file(timings_file))
+        if history_file is not None and os.path.exists(history_file):
+            with open(history_file) as f:
+                for line in f:
+                    line = line.strip()
+                    if line:
+                        records.append(json.loads(line))
+        self.records = records
+
+    def _matching(self, spec_file, column):
+        name = Path(spec_file).name
+        values = [r[column] for r in self.records
+                  if r.get(column) is not None]
+        exact = [r[column] for r in self.records
+                 if r['spec'] == name and r.get(column) is not None]
+        if exact:
+            return exact
+        is_bau = is_bau_spec(name)
+        similar = [r[column] for r in self.records
+                   if is_bau_spec(r['spec']) == is_bau
+                   and r.get(column) is not None]
+        if similar:
+            return similar
+        return values
+
+    def predict_minutes(self, spec_file):
+        """
+        Predict the time taken by a single simulation, in minutes.
+
+        :param spec_file: The model specification file.
+        """
+        values = self._matching(spec_file, 'total')
+        if not values:
+            return DEFAULT_MINUTES
+        return sum(values) / len(values)
+
+    def predict_memory_mb(self, spec_file):
+        """
+        Predict the peak memory used by a simulation process, in megabytes,
+        or return ``None`` if no memory use has been recorded.
+
+        :param spec_file: The model specification file.
+        """
+        values = self._matching(spec_file, 'memory_mb')
+        if not values:
+            return None
+        return max(values)
+
+    def order(self, spec_files):
+        """
+        Return the model specification files in order of decreasing
+        predicted cost, so that the longest simulations are started first.
+        Files with equal predicted costs retain their original order.
+
+        :param spec_files: The model specification files.
+        """
+        return sorted(spec_files, key=self.predict_minutes, reverse=True)
+
+
+def is_bau_spec(spec_name):
+    """
+    Return whether a model specification is a business-as-usual (BAU)
+    simulation, based on its file name.
+
+    :param spec_name: The model specification file name.
+    """
+    return Path(spec_name).stem.endswith('_BAU')
+
+
+def estimate_wall_time(costs, num_procs):
+    """
+    Estimate the time taken to run a number of jobs in parallel, when each
+    job is started (in the given order) as soon as a process is available.
+
+    :param costs: The predicted cost of each job, in the order that they are
+        started.
+    :param num_procs: The number of processes.
+    """
+    finish_times = [0.0] * max(1, min(num_procs, len(costs)))
+    for cost in costs:
+        start = heapq.heappop(finish_times)
+        heapq.heappush(finish_times, start + cost)
+    return max(finish_times)
+
+
+def plan_batch(spec_files, num_jobs, num_procs, history):
+    """
+    Predict the cost of running a number of model simulations.
+
+    :param spec_files: A list of model specification files.
+    :param num_jobs: The number of simulations (draws) for each model
+        specification.
+    :param num_procs: The number of processes.
+    :param history: The :class:`TimingHistory`.
+    :returns: A tuple ``(table, wall_minutes, peak_memory_mb)``, where
+        ``table`` lists the predicted cost of each model specification in the
+        order that they will be run, and ``peak_memory_mb`` is ``None`` if
+        memory use has not been recorded.
+    """
+    ordered = history.order(spec_files)
+    rows = []
+    costs = []
+    for spec_file in ordered:
+        minutes = history.predict_minutes(spec_file)
+        rows.append({'spec': spec_file,
+                     'jobs': num_jobs,
+                     'minutes_per_job': minutes,
+                     'memory_mb': history.predict_memory_mb(spec_file)})
+        costs.extend([minutes] * num_jobs)
+    table = pd.DataFrame(rows, columns=['spec', 'jobs', 'minutes_per_job',
+                                        'memory_mb'])
+
+    wall_minutes = estimate_wall_time(costs, num_procs)
+    memory = [mb for mb in table['memory_mb'] if pd.notnull(mb)]
+    if memory:
+        num_workers = max(1, min(num_procs, len(costs)))
+        peak_memory_mb = num_workers * max(memory)
+    else:
+        peak_memory_mb = None
+    return table, wall_minutes, peak_memory_mb
+
+
+def summarise_history(history_file):
+    """
+    Summarise the telemetry recorded in a history file, for each model
+    specification and package version.
+
+    :param history_file: The history file (see :func:`record_timing`).
+    :returns: A table that contains the number of jobs, the number of
+        distinct workers, and the mean and maximum of each of
+        ``SUMMARY_COLUMNS``.
+    """
+    history = TimingHistory(history_file)
+    df = pd.DataFrame(history.records)
+    if df.empty:
+        return pd.DataFrame()
+    if 'version' not in df.columns:
+        df['version'] = None
+    df['version'] = df['version'].fillna('unknown')
+    if 'host' in df.columns:
+        df['worker'] = df['host'].astype(str) + ':' + df['pid'].astype(str)
+    else:
+        df['worker'] = 'unknown'
+
+    columns = [c for c in SUMMARY_COLUMNS if c in df.columns]
+    groups = df.groupby(['spec', 'version'])
+    summary = groups[columns].agg(['mean', 'max'])
+    summary.columns = ['{}_{}'.format(column, stat)
+                       for (column, stat) in summary.columns]
+    summary.insert(0, 'workers', groups['worker'].nunique())
+    summary.insert(0, 'jobs', groups.size())
+    return summary.reset_index()
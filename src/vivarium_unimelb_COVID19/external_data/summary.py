@@ -0,0 +1,318 @@
+"""Summarise simulation outputs across draws, as each draw completes."""
+
+import logging
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import vivarium.framework.configuration as config
+
+
+#The quantiles reported for each summarised measure.
+QUANTILES = [0.025, 0.5, 0.975]
+
+#The number of values per cell retained at each level of a quantile sketch.
+SKETCH_CAPACITY = 256
+
+
+def summarise_draw(table):
+    """
+    Sum the morbidity and mortality outputs of a single draw over all cohorts
+    at each date, as per ``results/postprocess.py``.
+
+    :param table: The table recorded by the morbidity and mortality observer.
+    :returns: A table indexed by date, with one column per measure.
+    """
+    df = table.drop(columns=['year_of_birth', 'step', 'age', 'sex'],
+                    errors='ignore')
+    return df.groupby('date').sum()
+
+
+class QuantileSketch:
+    """
+    A mergeable sketch that estimates quantiles for many cells at once, using
+    memory that grows only logarithmically with the number of values.
+
+    Each level holds up to ``capacity`` values per cell; a value at level
+    ``i`` represents ``2 ** i`` of the original values. When a level is
+    full, its values are sorted and every second value is promoted to the
+    next level, except for the smallest and largest values, which remain at
+    that level so that the tails are summarised accurately. Quantiles are
+    exact until more than ``capacity`` values have been added.
+
+    :param num_cells: The number of cells (i.e., independent quantities).
+    :param capacity: The number of values per cell retained at each level;
+        this must be an even number.
+    """
+
+    def __init__(self, num_cells, capacity=SKETCH_CAPACITY):
+        if capacity < 2 or capacity % 2 != 0:
+            raise ValueError('Invalid sketch capacity: {}'.format(capacity))
+        self.num_cells = num_cells
+        self.capacity = capacity
+        self.levels = []
+        self._offsets = []
+
+    def add(self, values):
+        """
+        Add a single value for each cell.
+
+        :param values: An array of shape ``(num_cells, )``.
+        """
+        values = np.asarray(values, dtype=float).reshape(1, self.num_cells)
+        self._push(0, values)
+
+    def merge(self, other):
+        """
+        Merge the values summarised by another sketch into this sketch.
+
+        :param other: A sketch with the same number of cells and capacity.
+        """
+        if other.num_cells != self.num_cells:
+            raise ValueError('Cannot merge sketches with different cells')
+        if other.capacity != self.capacity:
+            raise ValueError('Cannot merge sketches with different capacity')
+        for level, values in enumerate(other.levels):
+            self._push(level, values)
+
+    def _push(self, level, values):
+        while len(self.levels) <= level:
+            self.levels.append(np.empty((0, self.num_cells)))
+            self._offsets.append(0)
+        self.levels[level] = np.concatenate([self.levels[level], values])
+        if len(self.levels[level]) >= self.capacity:
+            self._compact(level)
+
+    def _compact(self, level):
+        values = np.sort(self.levels[level], axis=0)
+        # Retain the smallest and largest values at this level, so that the
+        # tails of the distribution are summarised accurately, and only
+        # compact the values in between (an even number of values).
+        tail = self.capacity // 4
+        middle = values[tail:len(values) - tail]
+        extra = len(middle) % 2
+        self.levels[level] = np.concatenate([values[:tail + extra],
+                                             values[len(values) - tail:]])
+        # Alternate between promoting the odd and even values, to avoid
+        # biasing the estimates.
+        offset = self._offsets[level]
+        self._offsets[level] = 1 - offset
+        self._push(level + 1, middle[extra + offset::2])
+
+    def count(self):
+        """Return the (weighted) number of values in each cell."""
+        return sum(len(values) * 2 ** level
+                   for level, values in enumerate(self.levels))
+
+    def quantiles(self, qs):
+        """
+        Estimate quantiles for each cell.
+
+        :param qs: The quantiles to estimate, between 0 and 1.
+        :returns: An array of shape ``(len(qs), num_cells)``.
+        """
+        values = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(values), 2.0 ** level)
+                                  for level, values in enumerate(self.levels)])
+        order = np.argsort(values, axis=0)
+        values = np.take_along_axis(values, order, axis=0)
+        cum_weights = np.cumsum(weights[order], axis=0)
+        total = cum_weights[-1]
+        cells = np.arange(self.num_cells)
+        estimates = []
+        for q in qs:
+            ix = np.sum(cum_weights < q * total, axis=0)
+            ix = np.minimum(ix, len(values) - 1)
+            estimates.append(values[ix, cells])
+        return np.array(estimates)
+
+
+class DrawSummary:
+    """
+    Running summary statistics for a single model specification: the mean,
+    standard deviation and quantiles of each measure at each date, across all
+    of the draws received so far.
+
+    :param country: The population being simulated.
+    :param scenario: The simulated scenario.
+    :param capacity: The capacity of the quantile sketch.
+    """
+
+    def __init__(self, country, scenario, capacity=SKETCH_CAPACITY):
+        self.country = country
+        self.scenario = scenario
+        self.capacity = capacity
+        self.draws = 0
+        self.index = None
+        self.columns = None
+        self.mean = None
+        self._sum_sq = None
+        self.sketch = None
+
+    def update(self, table):
+        """
+        Add the outputs of a single draw to the summary.
+
+        :param table: The table recorded by the morbidity and mortality
+            observer.
+        """
+        df = summarise_draw(table)
+        if self.index is None:
+            self.index = df.index
+            self.columns = df.columns
+            num_cells = len(df.index) * len(df.columns)
+            self.mean = np.zeros(num_cells)
+            self._sum_sq = np.zeros(num_cells)
+            self.sketch = QuantileSketch(num_cells, self.capacity)
+        values = df.reindex(index=self.index, columns=self.columns)
+        values = values.values.ravel()
+
+        # Update the mean and variance with Welford's algorithm.
+        self.draws += 1
+        delta = values - self.mean
+        self.mean += delta / self.draws
+        self._sum_sq += delta * (values - self.mean)
+        self.sketch.add(values)
+
+    def merge(self, other):
+        """
+        Merge the draws summarised by another summary (e.g., one maintained
+        by a different process) into this summary.
+
+        :param other: A summary for the same model specification.
+        """
+        if other.draws == 0:
+            return
+        if self.draws == 0:
+            self.index = other.index
+            self.columns = other.columns
+            self.draws = other.draws
+            self.mean = other.mean.copy()
+            self._sum_sq = other._sum_sq.copy()
+            self.sketch = QuantileSketch(len(other.mean), self.capacity)
+            self.sketch.merge(other.sketch)
+            return
+        if not (self.index.equals(other.index)
+                and self.columns.equals(other.columns)):
+            raise ValueError('Cannot merge summaries with different outputs')
+
+        # Combine the means and variances as per Chan et al. (1979).
+        draws = self.draws + other.draws
+        delta = other.mean - self.mean
+        self.mean += delta * other.draws / draws
+        self._sum_sq += (other._sum_sq
+                         + delta ** 2 * self.draws * other.draws / draws)
+        self.draws = draws
+        self.sketch.merge(other.sketch)
+
+    def to_frame(self, qs=None):
+        """
+        Return the summary statistics as a table, with one row for each date
+        and measure.
+
+        :param qs: The quantiles to report (default: ``QUANTILES``).
+        """
+        if qs is None:
+            qs = QUANTILES
+        if self.draws == 0:
+            return pd.DataFrame()
+
+        dates = np.repeat(self.index.values, len(self.columns))
+        measures = np.tile(self.columns.values, len(self.index))
+        df = pd.DataFrame({'country': self.country,
+                           'scenario': self.scenario,
+                           'date': dates,
+                           'measure': measures,
+                           'draws': self.draws,
+                           'mean': self.mean})
+        if self.draws > 1:
+            df['sd'] = np.sqrt(self._sum_sq / (self.draws - 1))
+        else:
+            df['sd'] = np.nan
+        for q, values in zip(qs, self.sketch.quantiles(qs)):
+            df['p{:g}'.format(100 * q)] = values
+        return df
+
+
+class SummaryAggregator:
+    """
+    Maintain running summary statistics for each model specification, fed by
+    the results of :func:`~.parallel.run_many` as each draw completes, and
+    publish interim summaries to a CSV file.
+
+    :param output_file: The CSV file to which the summaries are published.
+    :param publish_every: Publish the summaries after this many draws have
+        been received (in addition to publishing when :meth:`publish` is
+        called); set to ``0`` to only publish explicitly.
+    :param observer_suffix: The output suffix of the morbidity and mortality
+        observer.
+    :param capacity: The capacity of the quantile sketches.
+    """
+
+    def __init__(self, output_file, publish_every=0, observer_suffix='mm',
+                 capacity=SKETCH_CAPACITY):
+        self.output_file = Path(output_file)
+        self.publish_every = publish_every
+        self.observer_suffix = observer_suffix
+        self.capacity = capacity
+        self.summaries = {}
+        self._received = 0
+
+    def on_result(self, args, results):
+        """
+        Add the outputs of a completed simulation, as passed to the
+        ``on_result`` argument of :func:`~.parallel.run_many`.
+        """
+        spec_file = args[0]
+        if not results or self.observer_suffix not in results:
+            return
+        if spec_file not in self.summaries:
+            country, scenario = get_country_and_scenario(spec_file)
+            self.summaries[spec_file] = DrawSummary(country, scenario,
+                                                    self.capacity)
+        self.summaries[spec_file].update(results[self.observer_suffix])
+
+        self._received += 1
+        if self.publish_every and self._received % self.publish_every == 0:
+            self.publish()
+
+    def to_frame(self):
+        """Return the summary statistics for every model specification."""
+        tables = [summary.to_frame() for summary in self.summaries.values()]
+        if not tables:
+            return pd.DataFrame()
+        return pd.concat(tables, ignore_index=True)
+
+    def publish(self):
+        """
+        Write the current summary statistics to the output file. The file is
+        replaced atomically, so that it can be read at any time.
+        """
+        logger = logging.getLogger(__name__)
+        df = self.to_frame()
+        out_folder = self.output_file.parent
+        out_folder.mkdir(parents=True, exist_ok=True)
+        tmp_file = out_folder / '.{}.tmp'.format(self.output_file.name)
+        df.to_csv(tmp_file, index=False)
+        os.replace(str(tmp_file), str(self.output_file))
+        logger.info('Published summary of {} draws to {}'.format(
+            self._received, self.output_file))
+
+
+def get_country_and_scenario(spec_file):
+    """
+    Return the population and scenario of a model specification; the
+    population is identified by the artifact file name, and specifications
+    that do not define a scenario are business-as-usual (BAU) simulations.
+
+    :param spec_file: The YAML model specification file.
+    """
+    spec = config.build_model_specification(spec_file)
+    configuration = spec.configuration
+    country = Path(configuration.input_data.artifact_path).stem
+    if 'scenario' in configuration:
+        scenario = configuration.scenario
+    else:
+        scenario = 'BAU'
+    return country, scenario
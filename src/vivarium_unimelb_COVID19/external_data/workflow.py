@@ -0,0 +1,351 @@
+"""
+Run the entire workflow (artifacts, model specifications, simulations and
+summaries) as a dependency graph, so that each step starts as soon as its
+inputs are ready.
+"""
+
+import datetime
+import logging
+import multiprocessing
+import queue
+import signal
+import traceback
+from pathlib import Path
+
+from vivarium_unimelb_COVID19.external_data.artifact import (
+    POPULATIONS, BASE_VARIANT, RANDOM_SEED, assemble_artifact, get_stale_jobs,
+    get_variant_scenarios)
+from vivarium_unimelb_COVID19.external_data.build_simulation_files import (
+    create_population_specifications)
+from vivarium_unimelb_COVID19.external_data.parallel import (
+    get_artifact_path, get_draw_numbers, run_nth_draw)
+from vivarium_unimelb_COVID19.external_data.result_cache import ResultCache
+from vivarium_unimelb_COVID19.external_data.scheduling import (
+    TIMINGS_FILE, TimingHistory)
+from vivarium_unimelb_COVID19.external_data.summary import SummaryAggregator
+
+
+class TaskGraph:
+    """
+    A set of tasks, each of which may depend on other tasks, that are run by
+    a pool of worker processes. Each task is started as soon as all of the
+    tasks that it depends on have completed; tasks that are ready at the same
+    time are started in the order that they were added.
+
+    If a task fails, or its ``on_done`` function raises an exception, the
+    tasks that depend on it (directly or indirectly) are not run.
+    """
+
+    def __init__(self):
+        self.tasks = {}
+
+    def add(self, name, func, args=(), depends_on=(), on_done=None):
+        """
+        Add a task to the graph.
+
+        :param name: The (unique) task name.
+        :param func: The function that performs the task, which must be
+            picklable.
+        :param args: The arguments that are passed to ``func``.
+        :param depends_on: The names of the tasks that must complete before
+            this task is started.
+        :param on_done: An optional function that is called in the main
+            process as ``on_done(args, value)`` when the task completes, where
+            ``value`` is the value returned by ``func(*args)``.
+        """
+        if name in self.tasks:
+            raise ValueError('Duplicate task: {}'.format(name))
+        for dependency in depends_on:
+            if dependency not in self.tasks:
+                raise ValueError('Unknown task: {}'.format(dependency))
+        self.tasks[name] = {'func': func, 'args': tuple(args),
+                            'depends_on': set(depends_on),
+                            'on_done': on_done}
+
+    def run(self, num_procs, context=None):
+        """
+        Run every task, using up to ``num_procs`` worker processes.
+
+        :param num_procs: The number of worker processes.
+        :param context: The ``multiprocessing`` context used to start the
+            worker processes.
+        :returns: A list of the tasks that failed or were not run.
+        """
+        logger = logging.getLogger(__name__)
+        if context is None:
+            context = multiprocessing.get_context()
+        job_q = context.Queue()
+        result_q = context.Queue()
+
+        waiting = {name: set(task['depends_on'])
+                   for (name, task) in self.tasks.items()}
+        dependents = {name: [] for name in self.tasks}
+        for name, task in self.tasks.items():
+            for dependency in task['depends_on']:
+                dependents[dependency].append(name)
+        failed = []
+        running = set()
+        finished = False
+
+        def start_ready():
+            for name in list(waiting.keys()):
+                if not waiting[name]:
+                    del waiting[name]
+                    task = self.tasks[name]
+                    job_q.put((name, task['func'], task['args']))
+                    running.add(name)
+
+        def skip_dependents(name):
+            for dependent in dependents[name]:
+                if dependent in waiting:
+                    del waiting[dependent]
+                    failed.append(dependent)
+                    skip_dependents(dependent)
+
+        num_workers = max(1, min(num_procs, len(self.tasks)))
+        workers = []
+        logger.info('Spawning {} workers for {} tasks'.format(
+            num_workers, len(self.tasks)))
+        try:
+            start_ready()
+            for _ in range(num_workers):
+                proc = context.Process(target=run_tasks,
+                                       args=[job_q, result_q])
+                workers.append(proc)
+                proc.start()
+
+            while running:
+                try:
+                    name, value, error = result_q.get(timeout=0.5)
+                except queue.Empty:
+                    if not any(worker.is_alive() for worker in workers):
+                        logger.error('All workers have stopped')
+                        break
+                    continue
+                running.discard(name)
+                task = self.tasks[name]
+                if error is None and task['on_done'] is not None:
+                    try:
+                        task['on_done'](task['args'], value)
+                    except Exception:
+                        error = traceback.format_exc()
+                if error is not None:
+                    logger.error('Task {} failed:\n{}'.format(name, error))
+                    failed.append(name)
+                    skip_dependents(name)
+                    continue
+                for dependent in dependents[name]:
+                    if dependent in waiting:
+                        waiting[dependent].discard(name)
+                start_ready()
+            finished = True
+        except KeyboardInterrupt:
+            logger.info("Received CTRL-C, terminating {} workers".format(
+                len(workers)))
+        finally:
+            if finished:
+                # Tell each worker to stop, once the queue is empty.
+                for _ in workers:
+                    job_q.put(None)
+            else:
+                # Force each worker to terminate, since nothing will receive
+                # the results of the tasks that they are running, and a
+                # worker cannot exit until its results have been received.
+                for worker in workers:
+                    worker.terminate()
+            for worker in workers:
+                worker.join()
+
+        failed.extend(sorted(running))
+        failed.extend(sorted(waiting.keys()))
+        return failed
+
+
+def run_tasks(job_q, result_q):
+    """
+    Perform tasks in a worker process until it receives ``None``.
+
+    :param job_q: The queue of ``(name, func, args)`` tasks.
+    :param result_q: The queue on which to put ``(name, value, error)``
+        tuples, where ``error`` is ``None`` if the task completed.
+    """
+    # Ignore the signal that raises KeyboardInterrupt exceptions; the main
+    # loop will handle this exception and ensure each process terminates.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    while True:
+        job = job_q.get()
+        if job is None:
+            break
+        name, func, args = job
+        try:
+            value = func(*args)
+        except Exception:
+            result_q.put((name, None, traceback.format_exc()))
+        else:
+            result_q.put((name, value, None))
+
+
+def get_artifact_file(artifact_dir, population):
+    """Return the artifact file for a population."""
+    return Path(artifact_dir) / '{}.hdf'.format(population)
+
+
+def artifact_is_current(artifact_dir, population, layout='generic',
+                        variants=(BASE_VARIANT,), num_draws=None):
+    """
+    Return whether every table in a population's artifact (for the given
+    variants of the epidemic input data) was built from the current inputs,
+    with the given number of draws and in the given layout (see
+    :func:`~.artifact.get_stale_jobs`).
+    """
+    artifact_file = get_artifact_file(artifact_dir, population)
+    return not get_stale_jobs(artifact_file, population, layout=layout,
+                              variants=variants, num_draws=num_draws)
+
+
+def build_artifact(population, num_draws, artifact_dir, seed=RANDOM_SEED,
+                   rebuild=False, layout='generic', variants=(BASE_VARIANT,),
+                   chunk_draws=None):
+    """
+    Build the tables in a population's artifact whose inputs have changed,
+    or every table if ``rebuild`` is ``True``, calculating ``chunk_draws``
+    draws of each table at once.
+
+    :returns: The artifact file.
+    """
+    assemble_artifact(population, num_draws, Path(artifact_dir), seed,
+                      rebuild, layout, variants, chunk_draws)
+    return str(get_artifact_file(artifact_dir, population))
+
+
+def hash_artifact(cache_dir, artifact_path):
+    """
+    Calculate the hash of each table in an artifact and store these hashes
+    in a result cache (see :meth:`~.result_cache.ResultCache.artifact_hashes`),
+    so that the simulations that use this artifact do not each calculate
+    them.
+
+    :param cache_dir: The cache directory.
+    :param artifact_path: The path to the artifact file.
+    """
+    ResultCache(cache_dir).artifact_hashes(artifact_path)
+
+
+def run_workflow(root_dir, num_draws, num_procs, artifact_draws=None,
+                 populations=POPULATIONS, scenarios=None,
+                 summary_file=None, summary_every=0, history_file=None,
+                 cache_dir=None, rebuild=False, layout='generic',
+                 variants=(BASE_VARIANT,), chunk_draws=None,
+                 timings_file=None):
+    """
+    Build the artifacts and model specifications for each population, run
+    the simulations and summarise their outputs, as a single
+    :class:`TaskGraph`.
+
+    The simulations for each population start as soon as its artifact has
+    been built, and their outputs are summarised as each simulation
+    completes. Only the artifact tables whose inputs have changed are
+    rebuilt (or every table, if ``rebuild`` is ``True``), model
+    specifications are only rewritten if their contents have changed, and
+    simulations whose outputs are in the cache (``cache_dir``) are not run
+    again.
+
+    :param root_dir: The directory that contains the ``artifacts`` and
+        ``model_specifications`` directories, which are created if they do
+        not exist.
+    :param num_draws: The number of draws (not including draw zero) for
+        which to run simulations.
+    :param num_procs: The number of worker processes.
+    :param artifact_draws: The number of draws of each artifact table, or
+        ``None`` for the number of draws defined by each data source module
+        (see :func:`~.artifact.get_table_jobs`).
+    :param populations: The populations to simulate.
+    :param scenarios: The intervention scenarios to simulate (default: the
+        scenarios of each variant).
+    :param summary_file: An optional CSV file to which the summary statistics
+        are published.
+    :param summary_every: Publish interim summaries after this many draws.
+    :param history_file: An optional file in which to record the time taken
+        by each simulation (see :mod:`~.scheduling`).
+    :param cache_dir: An optional directory in which simulation outputs are
+        cached (see :mod:`~.result_cache`).
+    :param rebuild: Whether to rebuild every artifact table of the selected
+        variants.
+    :param layout: The layout in which the artifact tables are stored (see
+        :data:`~.artifact.LAYOUTS`).
+    :param variants: The variants of the epidemic input data whose tables
+        are built (see :data:`~.artifact.VARIANTS`).
+    :param chunk_draws: The number of draws of each artifact table that are
+        calculated at once (see :func:`~.artifact.get_draw_chunks`), or
+        ``None`` to calculate every draw at once.
+    :param timings_file: The timings file written by
+        ``simulate_all_models.py``, which seeds the timing history (default:
+        ``model_timings.csv`` in ``root_dir``).
+    :returns: A list of the tasks that failed or were not run.
+    """
+    logger = logging.getLogger(__name__)
+    root_dir = Path(root_dir).resolve()
+    artifact_dir = root_dir / 'artifacts'
+    spec_dir = root_dir / 'model_specifications'
+    artifact_dir.mkdir(exist_ok=True)
+    spec_dir.mkdir(exist_ok=True)
+    if scenarios is None:
+        scenarios = get_variant_scenarios(variants)
+
+    if summary_file is not None:
+        aggregator = SummaryAggregator(summary_file, summary_every)
+        on_result = aggregator.on_result
+    else:
+        aggregator = None
+        on_result = None
+
+    if timings_file is None:
+        timings_file = root_dir / TIMINGS_FILE
+    history = TimingHistory(history_file, timings_file)
+    graph = TaskGraph()
+    simulations = []
+    for population in populations:
+        # NOTE: the model specifications are small, so we write them in the
+        # main process before any tasks are started.
+        spec_files = create_population_specifications(spec_dir, population,
+                                                      scenarios)
+        depends_on = []
+        if rebuild or not artifact_is_current(artifact_dir, population,
+                                              layout, variants,
+                                              artifact_draws):
+            name = 'artifact:{}'.format(population)
+            graph.add(name, build_artifact,
+                      [population, artifact_draws, str(artifact_dir),
+                       RANDOM_SEED, rebuild, layout, variants, chunk_draws])
+            depends_on.append(name)
+        else:
+            logger.info('Artifact for {} is up to date'.format(population))
+        if cache_dir is not None:
+            name = 'hash:{}'.format(population)
+            graph.add(name, hash_artifact,
+                      [cache_dir, get_artifact_path(spec_files[0])],
+                      depends_on=depends_on)
+            depends_on = [name]
+        for spec_file in spec_files:
+            simulations.append((str(spec_file), depends_on))
+
+    # Start the longest simulations first.
+    order = history.order([spec_file for (spec_file, _) in simulations])
+    depends = dict(simulations)
+    for spec_file in order:
+        for draw in get_draw_numbers(num_draws):
+            name = 'simulate:{}:{}'.format(Path(spec_file).stem, draw)
+            graph.add(name, run_nth_draw,
+                      [spec_file, draw, True, False, None, history_file,
+                       cache_dir],
+                      depends_on=depends[spec_file], on_done=on_result)
+
+    start_time = datetime.datetime.now()
+    failed = graph.run(num_procs)
+    if aggregator is not None:
+        aggregator.publish()
+    logger.info('Completed {} of {} tasks in {}'.format(
+        len(graph.tasks) - len(failed), len(graph.tasks),
+        datetime.datetime.now() - start_time))
+    return failed
@@ -13,6 +13,11 @@ import os
 
 from datetime import datetime
 
+
+RECORD_INTERVALS = ['step', 'month', 'year']
+"""The intervals over which observers can record their outputs."""
+
+
 def output_file(config, suffix, sep='_', ext='csv'):
     """
     Determine the output file name for an observer, based on the prefix
@@ -47,6 +52,141 @@ def output_file(config, suffix, sep='_', ext='csv'):
     return out_file
 
 
+def consolidated_output_file(prefix, suffix, sep='_', ext='csv'):
+    """
+    Determine the name of the file that contains an observer's outputs for
+    all draws, when these are collected into a single file.
+
+    Parameters
+    ----------
+    prefix
+        The observer output prefix (``config.observer.output_prefix``).
+    suffix
+        The observer-specific suffix.
+    sep
+        The separator between prefix and suffix.
+    ext
+        The output file extension.
+
+    """
+    return '{}{}{}{}draws.{}'.format(prefix, sep, suffix, sep, ext)
+
+
+def write_files_enabled(config):
+    """
+    Determine whether observers write their outputs to disk, as defined in
+    the (optional) ``config.observer.write_files`` (default: ``True``).
+    Observers always retain their outputs in their ``results`` attribute, so
+    that they can be collected from the simulation without writing to disk.
+
+    Parameters
+    ----------
+    config
+        The builder configuration object.
+
+    """
+    if 'write_files' in config.observer:
+        return bool(config.observer.write_files)
+    return True
+
+
+def record_policy(config, suffix, columns):
+    """
+    Determine which of an observer's output columns are recorded, and how
+    often, based on the (optional) ``config.observer.record.<suffix>`` block.
+
+    .. code-block:: yaml
+
+       configuration:
+           observer:
+               record:
+                   mm:
+                       columns: [deaths, bau_deaths, HALY, bau_HALY]
+                       interval: year
+
+    Parameters
+    ----------
+    config
+        The builder configuration object.
+    suffix
+        The observer-specific suffix.
+    columns
+        The output columns that the observer is able to record; the key
+        columns (``sex``, ``age``, ``date`` and ``step``) are always recorded.
+
+    Returns
+    -------
+        The recorded output columns and the recording interval, which is one
+        of ``'step'``, ``'month'`` or ``'year'``.
+
+    """
+    key_columns = ['sex', 'age', 'date', 'step']
+    interval = 'step'
+    if 'record' not in config.observer or suffix not in config.observer.record:
+        return columns, interval
+
+    record = config.observer.record[suffix]
+    if 'interval' in record:
+        interval = record.interval
+    if interval not in RECORD_INTERVALS:
+        raise ValueError('Invalid recording interval {} for observer {}'.format(
+            interval, suffix))
+    if 'columns' in record and record.columns is not None:
+        selected = list(record.columns)
+        invalid = [col for col in selected if col not in columns]
+        if invalid:
+            raise ValueError('Invalid columns {} for observer {}'.format(
+                invalid, suffix))
+        columns = [col for col in columns
+                   if col in key_columns or col in selected]
+
+    return columns, interval
+
+
+def aggregate_records(data, interval, flow_columns, initial_columns=()):
+    """
+    Aggregate the per-step records of each cohort over the recording interval.
+
+    Flow quantities (e.g., deaths, person-years and HALYs) are summed over
+    each interval, and the initial quantities (e.g., the population prior to
+    deaths) are taken from the first time-step in each interval. All other
+    quantities (e.g., population size, age and date) are sampled at the last
+    time-step in each interval.
+
+    Parameters
+    ----------
+    data
+        The recorded tables, indexed by cohort.
+    interval
+        The recording interval: ``'step'``, ``'month'`` or ``'year'``.
+    flow_columns
+        The columns that are summed over each interval.
+    initial_columns
+        The columns that are sampled at the start of each interval.
+
+    """
+    if interval == 'step':
+        return data.reset_index(drop=True)
+
+    dates = pd.to_datetime(data['date'])
+    if interval == 'month':
+        period = dates.dt.year * 100 + dates.dt.month
+    else:
+        period = dates.dt.year
+
+    how = {}
+    for col in data.columns:
+        if col in flow_columns:
+            how[col] = 'sum'
+        elif col in initial_columns:
+            how[col] = 'first'
+        else:
+            how[col] = 'last'
+
+    grouped = data.groupby([data.index, period.values], sort=False)
+    return grouped.agg(how).reset_index(drop=True)
+
+
 def output_csv_mkdir(data, path, idx):
     """
     Wrapper for pandas .to_csv() method to create directory for path if it
@@ -71,6 +211,10 @@ class MorbidityMortality:
         The suffix for the CSV file in which to record the
         morbidity and mortality data.
 
+    The recorded columns and the recording interval can be selected in the
+    ``observer.record.<output_suffix>`` configuration block (see
+    :func:`record_policy`).
+
     """
 
     def __init__(self, output_suffix='mm'):
@@ -98,7 +242,7 @@ class MorbidityMortality:
         builder.event.register_listener('simulation_end', self.write_output)
         self.tables = []
         
-        self.output_table_cols = ['sex', 'age', 'date',
+        self.output_table_cols = ['sex', 'age', 'date', 'step',
                                   'population', 'bau_population',
                                   'prev_population', 'bau_prev_population',
                                   'acmr', 'bau_acmr',
@@ -111,11 +255,23 @@ class MorbidityMortality:
                                   'expenditure', 'expenditure_disc',
                                   'bau_expenditure', 'bau_expenditure_disc',
                                   'COVID19_deaths']
-
+        self.flow_cols = ['deaths', 'bau_deaths',
+                          'person_years', 'bau_person_years',
+                          'HALY', 'HALY_disc',
+                          'bau_HALY', 'bau_HALY_disc',
+                          'expenditure', 'expenditure_disc',
+                          'bau_expenditure', 'bau_expenditure_disc',
+                          'COVID19_deaths']
+        self.initial_cols = ['prev_population', 'bau_prev_population']
+
+        self.output_table_cols, self.record_interval = record_policy(
+            builder.configuration, self.output_suffix, self.output_table_cols)
         self.table_cols = self.output_table_cols + ['year']
 
         self.output_file = output_file(builder.configuration,
                                        self.output_suffix)
+        self.write_files = write_files_enabled(builder.configuration)
+        self.results = None
 
         self.years_per_timestep = builder.configuration.time.step_size/365
 
@@ -125,6 +281,9 @@ class MorbidityMortality:
         
         self.discount_factor = 1/(1 + discount_rate)
         self.current_discount_factor = 1
+        # The number of recorded time-steps, so that the undiscounted outputs
+        # can be re-discounted at other rates (see discounting.rediscount).
+        self.step = 0
 
     def on_collect_metrics(self, event):
         pop = self.population_view.get(event.index)
@@ -136,6 +295,8 @@ class MorbidityMortality:
         #pop['month'] = self.clock().month
         #pop['day'] = self.clock().day
         pop['date'] = self.clock().date()
+        self.step += 1
+        pop['step'] = self.step
         # Record the population size prior to the deaths.
         pop['prev_population'] = pop['population'] + pop['deaths']
         pop['bau_prev_population'] = pop['bau_population'] + pop['bau_deaths']
@@ -149,6 +310,36 @@ class MorbidityMortality:
 
         self.tables.append(pop[self.table_cols])
 
+    def get_state(self):
+        """Return the outputs recorded so far, so that another simulation can
+        continue from this point (see :meth:`set_state`)."""
+        return {'tables': list(self.tables), 'step': self.step}
+
+    def set_state(self, state):
+        """Continue from the outputs recorded by another simulation, which may
+        use a different discount rate.
+
+        Parameters
+        ----------
+        state
+            The recorded outputs, as returned by :meth:`get_state`.
+
+        """
+        self.tables = []
+        self.current_discount_factor = 1
+        disc_cols = [('bau_HALY_disc', 'bau_HALY'), ('HALY_disc', 'HALY'),
+                     ('bau_expenditure_disc', 'bau_expenditure'),
+                     ('expenditure_disc', 'expenditure')]
+        for table in state['tables']:
+            # Discount the outputs at this simulation's discount rate.
+            self.current_discount_factor = self.current_discount_factor * self.discount_factor
+            table = table.copy()
+            for disc_col, col in disc_cols:
+                if disc_col in table.columns:
+                    table[disc_col] = table[col] * self.current_discount_factor
+            self.tables.append(table)
+        self.step = state['step']
+
     def calculate_LE(self, table, py_col, denom_col):
         """Calculate the life expectancy for each cohort at each time-step.
 
@@ -180,7 +371,9 @@ class MorbidityMortality:
         return cumsum / table[denom_col]
 
     def write_output(self, event):
-        data = pd.concat(self.tables, ignore_index=True)
+        data = pd.concat(self.tables)
+        data = aggregate_records(data, self.record_interval,
+                                 self.flow_cols, self.initial_cols)
         data['age'] = data['age'].apply(np.floor)
         data['year_of_birth'] = data['year'] - data['age']
         #data['year_of_birth'] = data['year_of_birth'].apply(np.ceil)
@@ -200,7 +393,9 @@ class MorbidityMortality:
         #data['HALE'] = self.calculate_LE(data, 'HALY', 'prev_population')
         #data['bau_HALE'] = self.calculate_LE(data, 'bau_HALY',
         #                                   'bau_prev_population')
-        output_csv_mkdir(data, self.output_file, idx=False)
+        self.results = data
+        if self.write_files:
+            output_csv_mkdir(data, self.output_file, idx=False)
 
 class EpidemicMortality:
     """
@@ -213,6 +408,10 @@ class EpidemicMortality:
         The suffix for the CSV file in which to record the
         morbidity and mortality data.
 
+    The recorded columns and the recording interval can be selected in the
+    ``observer.record.<output_suffix>`` configuration block (see
+    :func:`record_policy`).
+
     """
 
     def __init__(self, name, output_suffix='em'):
@@ -251,11 +450,17 @@ class EpidemicMortality:
                                   f'{self._name}_fatality_risk',
                                   f'{self._name}_deaths',
                                   f'{self._name}_mort_risk']
+        self.flow_cols = ['deaths', 'bau_deaths', f'{self._name}_deaths']
+        self.initial_cols = ['prev_population', 'bau_prev_population']
 
+        self.output_table_cols, self.record_interval = record_policy(
+            builder.configuration, self.output_suffix, self.output_table_cols)
         self.table_cols = self.output_table_cols + ['year']
 
         self.output_file = output_file(builder.configuration,
                                        self.output_suffix)
+        self.write_files = write_files_enabled(builder.configuration)
+        self.results = None
 
     def on_collect_metrics(self, event):
         pop = self.population_view.get(event.index)
@@ -270,8 +475,26 @@ class EpidemicMortality:
         pop['bau_prev_population'] = pop['bau_population'] + pop['bau_deaths']
         self.tables.append(pop[self.table_cols])
 
+    def get_state(self):
+        """Return the outputs recorded so far, so that another simulation can
+        continue from this point (see :meth:`set_state`)."""
+        return {'tables': list(self.tables)}
+
+    def set_state(self, state):
+        """Continue from the outputs recorded by another simulation.
+
+        Parameters
+        ----------
+        state
+            The recorded outputs, as returned by :meth:`get_state`.
+
+        """
+        self.tables = list(state['tables'])
+
     def write_output(self, event):
-        data = pd.concat(self.tables, ignore_index=True)
+        data = pd.concat(self.tables)
+        data = aggregate_records(data, self.record_interval,
+                                 self.flow_cols, self.initial_cols)
         data['age'] = data['age'].apply(np.floor)
         data['year_of_birth'] = data['year'] - data['age']
         #data['year_of_birth'] = data['year_of_birth'].apply(np.ceil)
@@ -284,4 +507,6 @@ class EpidemicMortality:
         cols = ['year_of_birth'] + self.output_table_cols
         data = data[cols]
 
-        output_csv_mkdir(data, self.output_file, idx=False)
\ No newline at end of file
+        self.results = data
+        if self.write_files:
+            output_csv_mkdir(data, self.output_file, idx=False)
\ No newline at end of file
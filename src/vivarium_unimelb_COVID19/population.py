@@ -8,6 +8,7 @@ multi-state lifetable simulations.
 
 """
 import numpy as np
+import pandas as pd
 
 from datetime import date
 
@@ -104,6 +105,11 @@ class Mortality:
     """
     This component reduces the population size of each cohort over time,
     according to the all-cause mortality rate.
+
+    The artifact contains the base mortality rate and the annual percent
+    change (APC) for each stratum, and the mortality rate in each year of the
+    simulation period is projected from these once, when the simulation is
+    set up (see :func:`project_mortality_rate`).
     """
     
     @property
@@ -112,7 +118,7 @@ class Mortality:
 
     def setup(self, builder):
         """Load the all-cause mortality rate."""
-        mortality_data = builder.data.load('cause.all_causes.mortality')
+        mortality_data = load_mortality_rate(builder)
         self.mortality_rate = builder.value.register_rate_producer(
             'mortality_rate', source=builder.lookup.build_table(mortality_data, 
                                                                 key_columns=['sex'], 
@@ -285,3 +291,102 @@ def load_population_data(builder):
     pop_data = pop_data[['age', 'sex', 'value']].rename(columns={'value': 'population'})
     pop_data['bau_population'] = pop_data['population']
     return pop_data
+
+
+def load_mortality_rate(builder):
+    base_acmr = builder.data.load('cause.all_causes.base_mortality')
+    apc = builder.data.load('cause.all_causes.mortality_apc')
+    projection = builder.data.load('cause.all_causes.mortality_projection')
+    return project_mortality_rate(base_acmr, apc, projection)
+
+
+def get_mortality_scale(apc, num_years, apc_years):
+    """
+    Return the scale of the base mortality rate for each stratum (columns)
+    in each year of the projection (rows).
+
+    For the first ``apc_years`` years, each stratum has its own APC:
+    ``scale = e^(APC * (year - year_start))``. After this, each cohort
+    retains the scale of the previous year; this shifts the scales by two
+    strata each year, because there are male and female cohorts (and the
+    youngest two strata retain their scale).
+
+    Parameters
+    ----------
+    apc
+        The APC of each stratum, sorted by age and sex.
+    num_years
+        The number of years in the projection.
+    apc_years
+        The number of years for which the APC applies.
+
+    """
+    offsets = np.arange(num_years)
+
+    # The number of years for which each cohort has been held constant.
+    shifts = np.maximum(offsets - apc_years, 0)
+    # The final APC year for each stratum in each year.
+    final_years = np.minimum(offsets, apc_years)
+    # The stratum whose final APC scale applies in each year.
+    strata = np.arange(len(apc))
+    source = strata[None, :] - 2 * shifts[:, None]
+    source = np.where(source < 2, strata[None, :] % 2, source)
+
+    return np.exp(apc[source] * final_years[:, None])
+
+
+def project_mortality_rate(base_acmr, apc, projection):
+    """
+    Return the mortality rate for each stratum in each year, as projected
+    from the base mortality rate: ``ACMR = BASE_ACMR * e^(APC * (year -
+    year_start))``.
+
+    The first bin applies the base rate for the year prior to the projection
+    (with a scale of one); each subsequent bin applies the projected rate for
+    a single year.
+
+    Parameters
+    ----------
+    base_acmr
+        The base mortality rate for each stratum (``age_start``, ``age_end``
+        and ``sex``), in one or more value columns (e.g., one for each draw).
+    apc
+        The APC for each stratum, in the ``value`` column.
+    projection
+        The first year (``year_start``) and final year (``year_end``) of the
+        projection, and the number of years for which the APC applies
+        (``apc_years``).
+
+    """
+    bin_columns = ['age_start', 'age_end', 'sex']
+    value_columns = [c for c in base_acmr.columns if c not in bin_columns]
+    base_acmr = base_acmr.sort_values(['age_start', 'sex'], kind='mergesort')
+    apc = apc.sort_values(['age_start', 'sex'], kind='mergesort')
+    if not (np.array_equal(base_acmr['age_start'].values,
+                           apc['age_start'].values)
+            and np.array_equal(base_acmr['sex'].values, apc['sex'].values)):
+        raise ValueError('The base mortality rate and APC strata differ')
+
+    year_start = projection['year_start']
+    years = np.arange(year_start, projection['year_end'] + 1)
+    year_starts = np.concatenate(([year_start - 1], years))
+    num_rows = len(base_acmr.index)
+    scale = np.concatenate((
+        np.ones((1, num_rows)),
+        get_mortality_scale(apc['value'].values, len(years),
+                            projection['apc_years'])))
+
+    # Calculate the rates for every year, stratum and value column at once.
+    acmr = base_acmr[value_columns].values[None, :, :] * scale[:, :, None]
+    acmr = acmr.reshape(-1, len(value_columns))
+
+    # NOTE: the rows are sorted by age and sex, so repeating them for each
+    # year preserves the ordering by year, age and sex.
+    df = pd.DataFrame(acmr, columns=value_columns)
+    df.insert(0, 'year_start', np.repeat(year_starts, num_rows))
+    df.insert(1, 'year_end', np.repeat(year_starts + 1, num_rows))
+    for ix, column in enumerate(bin_columns):
+        df.insert(2 + ix, column,
+                  np.tile(base_acmr[column].values, len(year_starts)))
+
+    return df
@@ -0,0 +1,265 @@
+"""
+===============
+Shared Artifact
+===============
+
+This module contains tools for loading each data artifact once, in the main
+process, into shared memory, so that parallel worker processes read every
+table from the same (read-only) memory, rather than each loading a private
+copy of the artifact.
+
+Each artifact is exported to a *segment*: a directory in shared memory
+(``/dev/shm``, where available) that contains one contiguous array of values
+for each table and a small index that records the rows and columns of each
+table. The arrays are stored column-major (i.e., draw-major), so that the
+values of each draw are contiguous. Workers memory-map these arrays and only
+copy the columns that they use (i.e., a single draw).
+
+A segment may also be saved to a persistent directory, as part of a *run
+bundle* for a single model specification (see
+:mod:`~vivarium_unimelb_COVID19.external_data.bundle`).
+
+To use a segment, override the ``data`` plugin and set the segment directory
+in the simulation configuration:
+
+.. code-block:: yaml
+
+   plugins:
+       required:
+           data:
+               controller: vivarium_unimelb_COVID19.shared_artifact.SharedArtifactManager
+               builder_interface: vivarium.framework.artifact.ArtifactInterface
+
+   configuration:
+       input_data:
+           shared_artifact_path: /dev/shm/vivarium_artifact_abcdef
+
+"""
+import logging
+import os
+import pickle
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from vivarium.framework.artifact import Artifact, filter_data
+
+from vivarium_unimelb_COVID19 import compact_artifact
+from vivarium_unimelb_COVID19.artifact_cache import (TimedArtifactManager,
+                                                     select_draw)
+
+
+SHARED_MEMORY_DIR = '/dev/shm'
+"""The directory in which segments are created, if it exists."""
+
+INDEX_FILE = 'index.pickle'
+"""The name of the index file in each segment."""
+
+PLUGIN_CONFIGURATION = {
+    'required': {
+        'data': {
+            'controller': 'vivarium_unimelb_COVID19.shared_artifact.SharedArtifactManager',
+            'builder_interface': 'vivarium.framework.artifact.ArtifactInterface',
+        },
+    },
+}
+"""The plugin configuration that selects the shared artifact manager."""
+
+
+_SEGMENTS = {}
+"""The index of each segment that has been opened by this process."""
+
+
+def export_artifact(artifact_path, segment_path, keys=None):
+    """
+    Load every table in an artifact and save it in a segment.
+
+    Tables whose columns are all numeric are saved as a single contiguous
+    array, with one row for each column of the table; all other data (e.g.,
+    scalar values and tables with text columns) are saved in the index.
+
+    Parameters
+    ----------
+    artifact_path
+        The path to the artifact file.
+    segment_path
+        The segment directory, which must already exist.
+    keys
+        The keys to save (default: every key in the artifact).
+
+    """
+    artifact = Artifact(str(artifact_path))
+    if keys is None:
+        keys = artifact.keys
+    index = {}
+    for number, entity_key in enumerate(keys):
+        data = compact_artifact.load_entity(artifact, entity_key)
+        numeric = (isinstance(data, pd.DataFrame) and len(data.columns) > 0
+                   and all(pd.api.types.is_numeric_dtype(dtype)
+                           for dtype in data.dtypes))
+        if not numeric:
+            index[entity_key] = {'data': data}
+            continue
+        values_file = '{}.npy'.format(number)
+        values = np.ascontiguousarray(data.values.T, dtype=float)
+        np.save(os.path.join(segment_path, values_file), values)
+        index[entity_key] = {'file': values_file,
+                             'index': data.index,
+                             'columns': list(data.columns)}
+        artifact.clear_cache()
+
+    with open(os.path.join(segment_path, INDEX_FILE), 'wb') as f:
+        pickle.dump(index, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def load_table(segment_path, entity_key, draw=None):
+    """
+    Return a table from a segment, copying only the values of the requested
+    draw (and of any columns that are not draws) out of shared memory.
+
+    Parameters
+    ----------
+    segment_path
+        The segment directory.
+    entity_key
+        The key associated with the table.
+    draw
+        The draw number, or ``None`` to copy every draw.
+
+    """
+    if segment_path not in _SEGMENTS:
+        with open(os.path.join(segment_path, INDEX_FILE), 'rb') as f:
+            _SEGMENTS[segment_path] = pickle.load(f)
+    entry = _SEGMENTS[segment_path][entity_key]
+    if 'data' in entry:
+        return entry['data']
+
+    values = np.load(os.path.join(segment_path, entry['file']),
+                     mmap_mode='r')
+    draw_col = None if draw is None else 'draw_{}'.format(draw)
+    columns = {}
+    for ix, column in enumerate(entry['columns']):
+        is_draw = str(column).startswith('draw_')
+        if draw_col is None or not is_draw or column == draw_col:
+            columns[column] = np.array(values[ix])
+    return pd.DataFrame(columns, index=entry['index'],
+                        columns=list(columns.keys()))
+
+
+class SharedArtifactStore:
+    """
+    Export artifacts to shared memory segments in the main process, and
+    remove each segment once no more simulations require it.
+
+    Each artifact is given a reference count: the number of simulations that
+    use it. Call :meth:`release` when each simulation finishes; the segment
+    is removed when its count reaches zero. All remaining segments are
+    removed when the store is closed.
+
+    Use as a context manager:
+
+    .. code-block:: python
+
+       with SharedArtifactStore() as store:
+           segment_path = store.add(artifact_path, num_jobs)
+           ...
+           store.release(artifact_path)
+
+    """
+
+    def __init__(self, directory=None):
+        if directory is None and os.path.isdir(SHARED_MEMORY_DIR):
+            directory = SHARED_MEMORY_DIR
+        self.directory = directory
+        self.segments = {}
+        self.references = {}
+
+    def add(self, artifact_path, references=1):
+        """
+        Export an artifact to a new segment, if it has not already been
+        exported, and return the segment directory.
+
+        Parameters
+        ----------
+        artifact_path
+            The path to the artifact file.
+        references
+            The number of simulations that will use this artifact.
+
+        """
+        artifact_path = str(artifact_path)
+        if artifact_path not in self.segments:
+            logger = logging.getLogger(__name__)
+            segment_path = tempfile.mkdtemp(prefix='vivarium_artifact_',
+                                            dir=self.directory)
+            logger.info('Exporting {} to {}'.format(artifact_path,
+                                                     segment_path))
+            export_artifact(artifact_path, segment_path)
+            self.segments[artifact_path] = segment_path
+            self.references[artifact_path] = 0
+        self.references[artifact_path] += references
+        return self.segments[artifact_path]
+
+    def release(self, artifact_path):
+        """
+        Record that a simulation no longer requires an artifact, and remove
+        its segment if no other simulations require it.
+
+        Parameters
+        ----------
+        artifact_path
+            The path to the artifact file.
+
+        """
+        artifact_path = str(artifact_path)
+        if artifact_path not in self.references:
+            return
+        self.references[artifact_path] -= 1
+        if self.references[artifact_path] <= 0:
+            self._remove(artifact_path)
+
+    def _remove(self, artifact_path):
+        segment_path = self.segments.pop(artifact_path)
+        del self.references[artifact_path]
+        shutil.rmtree(segment_path, ignore_errors=True)
+
+    def close(self):
+        """Remove all of the remaining segments."""
+        for artifact_path in list(self.segments.keys()):
+            self._remove(artifact_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+
+class SharedArtifactManager(TimedArtifactManager):
+    """
+    An artifact manager that reads each table from a shared memory segment
+    (``input_data.shared_artifact_path``), rather than from the artifact.
+    """
+
+    def setup(self, builder):
+        """Performs this component's simulation setup."""
+        self.segment_path = builder.configuration.input_data.shared_artifact_path
+        super().setup(builder)
+
+    def _load_artifact(self, configuration):
+        # NOTE: the artifact has already been loaded into the segment.
+        return None
+
+    def load_data(self, entity_key, **column_filters):
+        """Loads data associated with the given entity key, from the
+        segment."""
+        data = load_table(self.segment_path, entity_key, self.draw)
+        if isinstance(data, pd.DataFrame):
+            data = select_draw(data, self.draw)
+            return filter_data(data, self.config_filter_term, **column_filters)
+        return data
+
+    def __repr__(self):
+        return "SharedArtifactManager()"
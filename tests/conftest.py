@@ -0,0 +1,112 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from vivarium_unimelb_COVID19.external_data import artifact
+
+POPULATION = 'test_population'
+NUM_DRAWS = 7
+
+#The number of years covered by the epidemic and disease modifier tables.
+NUM_YEARS = 25
+
+#The first year (relative to the simulation start) in which the tables of the
+#'24m' variant differ from those of the base variant.
+VARIANT_DIVERGES = 2
+
+
+def draw_columns(num_draws=NUM_DRAWS):
+    return ['draw_{}'.format(i) for i in range(num_draws)]
+
+
+def write_population_data(data_dir, num_draws=NUM_DRAWS, seed=0):
+    """
+    Write a small set of input data files with ``num_draws`` draws, for the
+    base variant and the '24m' variant of the epidemic input data.
+    """
+    rng = np.random.RandomState(seed)
+    draws = draw_columns(num_draws)
+    (data_dir / 'diseases').mkdir(parents=True)
+
+    strata = pd.DataFrame([(age, sex) for age in range(0, 111)
+                           for sex in ['male', 'female']],
+                          columns=['age', 'sex'])
+    rates = pd.DataFrame(0.01 + rng.rand(len(strata), num_draws) / 10,
+                         columns=draws)
+    mort = strata.copy()
+    mort['mortality per 1 rate'] = rates['draw_0']
+    mort['APC in all-cause mortality'] = -0.02 * rng.rand(len(strata))
+    mort['5-year'] = np.where(strata['age'] % 5 == 2, 1000.0, np.nan)
+    pd.concat([mort, rates], axis=1).to_csv(
+        str(data_dir / 'base_population_mor.csv'), index=False)
+    for name in ['yld', 'hexp']:
+        values = pd.DataFrame(rng.rand(len(strata), num_draws) / 10,
+                              columns=draws)
+        pd.concat([strata, values], axis=1).to_csv(
+            str(data_dir / 'base_population_{}.csv'.format(name)),
+            index=False)
+
+    def binned_table(scenarios, scale):
+        bins = pd.DataFrame(
+            [(scenario, age, age + 10, time, time + 1, sex)
+             for scenario in scenarios for sex in ['male', 'female']
+             for age in range(0, 120, 10) for time in range(NUM_YEARS)],
+            columns=['scenario', 'age_start', 'age_end', 'time_start',
+                     'time_end', 'sex'])
+        values = pd.DataFrame(scale * rng.rand(len(bins), num_draws),
+                              columns=draws)
+        return pd.concat([bins, values], axis=1)
+
+    def variant_table(table):
+        # The '24m' variant differs from the base variant after a few years.
+        table = table.copy()
+        table['scenario'] = table['scenario'] + '_24m'
+        later = table['time_start'] >= VARIANT_DIVERGES
+        table.loc[later, draws] = table.loc[later, draws] * 1.5
+        return table
+
+    scenarios = artifact.VARIANTS[artifact.BASE_VARIANT]
+    tables = {}
+    for prefix in ['percent_infected', 'dead_table', 'dr_table',
+                   'popcost_table']:
+        tables[prefix] = binned_table(scenarios, 0.01)
+    for disease in artifact.ACUTE_DISEASES:
+        table = binned_table(scenarios, 0.1)
+        table[draws] += 1
+        tables['diseases/{}_unemployment_pif'.format(disease)] = table
+    for name, table in tables.items():
+        table.to_csv(str(data_dir / '{}.csv'.format(name)), index=False)
+        if name.startswith('diseases/'):
+            variant_name = '{}_scenario_24m'.format(name)
+        else:
+            variant_name = '{}_24m'.format(name)
+        variant_table(table).to_csv(
+            str(data_dir / '{}.csv'.format(variant_name)), index=False)
+
+    for disease in artifact.ACUTE_DISEASES:
+        rows = pd.DataFrame([(age, sex, measure)
+                             for measure in ['Deaths', 'YLDs']
+                             for sex in ['male', 'female']
+                             for age in range(0, 111)],
+                            columns=['age', 'sex', 'measure'])
+        values = pd.DataFrame(rng.rand(len(rows), num_draws) / 1000,
+                              columns=draws)
+        pd.concat([rows, values], axis=1).to_csv(
+            str(data_dir / 'diseases' /
+                '{}_disease_input.csv'.format(disease)), index=False)
+
+    effects = binned_table(['x'], 0.01).iloc[:, 1:7].rename(columns={
+        'time_start': 'year_start', 'time_end': 'year_end',
+        'draw_0': 'value'})
+    effects.to_csv(str(data_dir / 'ExcessMort_mortality_effects.csv'),
+                   index=False)
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    """A synthetic population's input data directory."""
+    data_dir = tmp_path / 'input_data' / POPULATION
+    write_population_data(data_dir)
+    monkeypatch.setattr(artifact, 'get_data_dir', lambda population: data_dir)
+    yield data_dir
+    artifact._TABLE_SOURCES.clear()
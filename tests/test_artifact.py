@@ -0,0 +1,125 @@
+from pathlib import Path
+
+import pandas as pd
+import pytest
+import vivarium.framework.configuration as config
+from vivarium.framework.artifact import Artifact
+
+from vivarium_unimelb_COVID19 import compact_artifact
+from vivarium_unimelb_COVID19.external_data import artifact
+
+from conftest import NUM_DRAWS, POPULATION, draw_columns
+
+
+def build(output_dir, layout, chunk_draws):
+    output_dir.mkdir()
+    artifact_file = artifact.assemble_artifact(
+        POPULATION, NUM_DRAWS, output_dir, rebuild=True, layout=layout,
+        chunk_draws=chunk_draws)
+    art = Artifact(str(artifact_file))
+    return {key: compact_artifact.load_entity(art, key) for key in art.keys}
+
+
+def test_draw_chunks_cover_every_draw(data_dir):
+    jobs = artifact.get_table_jobs(POPULATION, num_draws=NUM_DRAWS)
+    for job in jobs:
+        chunks = artifact.get_draw_chunks(job, 3)
+        if job.num_draws is None:
+            assert chunks == [None]
+        elif job.has_draws:
+            assert [list(c) for c in chunks] == [[0, 1, 2], [3, 4, 5], [6]]
+        else:
+            assert chunks == [range(0, 3)]
+
+
+@pytest.mark.parametrize('layout', artifact.LAYOUTS)
+def test_chunked_artifacts_are_identical(tmp_path, data_dir, layout):
+    expected = build(tmp_path / 'all', layout, None)
+    for chunk_draws in [1, 3, NUM_DRAWS + 1]:
+        actual = build(tmp_path / str(chunk_draws), layout, chunk_draws)
+        assert sorted(actual) == sorted(expected)
+        for key, data in expected.items():
+            if isinstance(data, pd.DataFrame):
+                pd.testing.assert_frame_equal(actual[key], data, obj=key)
+            else:
+                assert actual[key] == data
+
+
+def test_tables_contain_requested_draws(tmp_path, data_dir):
+    tables = build(tmp_path / 'out', 'compact', 3)
+    data = tables['COVID19.infection_prop.elimination']
+    assert [c for c in data.columns if c.startswith('draw_')] == draw_columns()
+
+
+def test_number_of_draws_invalidates_tables(tmp_path, data_dir):
+    output_dir = tmp_path / 'out'
+    build(output_dir, 'compact', 3)
+    artifact_file = output_dir / '{}.hdf'.format(POPULATION)
+    assert not artifact.get_stale_jobs(artifact_file, POPULATION,
+                                       layout='compact', num_draws=NUM_DRAWS)
+    stale = artifact.get_stale_jobs(artifact_file, POPULATION,
+                                    layout='compact', num_draws=5)
+    assert {job.key for job in stale} == {
+        job.key for job in artifact.get_table_jobs(POPULATION)
+        if job.num_draws is not None}
+
+
+def test_rebuild_retains_unselected_variants(tmp_path, data_dir):
+    variants = (artifact.BASE_VARIANT, '24m')
+    artifact_file = artifact.assemble_artifact(
+        POPULATION, NUM_DRAWS, tmp_path, layout='compact', variants=variants)
+    artifact.assemble_artifact(POPULATION, NUM_DRAWS, tmp_path, rebuild=True,
+                               layout='compact')
+    keys = Artifact(str(artifact_file)).keys
+    assert 'COVID19.infection_prop.elimination_24m' in keys
+    assert not artifact.get_stale_jobs(artifact_file, POPULATION,
+                                       layout='compact', variants=variants,
+                                       num_draws=NUM_DRAWS)
+
+
+def test_table_hashes_include_shared_code():
+    modules = artifact.get_code_hashes('population')
+    assert {'vivarium_unimelb_COVID19.external_data.population',
+            'vivarium_unimelb_COVID19.external_data.input_cache',
+            'vivarium_unimelb_COVID19.population',
+            'vivarium_unimelb_COVID19.external_data.artifact',
+            'vivarium_unimelb_COVID19.compact_artifact'} == set(modules)
+
+
+@pytest.mark.parametrize('layout', artifact.LAYOUTS)
+def test_replaced_tables_do_not_grow_artifact(tmp_path, data_dir, layout):
+    output_dir = tmp_path / 'out'
+    build(output_dir, layout, None)
+    artifact_file = output_dir / '{}.hdf'.format(POPULATION)
+    size = artifact_file.stat().st_size
+    # Every table with draws is replaced by a table with fewer draws.
+    artifact.assemble_artifact(POPULATION, NUM_DRAWS - 2, output_dir,
+                               layout=layout)
+    assert artifact_file.stat().st_size < size
+    assert list(output_dir.iterdir()) == [artifact_file]
+    art = Artifact(str(artifact_file))
+    data = compact_artifact.load_entity(
+        art, 'COVID19.infection_prop.elimination')
+    assert [c for c in data.columns if c.startswith('draw_')] == \
+        draw_columns(NUM_DRAWS - 2)
+
+
+def test_parallel_build_reports_failed_tables(tmp_path, data_dir):
+    (data_dir / 'diseases' / 'RTC_disease_input.csv').unlink()
+    with pytest.raises(RuntimeError) as excinfo:
+        artifact.assemble_artifacts_in_parallel(
+            [POPULATION], NUM_DRAWS, tmp_path, workers=2, chunk_draws=3)
+    message = str(excinfo.value)
+    assert 'of table acute_disease.RTC.' in message
+    assert 'RTC_disease_input.csv' in message
+
+
+def test_specifications_read_compact_artifacts():
+    spec_dir = Path(__file__).resolve().parent.parent / 'model_specifications'
+    spec_files = sorted(spec_dir.glob('*.yaml'))
+    assert spec_files
+    for spec_file in spec_files:
+        spec = config.build_model_specification(str(spec_file))
+        assert spec.plugins.required.data.controller == \
+            'vivarium_unimelb_COVID19.artifact_cache.TimedArtifactManager', \
+            spec_file.name
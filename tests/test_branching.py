@@ -0,0 +1,66 @@
+import logging
+
+import pandas as pd
+import pytest
+
+from vivarium_unimelb_COVID19.external_data import artifact, branching
+from vivarium_unimelb_COVID19.external_data.build_simulation_files import (
+    create_population_specifications)
+from vivarium_unimelb_COVID19.external_data.parallel import simulate_nth_draw
+
+from conftest import NUM_DRAWS, POPULATION
+
+#The last year of each test simulation, so that the simulations are short.
+END_YEAR = 2025
+
+
+@pytest.fixture
+def spec_files(tmp_path, data_dir):
+    """
+    Model specifications for a branch that diverges part-way through the
+    simulation (elimination_24m), a branch that diverges from the start
+    (flatten) and a branch that only differs in its discount rate.
+    """
+    artifact_dir = tmp_path / 'artifacts'
+    artifact_dir.mkdir()
+    artifact.assemble_artifact(POPULATION, NUM_DRAWS, artifact_dir,
+                               rebuild=True,
+                               variants=(artifact.BASE_VARIANT, '24m'))
+    spec_dir = tmp_path / 'model_specifications'
+    spec_dir.mkdir()
+    # NOTE: the BAU specification has different components, and is not
+    # part of this group.
+    files = create_population_specifications(
+        spec_dir, POPULATION, ['elimination', 'elimination_24m', 'flatten'])
+    files = [f for f in files if not f.stem.endswith('_BAU')]
+    for spec_file in files:
+        contents = spec_file.read_text()
+        spec_file.write_text(contents.replace('year: 2040',
+                                              'year: {}'.format(END_YEAR)))
+    discounted = spec_dir / 'COVID19_{}_discounted.yaml'.format(POPULATION)
+    discounted.write_text(files[0].read_text().replace(
+        'discount_rate: 0.03', 'discount_rate: 0.05'))
+    return [str(f) for f in files] + [str(discounted)]
+
+
+def test_specifications_form_one_group(spec_files):
+    assert branching.group_specifications(spec_files) == [spec_files]
+
+
+def test_branches_match_independent_simulations(spec_files, caplog):
+    draw = 1
+    with caplog.at_level(logging.INFO, logger=branching.__name__):
+        branched = branching.simulate_branches(tuple(spec_files), draw,
+                                               write_files=False)
+    assert list(branched) == spec_files
+    # The flatten scenario differs from the start, and is not forked.
+    forked = [spec_file for spec_file in spec_files
+              if ' Forked {} at '.format(spec_file) in caplog.text]
+    assert forked == [spec_files[1], spec_files[3]]
+    for spec_file in spec_files:
+        expected = simulate_nth_draw(spec_file, draw, write_files=False)
+        assert sorted(branched[spec_file]) == sorted(expected)
+        for suffix, data in expected.items():
+            pd.testing.assert_frame_equal(
+                branched[spec_file][suffix], data, check_exact=True,
+                obj='{} {}'.format(spec_file, suffix))
@@ -0,0 +1,34 @@
+import pandas as pd
+import pytest
+
+from vivarium_unimelb_COVID19.external_data import collector
+from vivarium_unimelb_COVID19.external_data.collector import ResultCollector
+
+
+def test_outputs_are_written_with_a_draw_column(tmp_path):
+    prefix = str(tmp_path / 'results' / 'spec')
+    with ResultCollector(flush_rows=3) as results:
+        for draw in range(3):
+            results.put(prefix, draw, {'mm': pd.DataFrame({'x': [draw] * 2})})
+    data = pd.read_csv(prefix + '_mm_draws.csv')
+    assert data['draw'].tolist() == [0, 0, 1, 1, 2, 2]
+    assert data['x'].tolist() == data['draw'].tolist()
+
+
+def test_write_errors_stop_the_collector(tmp_path, monkeypatch):
+    monkeypatch.setattr(collector, 'PUT_WAIT_SECONDS', 0.1)
+    # The output directory cannot be created, because this is a file.
+    (tmp_path / 'results').write_text('')
+    prefix = str(tmp_path / 'results' / 'spec')
+    table = pd.DataFrame({'x': [1, 2]})
+
+    results = ResultCollector(max_pending=1, flush_rows=1)
+    results.start()
+    results.put(prefix, 0, {'mm': table})
+    assert results.stopped.wait(timeout=30)
+    with pytest.raises(RuntimeError) as excinfo:
+        results.put(prefix, 1, {'mm': table})
+    assert 'draw 1 of {}'.format(prefix) in str(excinfo.value)
+    with pytest.raises(RuntimeError) as excinfo:
+        results.close()
+    assert 'exit code: 1' in str(excinfo.value)
@@ -0,0 +1,35 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from vivarium_unimelb_COVID19.discounting import infer_step_size, rediscount
+
+
+def outputs(step_size, num_steps=4, num_cohorts=3):
+    dates = pd.date_range('2020-01-01', periods=num_steps + 1,
+                          freq='{}D'.format(step_size))[1:]
+    rows = [(step + 1, date.date(), cohort)
+            for step, date in enumerate(dates)
+            for cohort in range(num_cohorts)]
+    data = pd.DataFrame(rows, columns=['step', 'date', 'age'])
+    rng = np.random.RandomState(0)
+    for col in ['HALY', 'bau_HALY', 'expenditure', 'bau_expenditure']:
+        data[col] = rng.rand(len(data))
+    return data
+
+
+def test_step_size_is_inferred_from_the_dates():
+    data = outputs(step_size=7)
+    assert infer_step_size(data) == 7
+    discounted = rediscount(data, [0.05])
+    factors = (1 + 0.05 * 7 / 365) ** -data['step']
+    assert np.allclose(discounted['HALY'], (data['HALY'] * factors).sum())
+
+
+def test_step_size_must_match_the_dates():
+    data = outputs(step_size=7)
+    pd.testing.assert_frame_equal(rediscount(data, [0.03], step_size=7),
+                                  rediscount(data, [0.03]))
+    with pytest.raises(ValueError) as excinfo:
+        rediscount(data, [0.03], step_size=30)
+    assert 'recorded every 7 days' in str(excinfo.value)
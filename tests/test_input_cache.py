@@ -0,0 +1,61 @@
+import pandas as pd
+import pytest
+
+from vivarium_unimelb_COVID19.external_data import input_cache
+from vivarium_unimelb_COVID19.external_data.input_cache import (
+    CACHE_DIR_NAME, HASHES_DIR_NAME, read_input_csv)
+
+
+@pytest.fixture(autouse=True)
+def new_process(monkeypatch):
+    """Forget the files hashed by earlier tests, as per a new process."""
+    monkeypatch.setattr(input_cache, '_FILE_HASHES', {})
+
+
+def write_csv(path, values):
+    pd.DataFrame({'age': range(len(values)), 'value': values}).to_csv(
+        str(path), index=False)
+
+
+def entry_dirs(cache_dir):
+    return sorted(p.name for p in cache_dir.iterdir()
+                  if p.name != HASHES_DIR_NAME)
+
+
+def test_new_process_does_not_read_cached_file(tmp_path, monkeypatch):
+    csv_file = tmp_path / 'input.csv'
+    write_csv(csv_file, [1.0, 2.0])
+    expected = read_input_csv(csv_file)
+
+    monkeypatch.setattr(input_cache, '_FILE_HASHES', {})
+
+    def fail(*args, **kwargs):
+        raise AssertionError('The file was read')
+
+    monkeypatch.setattr(input_cache, 'hash_file', fail)
+    monkeypatch.setattr(pd, 'read_csv', fail)
+    actual = read_input_csv(csv_file, columns=['value'])
+    pd.testing.assert_frame_equal(actual, expected[['value']])
+
+
+def test_changed_file_replaces_its_cached_columns(tmp_path):
+    csv_file = tmp_path / 'input.csv'
+    copy_file = tmp_path / 'copy.csv'
+    cache_dir = tmp_path / CACHE_DIR_NAME
+    write_csv(csv_file, [1.0, 2.0])
+    write_csv(copy_file, [1.0, 2.0])
+    read_input_csv(csv_file)
+    read_input_csv(copy_file)
+    first = entry_dirs(cache_dir)
+    assert len(first) == 1
+
+    # The copy still uses the cached columns of the first version.
+    write_csv(csv_file, [3.0, 4.0, 5.0])
+    assert read_input_csv(csv_file)['value'].tolist() == [3.0, 4.0, 5.0]
+    assert len(entry_dirs(cache_dir)) == 2
+
+    write_csv(copy_file, [6.0])
+    assert read_input_csv(copy_file)['value'].tolist() == [6.0]
+    second = entry_dirs(cache_dir)
+    assert len(second) == 2
+    assert first[0] not in second
@@ -0,0 +1,103 @@
+import multiprocessing
+import sqlite3
+import time
+
+import pytest
+
+from vivarium_unimelb_COVID19.external_data import job_queue
+from vivarium_unimelb_COVID19.external_data.job_queue import (
+    DONE, FAILED, PENDING, JobQueue, run_worker)
+
+
+@pytest.fixture
+def queue_path(tmp_path):
+    return str(tmp_path / 'queue.db')
+
+
+def job_rows(queue_path):
+    with sqlite3.connect(queue_path) as conn:
+        return conn.execute('SELECT spec, draw, status, attempts, worker'
+                            ' FROM jobs ORDER BY id').fetchall()
+
+
+def fake_run_nth_draw(spec_file, draw, *args):
+    time.sleep(0.05)
+
+
+def test_enqueue_ignores_existing_jobs(tmp_path, queue_path):
+    specs = [str(tmp_path / 'a.yaml'), str(tmp_path / 'b.yaml')]
+    queue = JobQueue(queue_path)
+    assert queue.enqueue(specs, 2) == 6
+    assert queue.enqueue(specs, 3) == 2
+    assert queue.progress()[PENDING] == 8
+
+
+def test_workers_complete_every_job_once(tmp_path, queue_path, monkeypatch):
+    # Several worker processes share one queue on this machine.
+    monkeypatch.setattr(job_queue, 'run_nth_draw', fake_run_nth_draw)
+    specs = [str(tmp_path / 'a.yaml'), str(tmp_path / 'b.yaml')]
+    JobQueue(queue_path).enqueue(specs, 5)
+
+    context = multiprocessing.get_context('fork')
+    workers = [context.Process(target=run_worker, args=(queue_path,),
+                               kwargs={'poll_seconds': 0.1})
+               for _ in range(3)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(timeout=60)
+        assert worker.exitcode == 0
+
+    rows = job_rows(queue_path)
+    assert len(rows) == 12
+    assert all(status == DONE and attempts == 1
+               for (_, _, status, attempts, _) in rows)
+    assert JobQueue(queue_path).unfinished() == 0
+
+
+def test_expired_lease_is_reclaimed(tmp_path, queue_path):
+    queue = JobQueue(queue_path, lease_seconds=0.1)
+    queue.enqueue([str(tmp_path / 'a.yaml')], 0)
+    first = queue.claim('worker-1')
+    assert queue.claim('worker-2') is None
+    time.sleep(0.2)
+    assert queue.progress()['expired'] == 1
+    assert queue.claim('worker-2') == first
+    assert not queue.heartbeat(first[0], 'worker-1')
+    assert queue.heartbeat(first[0], 'worker-2')
+
+
+def test_exhausted_expired_job_is_failed(tmp_path, queue_path):
+    queue = JobQueue(queue_path, lease_seconds=0.1, max_attempts=2)
+    queue.enqueue([str(tmp_path / 'a.yaml')], 0)
+    for worker in ['worker-1', 'worker-2']:
+        assert queue.claim(worker) is not None
+        time.sleep(0.2)
+    assert queue.claim('worker-3') is None
+    counts = queue.progress()
+    assert counts[FAILED] == 1
+    assert queue.unfinished() == 0
+
+
+def test_worker_exits_when_last_attempt_expires(tmp_path, queue_path,
+                                                monkeypatch):
+    monkeypatch.setattr(job_queue, 'run_nth_draw', fake_run_nth_draw)
+    queue = JobQueue(queue_path, lease_seconds=0.1)
+    queue.enqueue([str(tmp_path / 'a.yaml')], 0)
+    # Workers that stopped without releasing every attempt.
+    for _ in range(job_queue.MAX_ATTEMPTS):
+        assert queue.claim('lost-worker') is not None
+        time.sleep(0.2)
+    assert run_worker(queue_path, lease_seconds=0.1, poll_seconds=0.1) == 0
+    assert job_rows(queue_path)[0][2] == FAILED
+
+
+def test_failed_job_is_retried(tmp_path, queue_path):
+    queue = JobQueue(queue_path, max_attempts=2)
+    queue.enqueue([str(tmp_path / 'a.yaml')], 0)
+    job_id = queue.claim('worker-1')[0]
+    queue.fail(job_id, 'worker-1', 'error')
+    assert job_rows(queue_path)[0][2] == PENDING
+    job_id = queue.claim('worker-1')[0]
+    queue.fail(job_id, 'worker-1', 'error')
+    assert job_rows(queue_path)[0][2] == FAILED
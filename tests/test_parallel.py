@@ -0,0 +1,141 @@
+import multiprocessing
+import os
+import queue
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from vivarium_unimelb_COVID19.external_data import parallel, resources
+from vivarium_unimelb_COVID19.external_data.parallel import apply_func
+
+
+def square(x):
+    return x * x
+
+
+def fail_odd_draws(spec_file, draw, *args):
+    if draw % 2:
+        raise ValueError('Draw {} failed'.format(draw))
+    return {'mm': draw}
+
+
+def test_worker_waits_for_jobs_that_are_queued_late():
+    # The worker starts reading before any job has reached the queue.
+    context = multiprocessing.get_context('fork')
+    job_q = context.Queue()
+    result_q = context.Queue()
+    worker = context.Process(target=apply_func,
+                             args=[square, job_q, result_q])
+    worker.start()
+    time.sleep(parallel.JOB_WAIT_SECONDS / 4)
+    job_q.put((3,))
+    args, value, _, error = result_q.get(timeout=10)
+    worker.join(timeout=10)
+    assert (args, value, error) == ((3,), 9, None)
+    assert worker.exitcode == 0
+
+
+def test_collected_draw_parses_specification_once(tmp_path, monkeypatch):
+    spec_file = tmp_path / 'spec.yaml'
+    spec_file.write_text('configuration:\n'
+                         '    observer:\n'
+                         '        output_prefix: results/spec\n')
+    parsed = []
+    build = parallel.config.build_model_specification
+
+    def counting_build(*args, **kwargs):
+        parsed.append(args)
+        return build(*args, **kwargs)
+
+    def fake_simulate(spec_file, draw, *args):
+        spec = args[-1]
+        assert spec.configuration.observer.output_prefix == 'results/spec'
+        return {'mm': draw}
+
+    monkeypatch.setattr(parallel.config, 'build_model_specification',
+                        counting_build)
+    monkeypatch.setattr(parallel, 'simulate_nth_draw', fake_simulate)
+    collected = queue.Queue()
+    collector = SimpleNamespace(put=lambda *item: collected.put(item))
+    parallel.run_nth_draw_collected(collector, str(spec_file), 3)
+    assert collected.get_nowait() == ('results/spec', 3, {'mm': 3})
+    assert len(parsed) == 1
+
+
+def fake_simulation(**components):
+    manager = SimpleNamespace(list_components=lambda: components)
+    return SimpleNamespace(_component_manager=manager)
+
+
+def test_observer_results_are_keyed_by_output_suffix():
+    simulation = fake_simulation(
+        population=SimpleNamespace(),
+        mortality_observer=SimpleNamespace(output_suffix='mm', results=1),
+        disease_observer=SimpleNamespace(output_suffix='BiasedAfib',
+                                         results=None))
+    assert parallel.get_observer_results(simulation) == {'mm': 1}
+
+
+def test_observers_with_the_same_output_suffix_are_rejected():
+    simulation = fake_simulation(
+        first_observer=SimpleNamespace(output_suffix='mm', results=1),
+        second_observer=SimpleNamespace(output_suffix='mm', results=2))
+    with pytest.raises(ValueError) as excinfo:
+        parallel.get_observer_results(simulation)
+    assert 'first_observer and second_observer' in str(excinfo.value)
+
+
+def test_components_require_a_component_manager():
+    with pytest.raises(ValueError):
+        parallel.get_components(SimpleNamespace())
+
+
+@pytest.mark.parametrize('num_procs', [1, 2])
+def test_batch_reports_failed_simulations(monkeypatch, num_procs):
+    monkeypatch.setattr(parallel, 'run_nth_draw', fail_odd_draws)
+    with pytest.raises(RuntimeError) as excinfo:
+        parallel.run_batch(['spec.yaml'], [0, 1, 2, 3], num_procs=num_procs)
+    message = str(excinfo.value)
+    assert "2 of 4 simulations failed: ('spec.yaml', 1), ('spec.yaml', 3)" \
+        in message
+    assert 'ValueError: Draw 1 failed' in message
+
+
+def worker_threads():
+    return os.environ['OMP_NUM_THREADS']
+
+
+def test_thread_limits_only_apply_to_workers(monkeypatch):
+    for name in resources.THREAD_VARIABLES:
+        monkeypatch.delenv(name, raising=False)
+    sizing = resources.WorkerSizing(max_workers=1, pin=False, threads=1)
+    threads = []
+    success = parallel.run_in_parallel(
+        worker_threads, [()], 1, on_result=lambda args, value:
+        threads.append(value), sizing=sizing)
+    assert success
+    assert threads == ['1']
+    assert not any(name in os.environ for name in resources.THREAD_VARIABLES)
+
+
+def test_values_are_only_sent_when_requested():
+    received = []
+    success = parallel.run_in_parallel(
+        square, [(2,), (3,)], 2, on_result=lambda args, value:
+        received.append((args, value)), send_values=False)
+    assert success
+    assert sorted(received) == [((2,), None), ((3,), None)]
+
+
+@pytest.mark.parametrize('on_result', [None, print])
+def test_shared_artifacts_only_send_used_outputs(monkeypatch, on_result):
+    calls = []
+    monkeypatch.setattr(parallel, 'share_artifacts',
+                        lambda *args: lambda args, value: None)
+    monkeypatch.setattr(parallel, 'run_simulations',
+                        lambda *args: calls.append(args))
+    parallel.run_many(['spec.yaml'], 1, 2, on_result=on_result,
+                      shared_artifacts=True)
+    send_values = calls[0][-1]
+    assert send_values == (on_result is not None)
@@ -0,0 +1,94 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pytest
+from vivarium.framework.artifact import Artifact
+
+from vivarium_unimelb_COVID19 import compact_artifact
+from vivarium_unimelb_COVID19.artifact_cache import select_draw
+from vivarium_unimelb_COVID19.external_data import artifact
+from vivarium_unimelb_COVID19.external_data.population import Population
+from vivarium_unimelb_COVID19.population import load_mortality_rate
+
+from conftest import NUM_DRAWS, POPULATION
+
+YEAR_START = artifact.BASE_LIFETABLE_YEAR_START
+
+
+def baseline_mortality_rate(population):
+    """
+    Project the mortality rate one year at a time, as per the original
+    implementation of ``Population.get_mortality_rate``.
+    """
+    draws = population.draw_columns
+    df_apc = population._mort_data[['year', 'age', 'sex', 'mortality_apc']]
+    df_apc = df_apc.rename(columns={'mortality_apc': 'value'})
+    tables = []
+    for year in population.years():
+        df_apc['year'] = year
+        tables.append(df_apc.copy())
+    df_apc = pd.concat(tables).sort_values(['year', 'age', 'sex'])
+
+    df_acmr = population._mort_data[['age', 'sex'] + draws]
+    base_acmr = df_acmr[draws].copy()
+    df_acmr = df_acmr.rename(columns={'age': 'age_start'})
+    df_acmr.insert(df_acmr.columns.get_loc('age_start') + 1, 'age_end',
+                   df_acmr['age_start'] + 1)
+    df_acmr.insert(0, 'year_start', population.year_start - 1)
+    df_acmr.insert(1, 'year_end', population.year_start)
+
+    tables = [df_acmr.copy()]
+    for counter, year in enumerate(population.years()):
+        if counter <= population._num_apc_years:
+            apc = df_apc[df_apc.year == year]['value'].values
+            scale = np.exp(apc * (year - population.year_start))
+        else:
+            # Each cohort retains its scale from the previous year.
+            scale[2:] = scale[:-2]
+        df_acmr.loc[:, draws] = base_acmr * scale[:, None]
+        df_acmr['year_start'] = year
+        df_acmr['year_end'] = year + 1
+        tables.append(df_acmr.copy())
+
+    df = pd.concat(tables).sort_values(['year_start', 'age_start', 'sex'])
+    return df.reset_index(drop=True)
+
+
+def test_projection_matches_yearly_loop(data_dir):
+    population = Population(data_dir, YEAR_START, range(NUM_DRAWS))
+    # The cohorts shift for most of the projection.
+    num_years = len(population.years())
+    assert num_years > 2 * population._num_apc_years
+
+    expected = baseline_mortality_rate(population)
+    actual = population.get_mortality_rate()
+    assert list(actual.columns) == list(expected.columns)
+    pd.testing.assert_frame_equal(actual, expected, check_dtype=False)
+
+
+@pytest.mark.parametrize('layout', ['generic', 'compact'])
+def test_simulation_projects_stored_mortality_tables(tmp_path, data_dir,
+                                                     layout):
+    artifact_file = artifact.assemble_artifact(POPULATION, NUM_DRAWS,
+                                               tmp_path, layout=layout)
+    art = Artifact(str(artifact_file))
+    population = Population(data_dir, YEAR_START, range(NUM_DRAWS))
+    expected = baseline_mortality_rate(population)
+    bin_columns = ['year_start', 'year_end', 'age_start', 'age_end', 'sex']
+
+    for draw in [0, NUM_DRAWS - 1]:
+        # Load each table as the simulation's artifact manager does.
+        def load(key):
+            data = compact_artifact.load_entity(art, key)
+            if isinstance(data, pd.DataFrame):
+                data = select_draw(data, draw)
+            return data
+
+        builder = SimpleNamespace(data=SimpleNamespace(load=load))
+        actual = load_mortality_rate(builder)
+        draw_expected = expected[bin_columns + ['draw_{}'.format(draw)]]
+        pd.testing.assert_frame_equal(
+            actual, draw_expected.rename(columns={'draw_{}'.format(draw):
+                                                  'value'}),
+            check_dtype=False)
@@ -0,0 +1,32 @@
+import pickle
+import shutil
+
+from vivarium_unimelb_COVID19.external_data import artifact, result_cache
+from vivarium_unimelb_COVID19.external_data.build_simulation_files import (
+    create_population_specifications)
+from vivarium_unimelb_COVID19.external_data.parallel import load_result_cache
+
+from conftest import NUM_DRAWS, POPULATION
+
+
+def test_workers_reuse_artifact_hashes(tmp_path, data_dir, monkeypatch):
+    artifact_dir = tmp_path / 'artifacts'
+    artifact_dir.mkdir()
+    artifact_file = artifact.assemble_artifact(POPULATION, NUM_DRAWS,
+                                               artifact_dir)
+    spec_dir = tmp_path / 'model_specifications'
+    spec_dir.mkdir()
+    spec_files = create_population_specifications(spec_dir, POPULATION,
+                                                  ['elimination', 'flatten'])
+
+    cache = load_result_cache(tmp_path / 'cache', spec_files)
+    expected = cache.artifact_hashes(artifact_file)
+    assert len(expected) > 0
+
+    # A worker process receives a copy of the cache, and does not read or
+    # hash the artifact again.
+    shutil.rmtree(str(cache.artifacts_dir))
+    monkeypatch.setattr(result_cache, 'Artifact', None)
+    worker_cache = pickle.loads(pickle.dumps(cache))
+    assert worker_cache.artifact_hashes(artifact_file) == expected
+    assert result_cache.get_result_cache(worker_cache) is worker_cache
@@ -0,0 +1,77 @@
+import pytest
+
+from vivarium_unimelb_COVID19.external_data.scheduling import (
+    DEFAULT_MINUTES, TimingHistory, estimate_wall_time, plan_batch,
+    record_timing)
+
+
+def timings(total):
+    return {'total': total, 'setup': 0.0, 'initialise': 0.0,
+            'run': total, 'finalise': 0.0}
+
+
+@pytest.fixture
+def history_file(tmp_path):
+    history_file = tmp_path / 'history.jsonl'
+    for spec, total, memory_mb in [('COVID19_a_flatten.yaml', 5.0, 300),
+                                   ('COVID19_a_flatten.yaml', 3.0, 200),
+                                   ('COVID19_a_suppress.yaml', 1.0, 100),
+                                   ('COVID19_a_BAU.yaml', 2.0, 150)]:
+        record_timing(str(history_file), 'specs/' + spec, 0, timings(total),
+                      memory_mb)
+    return str(history_file)
+
+
+def test_longest_simulations_are_ordered_first(history_file):
+    history = TimingHistory(history_file)
+    specs = ['COVID19_a_suppress.yaml', 'COVID19_a_BAU.yaml',
+             'COVID19_a_flatten.yaml']
+    assert history.predict_minutes('specs/COVID19_a_flatten.yaml') == 4.0
+    assert history.order(specs) == ['COVID19_a_flatten.yaml',
+                                    'COVID19_a_BAU.yaml',
+                                    'COVID19_a_suppress.yaml']
+
+
+def test_specifications_without_history_use_similar_ones(history_file):
+    history = TimingHistory(history_file)
+    # The mean of the intervention (non-BAU) simulations.
+    assert history.predict_minutes('COVID19_b_elimination.yaml') == 3.0
+    assert history.predict_memory_mb('COVID19_b_elimination.yaml') == 300
+    assert history.predict_minutes('COVID19_b_BAU.yaml') == 2.0
+    # Files with equal predictions retain their original order.
+    specs = ['COVID19_b_suppress.yaml', 'COVID19_b_elimination.yaml']
+    assert history.order(specs) == specs
+
+    empty = TimingHistory()
+    assert empty.predict_minutes('COVID19_b_BAU.yaml') == DEFAULT_MINUTES
+    assert empty.predict_memory_mb('COVID19_b_BAU.yaml') is None
+
+
+def test_timings_file_seeds_the_history(tmp_path):
+    timings_file = tmp_path / 'model_timings.csv'
+    timings_file.write_text(
+        'spec, total, setup, initialise, run, finalise\n'
+        'COVID19_a_flatten.yaml, 6.0, 1.0, 0.0, 5.0, 0.0\n')
+    history = TimingHistory(str(tmp_path / 'missing.jsonl'),
+                            str(timings_file))
+    assert history.predict_minutes('COVID19_a_flatten.yaml') == 6.0
+
+
+def test_wall_time_of_jobs_started_in_order():
+    costs = [4.0, 3.0, 3.0, 2.0, 2.0, 2.0]
+    assert estimate_wall_time(costs, 1) == sum(costs)
+    # Each job starts on the first process to become available.
+    assert estimate_wall_time(costs, 2) == 8.0
+    assert estimate_wall_time(costs, 10) == 4.0
+    assert estimate_wall_time([], 4) == 0.0
+
+
+def test_batch_plan(history_file):
+    history = TimingHistory(history_file)
+    specs = ['COVID19_a_suppress.yaml', 'COVID19_a_flatten.yaml']
+    table, wall_minutes, peak_memory_mb = plan_batch(specs, 3, 2, history)
+    assert table['spec'].tolist() == specs[::-1]
+    assert table['minutes_per_job'].tolist() == [4.0, 1.0]
+    # Flatten: 4 + 4 and 4 then suppress: 1 + 1 + 1 on the second process.
+    assert wall_minutes == 8.0
+    assert peak_memory_mb == 2 * 300
@@ -0,0 +1,84 @@
+import numpy as np
+import pandas as pd
+
+from vivarium_unimelb_COVID19.external_data.summary import (
+    SKETCH_CAPACITY, DrawSummary, QuantileSketch, summarise_draw)
+
+QS = [0.025, 0.25, 0.5, 0.75, 0.975]
+
+
+def sketch_of(values, capacity=SKETCH_CAPACITY):
+    sketch = QuantileSketch(values.shape[1], capacity)
+    for row in values:
+        sketch.add(row)
+    return sketch
+
+
+def ranks(sample, estimates):
+    """Return the fraction of each cell's sample below each estimate."""
+    return (sample[None, :, :] < estimates[:, None, :]).mean(axis=1)
+
+
+def test_merged_sketches_are_exact_below_capacity():
+    values = np.random.RandomState(0).normal(size=(50, 3))
+    merged = sketch_of(values[:20], capacity=64)
+    merged.merge(sketch_of(values[20:], capacity=64))
+    assert merged.count() == 50
+    # The estimate of each quantile is the smallest value whose cumulative
+    # frequency is at least q.
+    expected = [np.sort(values, axis=0)[int(np.ceil(q * 50)) - 1] for q in QS]
+    assert np.array_equal(merged.quantiles(QS), np.array(expected))
+
+
+def test_merged_sketches_estimate_percentiles():
+    rng = np.random.RandomState(1)
+    values = np.column_stack([rng.normal(size=4000),
+                              rng.exponential(size=4000),
+                              rng.uniform(size=4000)])
+    merged = sketch_of(values[:1500])
+    for part in np.array_split(values[1500:], 3):
+        merged.merge(sketch_of(part))
+    # The values have been compacted.
+    assert len(merged.levels) > 1
+    assert merged.count() == len(values)
+    # Compare the rank of each estimate with the rank of the percentile of
+    # the whole sample.
+    estimates = merged.quantiles(QS)
+    expected = np.percentile(values, [100 * q for q in QS], axis=0)
+    error = np.abs(ranks(values, estimates) - ranks(values, expected))
+    assert error.max() < 0.01
+
+
+def draw_table(rng):
+    dates = pd.date_range('2020-01-31', periods=3, freq='30D').date
+    rows = [(date, age, sex) for date in dates for age in [2, 7]
+            for sex in ['male', 'female']]
+    table = pd.DataFrame(rows, columns=['date', 'age', 'sex'])
+    table['deaths'] = rng.exponential(size=len(table))
+    table['HALY'] = rng.normal(size=len(table))
+    return table
+
+
+def test_merged_summaries_match_whole_sample():
+    rng = np.random.RandomState(2)
+    tables = [draw_table(rng) for _ in range(300)]
+    sample = np.array([summarise_draw(table).values.ravel()
+                       for table in tables])
+
+    parts = [DrawSummary('country', 'scenario', capacity=64)
+             for _ in range(3)]
+    for ix, table in enumerate(tables):
+        parts[ix % 3].update(table)
+    merged = DrawSummary('country', 'scenario', capacity=64)
+    for part in parts:
+        merged.merge(part)
+
+    assert merged.draws == len(tables)
+    assert len(merged.sketch.levels) > 1
+    df = merged.to_frame(QS)
+    assert np.allclose(df['mean'], sample.mean(axis=0))
+    assert np.allclose(df['sd'] ** 2, np.var(sample, axis=0, ddof=1))
+    estimates = df[['p{:g}'.format(100 * q) for q in QS]].values.T
+    expected = np.percentile(sample, [100 * q for q in QS], axis=0)
+    error = np.abs(ranks(sample, estimates) - ranks(sample, expected))
+    assert error.max() < 0.03
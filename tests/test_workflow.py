@@ -0,0 +1,34 @@
+from vivarium_unimelb_COVID19.external_data.workflow import TaskGraph
+
+
+def make_table(num_rows):
+    # A large value, which a worker cannot send until it has been received.
+    return list(range(num_rows))
+
+
+def test_failed_result_handlers_skip_dependent_tasks():
+    received = []
+
+    def on_done(args, value):
+        raise ValueError('Could not handle the result')
+
+    graph = TaskGraph()
+    graph.add('fails', make_table, [10 ** 6], on_done=on_done)
+    graph.add('depends', make_table, [10], depends_on=['fails'])
+    graph.add('independent', make_table, [10 ** 6],
+              on_done=lambda args, value: received.append(len(value)))
+    assert sorted(graph.run(2)) == ['depends', 'fails']
+    assert received == [10 ** 6]
+
+
+def test_interrupted_runs_do_not_wait_for_unsent_results(monkeypatch):
+    def interrupt(args, value):
+        raise KeyboardInterrupt
+
+    graph = TaskGraph()
+    graph.add('first', make_table, [10], on_done=interrupt)
+    for i in range(4):
+        graph.add('large:{}'.format(i), make_table, [10 ** 6])
+    failed = graph.run(2)
+    assert 'first' not in failed
+    assert set(failed) == set(graph.tasks) - {'first'}